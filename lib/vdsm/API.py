@@ -33,6 +33,7 @@ from vdsm.network.errors import ConfigNetworkError
 
 from vdsm import utils
 from vdsm import constants
+from vdsm import health
 from vdsm import throttledlog
 from vdsm import jobs
 from vdsm import v2v
@@ -45,6 +46,7 @@ from vdsm.common import hostdev
 from vdsm.common import logutils
 from vdsm.common import response
 from vdsm.common import supervdsm
+from vdsm.common import tracing
 from vdsm.common import validate
 from vdsm.common import conv
 from vdsm.host import api as hostapi
@@ -58,6 +60,7 @@ from vdsm.virt import migration
 from vdsm.virt import secret
 from vdsm.common.compat import pickle
 from vdsm.common.define import doneCode, errCode
+from vdsm.profiling import sampler
 from vdsm.config import config
 from vdsm.virt import sampling
 import vdsm.virt.jobs
@@ -1418,6 +1421,38 @@ class Global(APIBase):
         logutils.set_level(level, name)
         return dict(status=doneCode)
 
+    @api.logged(on="api.host")
+    def getThreadStats(self):
+        """
+        Return CPU usage of vdsm threads grouped by thread name prefix, for
+        debugging high CPU usage. Requires the health monitor.
+        """
+        return response.success(threads=health.thread_stats())
+
+    @api.logged(on="api.host")
+    def getStackSamples(self, seconds=None):
+        """
+        Return stack samples collected by the sampling profiler in collapsed
+        stack format, for debugging high CPU usage.
+        """
+        return response.success(samples=sampler.dump(seconds))
+
+    @api.logged(on="api.host")
+    def getLatencyStats(self):
+        """
+        Return latency breakdown per verb, computed from recent requests
+        traces.
+        """
+        return response.success(verbs=tracing.breakdown())
+
+    @api.logged(on="api.host")
+    def getSlowRequests(self, threshold=1.0):
+        """
+        Return traces of recent requests that took at least threshold
+        seconds.
+        """
+        return response.success(requests=tracing.slow_requests(threshold))
+
     # VM-related functions
     @api.logged(on="api.host")
     def dumpxmls(self, vmList=()):
@@ -25,9 +25,12 @@ import io
 import json
 import logging
 import os
+import threading
+
 import six
 
-from vdsm import utils
+from types import MappingProxyType
+
 from vdsm.common.compat import Enum, pickle
 from vdsm.common.logutils import Suppressed
 from yajsonrpc.exception import JsonRpcInvalidParamsError
@@ -123,6 +126,40 @@ class EventRep(object):
         return self._id
 
 
+class _Method(object):
+    """
+    Method definition with precomputed argument names and defaults, and
+    parameter validators compiled on the first verification.
+    """
+
+    __slots__ = ("params", "arg_names", "arg_names_set", "default_arg_names",
+                 "default_arg_values", "ret", "validators")
+
+    def __init__(self, method):
+        self.params = method.get('params', [])
+        self.arg_names = tuple(arg.get('name') for arg in self.params)
+        self.arg_names_set = frozenset(self.arg_names)
+        self.default_arg_names = frozenset(
+            arg.get('name') for arg in self.params if 'defaultvalue' in arg)
+        self.default_arg_values = tuple(
+            DEFAULT_VALUES.get(arg.get('defaultvalue'),
+                               arg.get('defaultvalue'))
+            for arg in self.params if 'defaultvalue' in arg)
+        self.ret = method.get('return', {})
+        # List of (name, required, validate) tuples.
+        self.validators = None
+
+
+def _broken(error):
+    """
+    Return a validator raising error, for a type definition which could not
+    be compiled. The error is reported only when the definition is used.
+    """
+    def validate(value, identifier):
+        raise error.__class__(*error.args)
+    return validate
+
+
 class Schema(object):
 
     log = logging.getLogger("SchemaCache")
@@ -137,6 +174,11 @@ class Schema(object):
         self._strict_mode = strict_mode
         self._methods = {}
         self._types = {}
+        # Method id -> _Method, created on first use.
+        self._compiled = {}
+        # Key -> (type definition, validator), see _compile().
+        self._validators = {}
+        self._lock = threading.Lock()
         try:
             for schema_type in schema_types:
                 with io.open(schema_type.path(), 'rb') as f:
@@ -160,25 +202,19 @@ class Schema(object):
         return Schema((SchemaType.VDSM_EVENTS,), strict_mode, *args, **kwargs)
 
     def get_args(self, rep):
-        method = self.get_method(rep)
-        return method.get('params', [])
+        return self._method(rep).params
 
     def get_arg_names(self, rep):
-        return [arg.get('name') for arg in self.get_args(rep)]
+        return self._method(rep).arg_names
 
     def get_default_arg_names(self, rep):
-        return frozenset([arg.get('name') for arg in self.get_args(rep)
-                          if 'defaultvalue' in arg])
+        return self._method(rep).default_arg_names
 
     def get_default_arg_values(self, rep):
-        return [DEFAULT_VALUES.get(arg.get('defaultvalue'),
-                                   arg.get('defaultvalue'))
-                for arg in self.get_args(rep)
-                if 'defaultvalue' in arg]
+        return self._method(rep).default_arg_values
 
     def get_ret_param(self, rep):
-        retval = self.get_method(rep)
-        return retval.get('return', {})
+        return self._method(rep).ret
 
     def get_method(self, rep):
         try:
@@ -186,9 +222,16 @@ class Schema(object):
         except KeyError:
             raise MethodNotFound(rep.id)
 
+    def _method(self, rep):
+        try:
+            return self._compiled[rep.id]
+        except KeyError:
+            method = _Method(self.get_method(rep))
+            return self._compiled.setdefault(rep.id, method)
+
     @property
     def get_methods(self):
-        return utils.picklecopy(self._methods)
+        return MappingProxyType(self._methods)
 
     def get_method_description(self, rep):
         method = self.get_method(rep)
@@ -202,13 +245,7 @@ class Schema(object):
 
     @property
     def get_types(self):
-        return utils.picklecopy(self._types)
-
-    def _check_primitive_type(self, t, value, name):
-        condition = PRIMITIVE_TYPES.get(t)
-        if not condition(value):
-            self._report_inconsistency('Parameter %s is not %s type'
-                                       % (name, t))
+        return MappingProxyType(self._types)
 
     def _report_inconsistency(self, message):
         if self._strict_mode:
@@ -218,150 +255,267 @@ class Schema(object):
 
     def verify_args(self, rep, args):
         try:
+            method = self._method(rep)
             # check whether there are extra parameters
-            unknown_args = [key for key in args if key not in
-                            self.get_arg_names(rep)]
+            unknown_args = [key for key in args
+                            if key not in method.arg_names_set]
             if unknown_args:
                 self._report_inconsistency('Following parameters %s were not'
                                            ' recognized' % (unknown_args))
 
             # verify types of provided parameters
-            for param in self.get_args(rep):
-                name = param.get('name')
+            for name, required, validate in self._param_validators(method):
                 arg = args.get(name)
                 if arg is None:
                     # check if missing paramter was defined as optional
-                    if 'defaultvalue' not in param:
+                    if required:
                         self._report_inconsistency(
                             'Required parameter %s is not '
                             'provided when calling %s' % (name, rep.id))
                     continue
-                self._verify_type(param, arg, rep.id)
+                validate(arg, rep.id)
         except JsonRpcInvalidParamsError:
             raise
         except Exception:
             self._report_inconsistency('Unexpected issue with request type'
                                        ' verification for %s' % rep.id)
 
-    def _verify_type(self, param, value, identifier):
+    def _param_validators(self, method):
+        if method.validators is None:
+            method.validators = [
+                (param.get('name'), 'defaultvalue' not in param,
+                 self._validator(param))
+                for param in method.params]
+        return method.validators
+
+    def _validator(self, param):
+        """
+        Return a validator function for param, accepting a value and the
+        identifier of the method or event, and reporting inconsistencies.
+        Type definitions are shared by many methods, so their validators
+        are compiled once and cached.
+        """
+        key = ('type', id(param))
+        try:
+            return self._validators[key][1]
+        except KeyError:
+            with self._lock:
+                pending = {}
+                validate = self._compile(
+                    pending, key, param, self._compile_type, param)
+                # Publish validators only when all of them are complete,
+                # so other threads never see a partial recursive type.
+                self._validators.update(pending)
+            return validate
+
+    def _compile(self, pending, key, definition, compile_func, *args):
+        entry = self._validators.get(key) or pending.get(key)
+        if entry is not None:
+            return entry[1]
+
+        # Recursive types refer to the validator before it is compiled.
+        cell = []
+        pending[key] = (definition,
+                        lambda value, identifier: cell[0](value, identifier))
+        try:
+            validate = compile_func(pending, *args)
+        except Exception as e:
+            # Invalid definitions are reported only when they are used.
+            validate = _broken(e)
+        cell.append(validate)
+        # Keep a reference to the definition so its id is not reused.
+        pending[key] = (definition, validate)
+        return validate
+
+    def _compile_type(self, pending, param):
+        report = self._report_inconsistency
+
         # check whether a parameter is in a list
         if isinstance(param, list):
-            if not isinstance(value, list):
-                self._report_inconsistency('Parameter %s is not a list'
-                                           % (value))
-            for a in value:
-                self._verify_type(param[0], a, identifier)
-            return
+            item = self._compile(
+                pending, ('type', id(param[0])), param[0], self._compile_type,
+                param[0])
+
+            def validate_list(value, identifier):
+                if not isinstance(value, list):
+                    report('Parameter %s is not a list' % (value))
+                for a in value:
+                    item(a, identifier)
+            return validate_list
+
         # check whether a parameter is defined as primitive type
         elif param in TYPE_KEYS:
-            self._check_primitive_type(param, value, param)
-            return
+            return self._compile_primitive(param, param)
 
         # get type and name
         name = param.get('name')
         t = param.get('type')
         if t == 'dict':
             # it seems that there is no other way to have it fixed
-            self._report_inconsistency(
-                'Unsupported type %s in %s please fix' % (t, identifier))
+            def validate_dict(value, identifier):
+                report('Unsupported type %s in %s please fix'
+                       % (t, identifier))
+            return validate_dict
 
         # check whether it is a primitive type
         elif t in TYPE_KEYS:
-            self._check_primitive_type(t, value, name)
+            return self._compile_primitive(t, name)
 
-        else:
-            # if type is a string call type verification method
-            if isinstance(t, six.string_types):
-                self._verify_complex_type(t, param, value, name, identifier)
+        # if type is a string compile type verification
+        elif isinstance(t, six.string_types):
+            return self._compile(
+                pending, ('complex', id(param), name), param,
+                self._compile_complex, param, name)
+
+        # if type is in a list we need to get the type and compile
+        # type verification
+        elif isinstance(t, list):
+            item = self._compile(
+                pending, ('type', id(t[0])), t[0], self._compile_type, t[0])
 
-            # if type is in a list we need to get the type and call
-            # type verification method
-            elif isinstance(t, list):
+            def validate_sequence(value, identifier):
                 if not isinstance(value, (list, tuple)):
-                    self._report_inconsistency('Parameter %s is not a sequence'
-                                               % (value))
+                    report('Parameter %s is not a sequence' % (value))
                 for a in value:
-                    self._verify_type(t[0], a, identifier)
-            else:
-                # call complex type verification
-                self._verify_complex_type(t.get('type'), t, value, name,
-                                          identifier)
+                    item(a, identifier)
+            return validate_sequence
+
+        else:
+            # compile complex type verification
+            return self._compile(
+                pending, ('complex', id(t), name), t, self._compile_complex,
+                t, name)
+
+    def _compile_primitive(self, t, name):
+        report = self._report_inconsistency
+        condition = PRIMITIVE_TYPES.get(t)
+        if condition is None:
+            raise TypeError('Unsupported primitive type %s' % t)
+
+        def _check_primitive_type(value, identifier):
+            if not condition(value):
+                report('Parameter %s is not %s type' % (name, t))
+        return _check_primitive_type
 
-    def _verify_complex_type(self, t_type, t, arg, name, identifier):
+    def _compile_complex(self, pending, t, name):
         """
-        This method verify whether argument value align with different
-        types we support such as: alias, map, union, enum and object.
+        Compile verification of the different types we support such as:
+        alias, map, union, enum and object.
+
+        The validators keep the names and locals of the verification
+        methods they replaced, since SchemaInconsistencyFormatter reports
+        them from the stack.
         """
+        report = self._report_inconsistency
+        t_type = t.get('type')
+
         if t_type == 'alias':
             # if alias we need to check sourcetype
-            self._check_primitive_type(t.get('sourcetype'), arg, name)
+            return self._compile_primitive(t.get('sourcetype'), name)
+
         elif t_type == 'map':
             # if map we need to check key and value types
-            for key, value in six.iteritems(arg):
-                self._verify_type(t.get('key-type'), key, identifier)
-                self._verify_type(t.get('value-type'), value, identifier)
+            key_type = t.get('key-type')
+            value_type = t.get('value-type')
+            validate_key = self._compile(
+                pending, ('type', id(key_type)), key_type,
+                self._compile_type, key_type)
+            validate_value = self._compile(
+                pending, ('type', id(value_type)), value_type,
+                self._compile_type, value_type)
+
+            def _verify_complex_type(arg, identifier, t_type=t_type):
+                for key, value in six.iteritems(arg):
+                    validate_key(key, identifier)
+                    validate_value(value, identifier)
+            return _verify_complex_type
+
         elif t_type == 'union':
             # if union we need to check whether parameter matches on of the
             # values defined
+            values = []
             for value in t.get('values'):
-                props = value.get('properties')
-                prop_names = [prop.get('name') for prop in props]
-                if not [key for key in arg if key not in prop_names]:
-                    self._verify_complex_type(value.get('type'), value, arg,
-                                              name, identifier)
-                    return
-            self._report_inconsistency('Provided parameters %s do not match'
-                                       ' any of union %s values'
-                                       % (arg, t.get('name')))
+                try:
+                    prop_names = frozenset(
+                        prop.get('name') for prop in value.get('properties'))
+                except Exception as e:
+                    # Fail only if no previous value matched.
+                    values.append((None, _broken(e)))
+                    continue
+                validate_value = self._compile(
+                    pending, ('complex', id(value), name), value,
+                    self._compile_complex, value, name)
+                values.append((prop_names, validate_value))
+
+            def _verify_complex_type(arg, identifier, t_type=t_type):
+                for prop_names, validate_value in values:
+                    if prop_names is None:
+                        validate_value(arg, identifier)
+                    if not [key for key in arg if key not in prop_names]:
+                        validate_value(arg, identifier)
+                        return
+                report('Provided parameters %s do not match any of union %s'
+                       ' values' % (arg, t.get('name')))
+            return _verify_complex_type
+
         elif t_type == 'enum':
             # if enum we need to check whether provided parameter is in values
-            if arg not in t.get('values'):
-                self._report_inconsistency('Provided value "%s" not'
-                                           ' defined in %s enum for'
-                                           ' %s' % (arg,
-                                                    t.get('name'),
-                                                    identifier))
+            enum_values = t.get('values')
+
+            def _verify_complex_type(arg, identifier, t_type=t_type):
+                if arg not in enum_values:
+                    report('Provided value "%s" not defined in %s enum for'
+                           ' %s' % (arg, t.get('name'), identifier))
+            return _verify_complex_type
+
         else:
             # if custom time (object) we need to check whether all the
             # properties match values provided
-            self._verify_object_type(t, arg, identifier)
+            return self._compile_object(pending, t)
 
-    def _verify_object_type(self, t, arg, identifier):
+    def _compile_object(self, pending, t):
+        report = self._report_inconsistency
         props = t.get('properties')
-        prop_names = [prop.get('name') for prop in props]
-        # check if there are any extra prarameters
-        unknown_props = [key for key in arg
-                         if key not in prop_names]
-        if unknown_props:
-            if 'any_string' in prop_names:
-                return
-            self._report_inconsistency('Following parameters %s were not'
-                                       ' recognized' % (unknown_props))
-        # iterate over properties
+        prop_names = frozenset(prop.get('name') for prop in props)
+        any_string = 'any_string' in prop_names
+        checks = []
         for prop in props:
-            p_name = prop.get('name')
-            a = arg.get(p_name)
-
-            # check whether parameter is defined as optional and
-            # check default type
-            if 'defaultvalue' in prop:
-                value = prop.get('defaultvalue')
-                if value == 'needs updating':
-                    self._report_inconsistency(
-                        'No default value specified for %s parameter in'
-                        ' %s' % (p_name, identifier))
-                if value == 'no-default':
-                    continue
-                if a is None or a == value:
-                    continue
-            else:
-                if a is None:
-                    self._report_inconsistency(
-                        'Required property %s is not provided when calling'
-                        ' %s' % (p_name, identifier))
-                    continue
-            # call type verification
-            self._verify_type(prop, a, identifier)
+            validate = self._compile(
+                pending, ('type', id(prop)), prop, self._compile_type, prop)
+            checks.append((prop.get('name'), 'defaultvalue' in prop,
+                           prop.get('defaultvalue'), validate))
+
+        def _verify_object_type(arg, identifier, t=t):
+            # check if there are any extra prarameters
+            unknown_props = [key for key in arg
+                             if key not in prop_names]
+            if unknown_props:
+                if any_string:
+                    return
+                report('Following parameters %s were not'
+                       ' recognized' % (unknown_props))
+            # iterate over properties
+            for p_name, optional, value, validate in checks:
+                a = arg.get(p_name)
+
+                # check whether parameter is defined as optional and
+                # check default type
+                if optional:
+                    if value == 'needs updating':
+                        report('No default value specified for %s parameter'
+                               ' in %s' % (p_name, identifier))
+                    if value == 'no-default':
+                        continue
+                    if a is None or a == value:
+                        continue
+                else:
+                    if a is None:
+                        report('Required property %s is not provided when'
+                               ' calling %s' % (p_name, identifier))
+                        continue
+                # call type verification
+                validate(a, identifier)
+        return _verify_object_type
 
     def verify_retval(self, rep, ret):
         try:
@@ -370,7 +524,8 @@ class Schema(object):
             if ret_args:
                 if isinstance(ret, Suppressed):
                     ret = ret.value
-                self._verify_type(ret_args.get('type'), ret, rep.id)
+                validate = self._validator(ret_args.get('type'))
+                validate(ret, rep.id)
         except JsonRpcInvalidParamsError:
             raise
         except Exception:
@@ -384,11 +539,12 @@ class Schema(object):
             # we are not able to find unknown params
             for param in self.get_args(rep):
                 name = param.get('name')
+                validate = self._validator(param)
                 if name == 'no_name':
                     for key, value in six.iteritems(args):
                         if key == "notify_time":
                             continue
-                        self._verify_type(param, {key: value}, rep.id)
+                        validate({key: value}, rep.id)
                     continue
                 arg = args.get(name)
                 if arg is None:
@@ -397,7 +553,7 @@ class Schema(object):
                             'Required parameter %s is not '
                             'provided when sending %s' % (name, rep.id))
                     continue
-                self._verify_type(param, arg, rep.id)
+                validate(arg, rep.id)
         except JsonRpcInvalidParamsError:
             raise
         except Exception:
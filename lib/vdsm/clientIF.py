@@ -106,7 +106,8 @@ class clientIF(object):
         # operated by single object. Idealy the distinction between what is
         # served by QEMU-GA and what is server by oVirt GA should not be
         # visible to the rest of the code.
-        self.channelListener = Listener(self.log)
+        self.channelListener = Listener(
+            self.log, config.getint('vars', 'vmchannels_listener_threads'))
         self.qga_poller = QemuGuestAgentPoller(self, log, scheduler)
         self.mom = None
         self.servers = {}
@@ -565,11 +566,16 @@ class clientIF(object):
         return {'status': doneCode, 'alignment': aligning}
 
     def createVm(self, vmParams, vmRecover=False):
+        if vmRecover:
+            # Recovered VMs are created concurrently. Creating the Vm object
+            # parses the domain XML and metadata, and it does not need the
+            # lock since we do not check if the VM exists.
+            vm = Vm(self, vmParams, vmRecover)
         with self.vm_start_stop_lock:
             if not vmRecover:
                 if vmParams['vmId'] in self.vmContainer:
                     return errCode['exist']
-            vm = Vm(self, vmParams, vmRecover)
+                vm = Vm(self, vmParams, vmRecover)
             ret = vm.run()
             if not response.is_error(ret):
                 with self.vm_container_lock:
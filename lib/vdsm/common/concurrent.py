@@ -364,6 +364,65 @@ class ValidatingEvent(object):
                 self._cond.notify_all()
 
 
+class _Batch(object):
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+
+
+class GroupCommit(object):
+    """
+    Commit items submitted by concurrent threads in batches.
+
+    The first thread submitting an item commits it by calling func with a list
+    of items. Items submitted while func is running are collected, and
+    committed together by one of the waiting threads when func returns.
+
+    submit() returns when the batch including the item was committed. If func
+    raised, the error is raised in all the threads submitting items in the
+    batch.
+    """
+
+    def __init__(self, func):
+        self._func = func
+        # Protects the pending batch and the committing flag.
+        self._cond = threading.Condition(threading.Lock())
+        self._batch = _Batch()
+        self._committing = False
+
+    def submit(self, item):
+        """
+        Submit item and wait until it is committed.
+        """
+        with self._cond:
+            batch = self._batch
+            batch.items.append(item)
+
+            while self._committing and not batch.done:
+                self._cond.wait()
+
+            if not batch.done:
+                # Commit our batch, including items added while the
+                # previous batch was committed.
+                self._committing = True
+                self._batch = _Batch()
+                self._cond.release()
+                try:
+                    self._func(batch.items)
+                except Exception as e:
+                    batch.error = e
+                finally:
+                    self._cond.acquire()
+                    self._committing = False
+                    batch.done = True
+                    self._cond.notify_all()
+
+        if batch.error is not None:
+            raise batch.error
+
+
 def format_traceback(ident):
     """
     Return thread traceback by ident (thread identifier).
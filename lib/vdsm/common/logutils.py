@@ -140,6 +140,34 @@ class UserGroupEnforcingHandler(logging.handlers.WatchedFileHandler):
             return
         logging.handlers.WatchedFileHandler.flush(self)
 
+    def handle_batch(self, records):
+        """
+        Format records and write them with a single write() call.
+
+        Used by ThreadedHandler instead of calling handle() for every record.
+        """
+        lines = []
+        for record in records:
+            if not self.filter(record):
+                continue
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+
+        if not lines:
+            return
+
+        with self.lock:
+            try:
+                self.reopenIfNeeded()
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write("".join(lines))
+                self.flush()
+            except Exception:
+                self.handleError(records[-1])
+
 
 class TimezoneFormatter(logging.Formatter):
     def converter(self, timestamp):
@@ -178,6 +206,9 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
     # Interval for reporting handler stats.
     STATS_INTERVAL = 60
 
+    # Number of loggers reported in handler stats.
+    TOP_LOGGERS = 5
+
     _CLOSED = object()
 
     def __init__(self, capacity=2000, adaptive=True, start=True):
@@ -215,6 +246,10 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
         self._dropped_records = 0
         # The maximum number of pending records for the last interval.
         self._max_pending = 0
+        # Number of records per logger for the last interval, including
+        # dropped records.
+        self._loggers = collections.Counter()
+        self._closing = False
         self._thread = concurrent.thread(self._run, name="logfile")
         if start:
             self.start()
@@ -236,7 +271,12 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
         completed, warn about messages dropped during this interval.
         """
         with self._cond:
+            # Records logged during shutdown are dropped.
+            if self._closing:
+                return
+
             # First, handle this record.
+            self._loggers[record.name] += 1
             if self._can_handle(record):
                 self._queue.append(record)
                 self._cond.notify()
@@ -251,20 +291,23 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
             # Prepare stats and reset counters.
             dropped_records = self._dropped_records
             max_pending = self._max_pending
+            loggers = self._loggers
             self._last_report = record.created
             self._dropped_records = 0
             self._max_pending = 0
+            self._loggers = collections.Counter()
 
         # Report outside of the locked region to avoid deadlock.
-        self._report_stats(interval, dropped_records, max_pending)
+        self._report_stats(interval, dropped_records, max_pending, loggers)
 
     def close(self):
         """
         Extend Handler.close to stop the thread during shutdown.
         """
         logging.Handler.close(self)
-        self._queue.append(self._CLOSED)
         with self._cond:
+            self._closing = True
+            self._queue.append(self._CLOSED)
             self._cond.notify()
         self._thread.join()
         self._target = _DROPPER
@@ -304,26 +347,38 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
                 return size < limit
         return True
 
-    def _report_stats(self, interval, dropped_records, max_pending):
+    def _report_stats(self, interval, dropped_records, max_pending, loggers):
+        top_loggers = ", ".join(
+            "%s: %d" % item
+            for item in loggers.most_common(self.TOP_LOGGERS))
         if dropped_records:
             # Note: use critical level for better visibility and to prevent
             # filtering out of the message.
             logging.critical(
                 "ThreadedHandler is overloaded, dropped %d log messages in "
-                "the last %d seconds (max pending: %d)",
-                dropped_records, interval, max_pending)
+                "the last %d seconds (max pending: %d, top loggers: %s)",
+                dropped_records, interval, max_pending, top_loggers)
         else:
             logging.debug(
                 "ThreadedHandler is ok in the last %d seconds "
-                "(max pending: %d)",
-                interval, max_pending)
+                "(max pending: %d, top loggers: %s)",
+                interval, max_pending, top_loggers)
 
     def _run(self):
         while True:
-            # Wait for messages.
+            # Wait for messages, and take all pending messages.
             with self._cond:
                 while len(self._queue) == 0:
                     self._cond.wait()
+                batch = self._queue
+                self._queue = collections.deque()
+
+            # Nothing is queued after the close marker.
+            closed = batch[-1] is self._CLOSED
+            if closed:
+                batch.pop()
+                if not batch:
+                    return
 
             # Handle all pending messages before taking the lock again. Disable
             # flushing while handling pending messages so we do one write()
@@ -331,18 +386,21 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
             # improves throuput significantly.
             self._target.buffering = True
             try:
-                while len(self._queue):
-                    record = self._queue.popleft()
-                    if record is self._CLOSED:
-                        return
-                    self._target.handle(record)
+                if hasattr(self._target, "handle_batch"):
+                    self._target.handle_batch(batch)
+                else:
+                    for record in batch:
+                        self._target.handle(record)
             finally:
                 self._target.buffering = False
                 self._target.flush()
 
+            if closed:
+                return
+
             # Avoid reference cycles, specially exc_info that may hold a
             # traceback objects.
-            record = None
+            batch = record = None
 
 
 class _Dropper(object):
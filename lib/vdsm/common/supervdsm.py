@@ -22,14 +22,21 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import collections
 import os
+from multiprocessing import connection
+from multiprocessing import managers
 from multiprocessing.managers import BaseManager, RemoteError
 import logging
 import threading
 
+from vdsm.common import concurrent
 from vdsm.common import constants
 from vdsm.common import function
+from vdsm.common import tracing
+from vdsm.common.config import config
 from vdsm.common.panic import panic
+from vdsm.common.time import monotonic_time
 
 _g_singletonSupervdsmInstance = None
 _g_singletonSupervdsmInstance_lock = threading.Lock()
@@ -42,6 +49,108 @@ class _SuperVdsmManager(BaseManager):
     pass
 
 
+class _Connection(object):
+    """
+    Connection to supervdsm, used by one call at a time.
+
+    Uses the multiprocessing manager protocol. The server serves the
+    requests on a connection one at a time, so sending a request on a busy
+    connection would wait for the call in progress.
+    """
+
+    def __init__(self, address, authkey):
+        self._conn = connection.Client(address, authkey=authkey)
+        try:
+            managers.dispatch(
+                self._conn, None, "accept_connection",
+                ("vdsm|" + threading.current_thread().name,))
+        except Exception:
+            self._conn.close()
+            raise
+        self.broken = False
+
+    def call(self, obj_id, method, args, kwargs):
+        try:
+            self._conn.send((obj_id, method, args, kwargs))
+            kind, value = self._conn.recv()
+        except Exception:
+            # We don't know the state of the connection, it cannot be
+            # reused.
+            self.broken = True
+            self._conn.close()
+            raise
+        if kind == "#RETURN":
+            return value
+        raise managers.convert_to_error(kind, value)
+
+    def close(self):
+        self._conn.close()
+
+
+class _ConnectionPool(object):
+    """
+    Pool of connections to supervdsm.
+
+    A call is sent only on an idle connection. If all connections are busy,
+    a new connection is opened, so a slow call never delays other calls.
+    When a call completes, its connection is returned to the pool, keeping
+    up to size idle connections. Broken connections are closed.
+    """
+
+    def __init__(self, address, authkey, size):
+        self._address = address
+        self._authkey = authkey
+        self._size = size
+        self._lock = threading.Lock()
+        self._idle = []
+        self._closed = False
+
+    def call(self, obj_id, method, args, kwargs):
+        conn = self._acquire()
+        try:
+            return conn.call(obj_id, method, args, kwargs)
+        finally:
+            self._release(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+        for conn in idle:
+            conn.close()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return _Connection(self._address, self._authkey)
+
+    def _release(self, conn):
+        with self._lock:
+            if (not conn.broken and not self._closed and
+                    len(self._idle) < self._size):
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+class _MethodStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+
+    def add(self, elapsed, error):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.time_total += elapsed
+        self.time_max = max(self.time_max, elapsed)
+
+
 class ProxyCaller(object):
 
     def __init__(self, supervdsmProxy, funcName):
@@ -49,16 +158,7 @@ class ProxyCaller(object):
         self._supervdsmProxy = supervdsmProxy
 
     def __call__(self, *args, **kwargs):
-        callMethod = lambda: \
-            getattr(self._supervdsmProxy._svdsm, self._funcName)(*args,
-                                                                 **kwargs)
-        try:
-            return callMethod()
-        except RemoteError:
-            self._supervdsmProxy._connect()
-            raise RuntimeError(
-                "Broken communication with supervdsm. Failed call to %s"
-                % self._funcName)
+        return self._supervdsmProxy._call(self._funcName, args, kwargs)
 
 
 class SuperVdsmProxy(object):
@@ -67,17 +167,79 @@ class SuperVdsmProxy(object):
     """
     _log = logging.getLogger("SuperVdsmProxy")
 
-    def __init__(self):
+    def __init__(self, address=ADDRESS, connections=None):
+        if connections is None:
+            connections = config.getint("vars", "supervdsm_connections")
+        self._address = address
+        self._connections = connections
         self._manager = None
         self._svdsm = None
+        self._pool = None
+        self._stats_lock = threading.Lock()
+        self._stats = collections.defaultdict(_MethodStats)
         self._connect()
 
     def open(self, *args, **kwargs):
         # pylint: disable=no-member
         return self._manager.open(*args, **kwargs)
 
+    def batch(self, calls):
+        """
+        Run several calls in one round trip.
+
+        Arguments:
+            calls (list): list of (name, args, kwargs) tuples
+
+        Returns:
+            list of concurrent.Result objects. If a call failed, the result
+            value is the exception raised by the call.
+        """
+        results = self._call("batch", (calls,), {})
+        return [concurrent.Result(kind == "#RETURN", value)
+                for kind, value in results]
+
+    def stats(self):
+        """
+        Return dict of method name to dict with the number of calls,
+        number of errors, total and maximum call time in seconds.
+        """
+        with self._stats_lock:
+            return {name: {"count": s.count,
+                           "errors": s.errors,
+                           "time_total": s.time_total,
+                           "time_max": s.time_max}
+                    for name, s in self._stats.items()}
+
+    def _call(self, name, args, kwargs):
+        pool = self._pool
+        # The manager proxy keeps a reference to the instance on the server,
+        # we only need its id.
+        obj_id = self._svdsm._token.id
+        start = monotonic_time()
+        error = True
+        try:
+            with tracing.span("supervdsm." + name):
+                result = pool.call(obj_id, name, args, kwargs)
+            error = False
+            return result
+        except RemoteError:
+            self._reconnect(pool)
+            raise RuntimeError(
+                "Broken communication with supervdsm. Failed call to %s"
+                % name)
+        finally:
+            elapsed = monotonic_time() - start
+            with self._stats_lock:
+                self._stats[name].add(elapsed, error)
+
+    def _reconnect(self, pool):
+        with _g_singletonSupervdsmInstance_lock:
+            # Another thread may have reconnected already.
+            if pool is self._pool:
+                self._connect()
+
     def _connect(self):
-        self._manager = _SuperVdsmManager(address=ADDRESS, authkey=b'')
+        self._manager = _SuperVdsmManager(address=self._address, authkey=b'')
         self._manager.register('instance')
         self._manager.register('open')
         self._log.debug("Trying to connect to Super Vdsm")
@@ -90,11 +252,38 @@ class SuperVdsmProxy(object):
 
         # pylint: disable=no-member
         self._svdsm = self._manager.instance()
+        old_pool = self._pool
+        self._pool = _ConnectionPool(
+            self._address, b'', self._connections)
+        if old_pool is not None:
+            old_pool.close()
 
     def __getattr__(self, name):
         return ProxyCaller(self, name)
 
 
+def run_batch(instance, calls):
+    """
+    Run calls on the supervdsm server instance, returning list of
+    ("#RETURN", value) or ("#ERROR", exception) tuples.
+
+    Only public methods may be called, like the methods exposed by the
+    manager proxy.
+    """
+    results = []
+    for name, args, kwargs in calls:
+        try:
+            if name.startswith("_"):
+                raise AttributeError(
+                    "method %r is not exposed by supervdsm" % name)
+            value = getattr(instance, name)(*args, **kwargs)
+        except Exception as e:
+            results.append(("#ERROR", e))
+        else:
+            results.append(("#RETURN", value))
+    return results
+
+
 def getProxy():
     global _g_singletonSupervdsmInstance
     if _g_singletonSupervdsmInstance is None:
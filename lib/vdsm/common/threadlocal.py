@@ -26,3 +26,4 @@ import threading
 vars = threading.local()
 vars.task = None
 vars.context = None
+vars.trace = None
@@ -0,0 +1,274 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Lightweight request tracing.
+
+A trace records where time was spent while serving a request, using spans
+recorded at interesting boundaries: waiting in the executor queue, waiting
+for storage locks, running lvm commands, calling supervdsm, etc. Traces are
+keyed by the flow id sent by the client, and kept in a ring buffer of
+recent requests.
+
+Code running in the context of a request records spans using:
+
+    with tracing.span("lvm.cmd"):
+        run_command()
+
+If the current thread is not serving a traced request, span() does nothing,
+so it is cheap to use it in common code paths.
+
+Work done for a request in another thread can be added to the request trace
+using resume():
+
+    trace = tracing.current()
+    ...
+    # In another thread
+    with tracing.resume(trace):
+        with tracing.span("task.run"):
+            run_task()
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import collections
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+
+from vdsm.common.threadlocal import vars
+from vdsm.common.time import monotonic_time
+
+log = logging.getLogger("tracing")
+
+_tracer = None
+
+
+Span = collections.namedtuple("Span", (
+    "name",         # Span name (e.g. "lvm.cmd")
+    "start",        # Seconds since the start of the trace
+    "duration",     # Seconds
+))
+
+
+class Trace(object):
+
+    def __init__(self, verb, flow_id=None, clock=monotonic_time):
+        self.verb = verb
+        self.flow_id = flow_id
+        self.timestamp = time.time()
+        self.duration = None
+        self.spans = []
+        self._clock = clock
+        self._start = clock()
+
+    def add(self, name, start, duration):
+        """
+        Add span started at start (clock time), lasting duration seconds.
+        """
+        self.spans.append(Span(name, start - self._start, duration))
+
+    def finish(self):
+        self.duration = self._clock() - self._start
+
+    def info(self):
+        info = {
+            "verb": self.verb,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "spans": [dict(s._asdict()) for s in self.spans],
+        }
+        if self.flow_id:
+            info["flow_id"] = self.flow_id
+        return info
+
+    def __repr__(self):
+        return "<Trace verb=%s flow_id=%s duration=%s at 0x%x>" % (
+            self.verb, self.flow_id, self.duration, id(self))
+
+
+class Tracer(object):
+    """
+    Keep the most recent traces in a ring buffer.
+    """
+
+    def __init__(self, size, clock=monotonic_time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._traces = collections.deque(maxlen=size)
+
+    def begin(self, verb, flow_id=None):
+        return Trace(verb, flow_id=flow_id, clock=self._clock)
+
+    def end(self, trace):
+        trace.finish()
+        with self._lock:
+            self._traces.append(trace)
+
+    def traces(self):
+        with self._lock:
+            return list(self._traces)
+
+    def breakdown(self):
+        """
+        Return latency breakdown per verb, computed from the recent traces.
+
+        Spans may be added to a trace after the request was finished, for
+        example when a storage task is running. They are included in the
+        breakdown, so the spans total time may exceed the verb time.
+        """
+        verbs = {}
+        for trace in self.traces():
+            info = verbs.setdefault(trace.verb, {
+                "verb": trace.verb,
+                "count": 0,
+                "total": 0.0,
+                "max": 0.0,
+                "spans": collections.defaultdict(float),
+            })
+            info["count"] += 1
+            info["total"] += trace.duration
+            info["max"] = max(info["max"], trace.duration)
+            for span in list(trace.spans):
+                info["spans"][span.name] += span.duration
+
+        result = []
+        for info in verbs.values():
+            count = info.pop("count")
+            total = info.pop("total")
+            result.append({
+                "verb": info["verb"],
+                "count": count,
+                "avg": total / count,
+                "max": info["max"],
+                # Average time per request spent in every span.
+                "spans": {name: duration / count
+                          for name, duration in info["spans"].items()},
+            })
+        result.sort(key=lambda v: v["avg"] * v["count"], reverse=True)
+        return result
+
+    def slow_requests(self, threshold):
+        """
+        Return recent traces of requests that took at least threshold
+        seconds, slowest first.
+        """
+        slow = [t for t in self.traces() if t.duration >= threshold]
+        slow.sort(key=lambda t: t.duration, reverse=True)
+        return slow
+
+
+def start(size):
+    global _tracer
+    log.info("Starting request tracing (size=%d)", size)
+    _tracer = Tracer(size)
+
+
+def stop():
+    global _tracer
+    log.info("Stopping request tracing")
+    _tracer = None
+
+
+def begin(verb, flow_id=None):
+    """
+    Begin tracing a request in the current thread. Returns the trace, or None
+    if tracing is disabled.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return None
+    trace = tracer.begin(verb, flow_id=flow_id)
+    vars.trace = trace
+    return trace
+
+
+def end(trace):
+    """
+    End tracing a request started by begin() in the current thread.
+    """
+    vars.trace = None
+    tracer = _tracer
+    if trace is None or tracer is None:
+        return
+    tracer.end(trace)
+
+
+def current():
+    """
+    Return the trace of the request served by the current thread, or None.
+    """
+    return getattr(vars, "trace", None)
+
+
+@contextmanager
+def resume(trace):
+    """
+    Record spans in the current thread to trace, created in another thread.
+    """
+    saved = current()
+    vars.trace = trace
+    try:
+        yield
+    finally:
+        vars.trace = saved
+
+
+@contextmanager
+def span(name):
+    """
+    Record the time spent in the context in the current trace.
+    """
+    trace = current()
+    if trace is None:
+        yield
+        return
+    start = monotonic_time()
+    try:
+        yield
+    finally:
+        trace.add(name, start, monotonic_time() - start)
+
+
+def record(name, start):
+    """
+    Record span that started at start (monotonic_time() value) and ended
+    now, for example the time a request was waiting in a queue.
+    """
+    trace = current()
+    if trace is not None:
+        now = monotonic_time()
+        trace.add(name, start, now - start)
+
+
+def breakdown():
+    tracer = _tracer
+    if tracer is None:
+        return []
+    return tracer.breakdown()
+
+
+def slow_requests(threshold):
+    tracer = _tracer
+    if tracer is None:
+        return []
+    return [t.info() for t in tracer.slow_requests(threshold)]
@@ -23,15 +23,20 @@ from __future__ import division
 
 import calendar
 import errno
+import functools
+import io
 import logging
 import os
 import socket
+import threading
 import time
 import xml.etree.ElementTree as etree
 
 from vdsm.common import cmdutils
 from vdsm.common import commands
 from vdsm.common.compat import subprocess
+from vdsm.common.time import monotonic_time
+from vdsm.config import config
 from vdsm.network.netinfo import addresses
 
 from . import exception as ge
@@ -106,11 +111,115 @@ class SnapshotStatus:
     DEACTIVATED = 'DEACTIVATED'
 
 
-def _execGluster(cmd):
+class _Execution(object):
+    """
+    A command execution shared by concurrent callers.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._out = None
+        self._error = None
+
+    def set_result(self, out):
+        self._out = out
+        self._done.set()
+
+    def set_error(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._out
+
+
+class _CommandCache(object):
+    """
+    Cache the output of read only gluster commands for ttl seconds.
+
+    Concurrent calls running the same command share one execution. Running
+    any other gluster command invalidates the cache, since it may modify
+    gluster state.
+    """
+
+    def __init__(self, ttl, clock=monotonic_time):
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # command -> (expiration time, output)
+        self._entries = {}
+        # command -> _Execution
+        self._running = {}
+        # Incremented when the cache is invalidated, so output of commands
+        # started before the invalidation is not cached.
+        self._generation = 0
+
+    def run(self, cmd, func):
+        if self._ttl <= 0:
+            return func(cmd)
+
+        key = tuple(cmd)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                return entry[1]
+            execution = self._running.get(key)
+            if execution is not None:
+                owner = False
+            else:
+                execution = self._running[key] = _Execution()
+                generation = self._generation
+                owner = True
+
+        if not owner:
+            return execution.wait()
+
+        try:
+            out = func(cmd)
+        except Exception as e:
+            with self._lock:
+                del self._running[key]
+            execution.set_error(e)
+            raise
+
+        with self._lock:
+            del self._running[key]
+            if generation == self._generation:
+                self._entries[key] = (self._clock() + self._ttl, out)
+        execution.set_result(out)
+        return out
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+_cache = _CommandCache(config.getint('gluster', 'cli_cache_ttl'))
+
+
+def _execGluster(cmd, readonly=False):
     try:
         return commands.run(cmd)
     except cmdutils.Error as e:
         raise ge.GlusterCmdFailedException(rc=e.rc, err=[e.msg])
+    finally:
+        if not readonly:
+            _cache.invalidate()
+
+
+def _execGlusterCached(cmd):
+    return _cache.run(cmd, functools.partial(_execGluster, readonly=True))
+
+
+def _checkOpStatus(rv, errNo, msg):
+    if rv != 0:
+        if errNo != 0:
+            rv = errNo
+        raise ge.GlusterCmdFailedException(rc=rv, err=[msg])
 
 
 def _getTree(out):
@@ -121,17 +230,64 @@ def _getTree(out):
         errNo = int(tree.find('opErrno').text)
     except _etreeExceptions:  # pylint: disable=catching-non-exception
         raise ge.GlusterXmlErrorException(err=out)
-    if rv == 0:
-        return tree
-    else:
-        if errNo != 0:
-            rv = errNo
-        raise ge.GlusterCmdFailedException(rc=rv, err=[msg])
+    _checkOpStatus(rv, errNo, msg)
+    return tree
+
+
+def _iterTree(out, path):
+    """
+    Parse gluster xml output incrementally, yielding the children of the
+    elements at path (e.g. 'volInfo/volumes') when they are complete.
+
+    Yielded elements are cleared when the caller is done with them, so
+    memory usage does not grow with the number of volumes or bricks.
+    Raises the same errors as _getTree.
+    """
+    if isinstance(out, str):
+        out = out.encode('utf-8')
+    parent = path.split('/')
+    stack = []
+    status = {}
+    checked = False
+    try:
+        for event, el in etree.iterparse(io.BytesIO(out),
+                                         events=('start', 'end')):
+            if event == 'start':
+                stack.append(el.tag)
+                continue
+            stack.pop()
+            # stack[0] is the root element (cliOutput).
+            if len(stack) == 1:
+                status[el.tag] = el.text
+            elif stack[1:] == parent:
+                if not checked:
+                    _checkIterStatus(status, out)
+                    checked = True
+                yield el
+                el.clear()
+    except _etreeExceptions:  # pylint: disable=catching-non-exception
+        raise ge.GlusterXmlErrorException(err=out)
+    if not checked:
+        _checkIterStatus(status, out)
+
+
+def _checkIterStatus(status, out):
+    try:
+        rv = int(status['opRet'])
+        errNo = int(status['opErrno'])
+    except (KeyError, TypeError, ValueError):
+        raise ge.GlusterXmlErrorException(err=out)
+    _checkOpStatus(rv, errNo, status.get('opErrstr'))
 
 
-def _execGlusterXml(cmd):
+def _execGlusterXml(cmd, readonly=False):
     cmd.append('--xml')
-    return _getTree(_execGluster(cmd))
+    return _getTree(_execGluster(cmd, readonly=readonly))
+
+
+def _execGlusterXmlCached(cmd):
+    cmd.append('--xml')
+    return _getTree(_execGlusterCached(cmd))
 
 
 def _execGlusterXmlWithTimeout(cmd, timeout=_DEFAULT_TIMEOUT):
@@ -179,7 +335,7 @@ def hostUUIDGet():
     """
 
     command = _getGlusterSystemCmd() + ["uuid", "get"]
-    out = _execGluster(command)
+    out = _execGlusterCached(command)
     out = out.decode("utf-8")
     if not out.startswith('UUID: '):
         raise ge.GlusterHostUUIDNotFoundException()
@@ -188,12 +344,29 @@ def hostUUIDGet():
 
 
 def _parseVolumeStatus(tree):
-    status = {'name': tree.find('volStatus/volumes/volume/volName').text,
+    elements = (el for volume in tree.findall('volStatus/volumes/volume')
+                for el in volume)
+    return _parseVolumeStatusElements(elements)
+
+
+def _parseVolumeStatusElements(elements):
+    """
+    Parse volume status from the children of the volStatus/volumes/volume
+    elements, in document order.
+    """
+    status = {'name': None,
               'bricks': [],
               'nfs': [],
               'shd': []}
     hostname = _getLocalIpAddress() or _getGlusterHostName()
-    for el in tree.findall('volStatus/volumes/volume/node'):
+    for el in elements:
+        if el.tag == 'volName':
+            if status['name'] is None:
+                status['name'] = el.text
+            continue
+        if el.tag != 'node':
+            continue
+
         value = {}
 
         for ch in el.getchildren():
@@ -231,6 +404,8 @@ def _parseVolumeStatus(tree):
                                      'rdma_port': ports['rdma'],
                                      'status': value['status'],
                                      'pid': value['pid']})
+    if status['name'] is None:
+        raise ValueError("Volume name not found")
     return status
 
 
@@ -382,21 +557,22 @@ def volumeStatus(volumeName, brick=None, option=None):
         command.append(brick)
     if option:
         command.append(option)
+    command.append('--xml')
     try:
-        xmltree = _execGlusterXml(command)
-    except ge.GlusterCmdFailedException as e:
-        raise ge.GlusterVolumeStatusFailedException(rc=e.rc, err=e.err)
-    try:
+        out = _execGlusterCached(command)
         if option == 'detail':
-            return _parseVolumeStatusDetail(xmltree)
+            return _parseVolumeStatusDetail(_getTree(out))
         elif option == 'clients':
-            return _parseVolumeStatusClients(xmltree)
+            return _parseVolumeStatusClients(_getTree(out))
         elif option == 'mem':
-            return _parseVolumeStatusMem(xmltree)
+            return _parseVolumeStatusMem(_getTree(out))
         else:
-            return _parseVolumeStatus(xmltree)
+            return _parseVolumeStatusElements(
+                _iterTree(out, 'volStatus/volumes/volume'))
+    except ge.GlusterCmdFailedException as e:
+        raise ge.GlusterVolumeStatusFailedException(rc=e.rc, err=e.err)
     except _etreeExceptions:  # pylint: disable=catching-non-exception
-        raise ge.GlusterXmlErrorException(err=[etree.tostring(xmltree)])
+        raise ge.GlusterXmlErrorException(err=[out])
 
 
 def _parseVolumeInfo(tree):
@@ -413,8 +589,17 @@ def _parseVolumeInfo(tree):
                       'redundancyCount': REDUNDANCY_COUNT,
                       'isArbiter': [True/False]}, ...}
     """
+    return _parseVolumeInfoElements(tree.findall('volInfo/volumes/*'))
+
+
+def _parseVolumeInfoElements(elements):
+    """
+    Parse volume info from the children of the volInfo/volumes element.
+    """
     volumes = {}
-    for el in tree.findall('volInfo/volumes/volume'):
+    for el in elements:
+        if el.tag != 'volume':
+            continue
         value = {}
         value['volumeName'] = el.find('name').text
         value['uuid'] = el.find('id').text
@@ -534,14 +719,14 @@ def volumeInfo(volumeName=None, remoteServer=None):
         command += ['--remote-host=%s' % remoteServer]
     if volumeName:
         command.append(volumeName)
+    command.append('--xml')
     try:
-        xmltree = _execGlusterXml(command)
+        out = _execGlusterCached(command)
+        return _parseVolumeInfoElements(_iterTree(out, 'volInfo/volumes'))
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumesListFailedException(rc=e.rc, err=e.err)
-    try:
-        return _parseVolumeInfo(xmltree)
     except _etreeExceptions:  # pylint: disable=catching-non-exception
-        raise ge.GlusterXmlErrorException(err=[etree.tostring(xmltree)])
+        raise ge.GlusterXmlErrorException(err=[out])
 
 
 @gluster_mgmt_api
@@ -624,7 +809,7 @@ def volumeSet(volumeName, option, value):
 
 def _checkIfVolumeCreated(volumeName):
     vol_info_cmd = _getGlusterVolCmd() + ["info", volumeName]
-    xmltree = _execGlusterXml(vol_info_cmd)
+    xmltree = _execGlusterXml(vol_info_cmd, readonly=True)
     vol_info = xmltree.find('volInfo/volumes/volume')
     status = vol_info.find('statusStr').text.upper()
     if status == "CREATED":
@@ -647,7 +832,7 @@ def _parseVolumeSetHelpXml(out):
 def volumeSetHelpXml():
     command = _getGlusterVolCmd() + ["set", 'help-xml']
     try:
-        out = _execGluster(command)
+        out = _execGluster(command, readonly=True)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumeSetHelpXmlFailedException(rc=e.rc, err=e.err)
     return _parseVolumeSetHelpXml(out)
@@ -781,7 +966,7 @@ def _parseVolumeRebalanceRemoveBrickStatus(xmltree, mode):
 def volumeRebalanceStatus(volumeName):
     command = _getGlusterVolCmd() + ["rebalance", volumeName, "status"]
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXml(command, readonly=True)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumeRebalanceStatusFailedException(rc=e.rc,
                                                              err=e.err)
@@ -846,7 +1031,7 @@ def volumeRemoveBrickStatus(volumeName, brickList, replicaCount=0):
         command += ["replica", "%s" % replicaCount]
     command += brickList + ["status"]
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXml(command, readonly=True)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumeRemoveBrickStatusFailedException(rc=e.rc,
                                                                err=e.err)
@@ -936,7 +1121,7 @@ def peerStatus():
     """
     command = _getGlusterPeerCmd() + ["status"]
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXmlCached(command)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterHostsListFailedException(rc=e.rc, err=e.err)
     try:
@@ -1029,7 +1214,7 @@ def volumeProfileInfo(volumeName, nfs=False):
     if nfs:
         command += ["nfs"]
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXml(command, readonly=True)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumeProfileInfoFailedException(rc=e.rc, err=e.err)
     try:
@@ -1077,7 +1262,7 @@ def _parseVolumeTasks(tree):
 def volumeTasks(volumeName="all"):
     command = _getGlusterVolCmd() + ["status", volumeName, "tasks"]
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXmlCached(command)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumeTasksFailedException(rc=e.rc, err=e.err)
     try:
@@ -1219,7 +1404,7 @@ def volumeGeoRepStatus(volumeName=None, remoteHost=None,
     command.append("status")
 
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXmlCached(command)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterGeoRepStatusFailedException(rc=e.rc, err=e.err)
     try:
@@ -1560,7 +1745,7 @@ def snapshotInfo(volumeName=None):
     if volumeName:
         command += ["volume", volumeName]
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXml(command, readonly=True)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterSnapshotInfoFailedException(rc=e.rc, err=e.err)
     try:
@@ -1709,7 +1894,7 @@ def globalVolumeOptions():
     command = _getGlusterVolCmd() + ["get", "all", "all"]
 
     try:
-        xmltree = _execGlusterXml(command)
+        xmltree = _execGlusterXml(command, readonly=True)
     except ge.GlusterCmdFailedException as e:
         raise ge.GlusterVolumeGetGlobalOptionsFailedException(rc=e.rc,
                                                               err=e.err)
@@ -21,10 +21,15 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import collections
+import errno
 import gc
 import logging
 import os
 import threading
+import time
+
+import six
 
 from vdsm.common import concurrent
 from vdsm.common import cpuarch
@@ -40,7 +45,9 @@ def start():
     assert _monitor is None
     if config.getboolean("devel", "health_monitor_enable"):
         interval = config.getint("devel", "health_check_interval")
-        _monitor = Monitor(interval)
+        gc_thresholds = parse_gc_thresholds(
+            config.get("devel", "health_gc_thresholds"))
+        _monitor = Monitor(interval, gc_thresholds=gc_thresholds)
         _monitor.start()
 
 
@@ -51,29 +58,63 @@ def stop():
         _monitor = None
 
 
+def thread_stats():
+    """
+    Return CPU usage of vdsm threads grouped by thread name prefix, sorted by
+    CPU usage, or an empty list if the health monitor is not running.
+    """
+    monitor = _monitor
+    if monitor is None:
+        return []
+    return monitor.thread_stats()
+
+
 class Monitor(object):
 
     log = logging.getLogger("health")
 
-    def __init__(self, interval):
+    # Number of checks used to compute thread groups CPU usage average.
+    HISTORY = 10
+
+    # Number of thread groups logged on every check.
+    TOP_THREADS = 5
+
+    def __init__(self, interval, gc_thresholds=None):
         self._interval = interval
+        self._gc_thresholds = gc_thresholds
         self._thread = concurrent.thread(self._run, name="health")
         self._done = threading.Event()
         self._last = ProcStat()
+        self._gc_stats = GCStats()
+        self._last_gc = self._gc_stats.snapshot()
+        self._last_tasks = TaskStat.all()
+        # Recent CPU usage of every thread group, for computing trends.
+        self._history = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.HISTORY))
+        self._thread_stats = []
         self._stats = {}
 
     def start(self):
         self.log.info("Starting health monitor (interval=%d)", self._interval)
+        if self._gc_thresholds:
+            self.log.info("Setting garbage collector thresholds to %s",
+                          self._gc_thresholds)
+            gc.set_threshold(*self._gc_thresholds)
+        self._gc_stats.install()
         self._thread.start()
 
     def stop(self):
         self.log.info("Stopping health monitor")
+        self._gc_stats.uninstall()
         self._done.set()
 
     def wait(self):
         self.log.debug("Waiting for health monitor")
         self._thread.join()
 
+    def thread_stats(self):
+        return self._thread_stats
+
     def _run(self):
         self.log.debug("Health monitor started")
         saved_flags = gc.get_debug()
@@ -92,11 +133,24 @@ class Monitor(object):
         self.log.debug("Checking health")
         self._check_garbage()
         self._check_resources()
+        self._check_threads()
         self._report_stats()
 
     def _check_garbage(self):
-        collected = gc.collect()
-        self.log.debug("Collected %d objects", collected)
+        # We used to run a full collection here, blocking all threads for
+        # a long time in a big process. Now we only report the collections
+        # done by the interpreter since the last check.
+        current = self._gc_stats.snapshot()
+        self._stats['gc'] = current.delta(self._last_gc)
+        self._last_gc = current
+        for gen, stats in enumerate(self._stats['gc']):
+            self.log.debug("gen%d: collections=%d, collected=%d, "
+                           "pause_total=%.3f, pause_max=%.3f",
+                           gen,
+                           stats.collections,
+                           stats.collected,
+                           stats.pause_total,
+                           stats.pause_max)
         # Copy garbage so it is not modified while iterate over it.
         uncollectable = gc.garbage[:]
         if uncollectable:
@@ -123,18 +177,199 @@ class Monitor(object):
                        abs(delta_rss),
                        self._stats['threads'])
 
+    def _check_threads(self):
+        current = TaskStat.all()
+        groups = {}
+        for tid, task in six.iteritems(current):
+            last = self._last_tasks.get(tid)
+            # Thread ids may be reused by new threads.
+            if last is None or last.name != task.name:
+                last = None
+            group = groups.setdefault(thread_group(task.name), [0, 0.0, 0.0])
+            group[0] += 1
+            group[1] += task.utime - (last.utime if last else 0)
+            group[2] += task.stime - (last.stime if last else 0)
+        self._last_tasks = current
+
+        for name in list(self._history):
+            if name not in groups:
+                del self._history[name]
+
+        stats = []
+        for name, (count, utime, stime) in six.iteritems(groups):
+            cpu = (utime + stime) / self._interval * 100
+            history = self._history[name]
+            history.append(cpu)
+            stats.append({
+                'name': name,
+                'threads': count,
+                'cpu_user': utime / self._interval * 100,
+                'cpu_sys': stime / self._interval * 100,
+                'cpu_avg': sum(history) / len(history),
+            })
+        stats.sort(key=lambda g: g['cpu_user'] + g['cpu_sys'], reverse=True)
+        self._thread_stats = stats
+
+        top = ["%s=%.2f%%" % (g['name'], g['cpu_user'] + g['cpu_sys'])
+               for g in stats[:self.TOP_THREADS]]
+        self.log.debug("Top threads: %s", ", ".join(top))
+
     def _report_stats(self):
         prefix = "hosts.vdsm"
         report = {}
         report[prefix + '.gc.uncollectable'] = \
             self._stats['uncollectable_obj']
+        for gen, stats in enumerate(self._stats['gc']):
+            gen_prefix = '%s.gc.gen%d' % (prefix, gen)
+            report[gen_prefix + '.collections'] = stats.collections
+            report[gen_prefix + '.collected'] = stats.collected
+            report[gen_prefix + '.pause_total'] = stats.pause_total
+            report[gen_prefix + '.pause_max'] = stats.pause_max
+            for bound, count in zip(GC_PAUSE_BUCKETS, stats.pauses):
+                report['%s.pause_le_%dms' % (gen_prefix, bound)] = count
         report[prefix + '.cpu.user_pct'] = self._stats['utime_pct']
         report[prefix + '.cpu.sys_pct'] = self._stats['stime_pct']
         report[prefix + '.memory.rss'] = self._stats['rss']
         report[prefix + '.threads_count'] = self._stats['threads']
+        for group in self._thread_stats:
+            group_prefix = '%s.threads.%s' % (
+                prefix, metric_name(group['name']))
+            report[group_prefix + '.count'] = group['threads']
+            report[group_prefix + '.cpu.user_pct'] = group['cpu_user']
+            report[group_prefix + '.cpu.sys_pct'] = group['cpu_sys']
+            report[group_prefix + '.cpu.avg_pct'] = group['cpu_avg']
         metrics.send(report)
 
 
+# Upper bounds (in milliseconds) of the garbage collection pause histogram
+# buckets. The last bucket counts the rest of the pauses.
+GC_PAUSE_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 2**31)
+
+
+def parse_gc_thresholds(value):
+    """
+    Parse garbage collector thresholds configuration ("700,10,10"). Returns
+    tuple of ints, or None if value is empty.
+    """
+    if not value.strip():
+        return None
+    thresholds = tuple(int(v, 10) for v in value.split(","))
+    if not 1 <= len(thresholds) <= 3:
+        raise ValueError("Invalid garbage collector thresholds: %r" % value)
+    return thresholds
+
+
+class GenerationStats(object):
+    """
+    Garbage collection statistics of one generation.
+    """
+
+    def __init__(self):
+        self.collections = 0
+        self.collected = 0
+        self.uncollectable = 0
+        # Seconds
+        self.pause_total = 0.0
+        self.pause_max = 0.0
+        # Number of pauses in every GC_PAUSE_BUCKETS bucket.
+        self.pauses = [0] * len(GC_PAUSE_BUCKETS)
+
+    def copy(self):
+        stats = GenerationStats()
+        stats.collections = self.collections
+        stats.collected = self.collected
+        stats.uncollectable = self.uncollectable
+        stats.pause_total = self.pause_total
+        stats.pause_max = self.pause_max
+        stats.pauses = self.pauses[:]
+        return stats
+
+    def add(self, pause, collected, uncollectable):
+        self.collections += 1
+        self.collected += collected
+        self.uncollectable += uncollectable
+        self.pause_total += pause
+        self.pause_max = max(self.pause_max, pause)
+        for i, bound in enumerate(GC_PAUSE_BUCKETS):
+            if pause * 1000 <= bound:
+                self.pauses[i] += 1
+                break
+
+
+class GCSnapshot(object):
+    """
+    Garbage collection statistics of all generations at some point in time.
+    """
+
+    def __init__(self, generations):
+        self.generations = generations
+
+    def delta(self, previous):
+        """
+        Return list of GenerationStats with the collections since the
+        previous snapshot.
+
+        The maximum pause is the maximum since the previous snapshot, since
+        GCStats.snapshot() resets it.
+        """
+        result = []
+        for cur, prev in zip(self.generations, previous.generations):
+            stats = GenerationStats()
+            stats.collections = cur.collections - prev.collections
+            stats.collected = cur.collected - prev.collected
+            stats.uncollectable = cur.uncollectable - prev.uncollectable
+            stats.pause_total = cur.pause_total - prev.pause_total
+            stats.pause_max = cur.pause_max
+            stats.pauses = [c - p for c, p in zip(cur.pauses, prev.pauses)]
+            result.append(stats)
+        return result
+
+
+class GCStats(object):
+    """
+    Track garbage collections using gc.callbacks.
+
+    The callback runs in the thread triggering the collection, while the
+    interpreter is inside the collector, so it must not take locks or
+    allocate much. It only updates counters, and the health monitor thread
+    copies them when checking health.
+    """
+
+    def __init__(self):
+        self._generations = [GenerationStats() for i in range(3)]
+        self._start = None
+
+    def install(self):
+        # gc.callbacks is not available in python 2.
+        callbacks = getattr(gc, "callbacks", None)
+        if callbacks is None:
+            logging.warning("gc.callbacks not available, garbage collection "
+                            "statistics are not collected")
+            return
+        callbacks.append(self._callback)
+
+    def uninstall(self):
+        callbacks = getattr(gc, "callbacks", None)
+        if callbacks is not None and self._callback in callbacks:
+            callbacks.remove(self._callback)
+
+    def snapshot(self):
+        generations = []
+        for stats in self._generations:
+            generations.append(stats.copy())
+            stats.pause_max = 0.0
+        return GCSnapshot(generations)
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif phase == "stop" and self._start is not None:
+            pause = time.perf_counter() - self._start
+            self._start = None
+            self._generations[info["generation"]].add(
+                pause, info["collected"], info["uncollectable"])
+
+
 class ProcStat(object):
 
     _TICKS_PER_SEC = os.sysconf("SC_CLK_TCK")
@@ -150,6 +385,60 @@ class ProcStat(object):
         self.rss = int(fields[23], 10) * cpuarch.PAGE_SIZE_BYTES // 1024
 
 
+class TaskStat(object):
+    """
+    CPU usage of a single thread.
+    """
+
+    _TICKS_PER_SEC = os.sysconf("SC_CLK_TCK")
+    _DIR = "/proc/self/task"
+
+    @classmethod
+    def all(cls):
+        """
+        Return dict mapping thread id to TaskStat for all process threads.
+        """
+        tasks = {}
+        for tid in os.listdir(cls._DIR):
+            path = os.path.join(cls._DIR, tid, "stat")
+            try:
+                with open(path, "rb") as f:
+                    line = f.readline()
+            except EnvironmentError as e:
+                # Thread terminated since we listed the directory.
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            tasks[int(tid)] = cls(line)
+        return tasks
+
+    def __init__(self, line):
+        # The thread name may contain spaces and parenthesis, so we split
+        # on the last parenthesis. See proc(5) for available fields.
+        start = line.index(b"(")
+        end = line.rindex(b")")
+        self.name = line[start + 1:end].decode("utf-8", "replace")
+        fields = line[end + 2:].split()
+        # Fields 14 and 15, fields list starts at field 3.
+        self.utime = int(fields[11], 10) / self._TICKS_PER_SEC
+        self.stime = int(fields[12], 10) / self._TICKS_PER_SEC
+
+
+def thread_group(name):
+    """
+    Return the group of a thread. Threads created by concurrent.thread are
+    named "group/N" (e.g. "jsonrpc/3").
+    """
+    return name.split("/", 1)[0]
+
+
+def metric_name(name):
+    """
+    Return name usable as metric name component.
+    """
+    return name.replace(".", "_").replace(" ", "_")
+
+
 def saferepr(obj):
     """
     Some objects from standard library fail in repr because of buggy __repr__
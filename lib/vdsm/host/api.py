@@ -101,6 +101,62 @@ def send_metrics(hoststats):
         logging.exception('Host metrics collection failed')
 
 
+def send_vmchannels_metrics(shards_stats):
+    prefix = "hosts.vmchannels"
+    data = {}
+
+    for index, shard_stats in enumerate(shards_stats):
+        shard_prefix = prefix + '.shard.%d' % index
+        for name, value in shard_stats.items():
+            data[shard_prefix + '.' + name] = value
+
+    metrics.send(data)
+
+
+def send_supervdsm_metrics(methods_stats):
+    prefix = "hosts.supervdsm"
+    data = {}
+
+    for method, method_stats in methods_stats.items():
+        method_prefix = prefix + '.' + method
+        for name, value in method_stats.items():
+            data[method_prefix + '.' + name] = value
+
+    metrics.send(data)
+
+
+def send_volume_metadata_metrics(reads):
+    prefix = "hosts.storage.volume_metadata_reads"
+    data = {}
+
+    for verb, count in reads.items():
+        data[prefix + '.' + verb] = count
+
+    metrics.send(data)
+
+
+def send_sampling_metrics(elapsed):
+    metrics.send({"hosts.sampling.duration": elapsed})
+
+
+def send_vm_sampling_metrics(group, elapsed):
+    metrics.send({"hosts.vm_sampling." + group + ".duration": elapsed})
+
+
+def send_periodic_metrics(operation, stats):
+    prefix = "hosts.periodic." + operation
+    data = {}
+
+    for name, value in stats.items():
+        if name == "skipped":
+            for reason, count in value.items():
+                data[prefix + ".skipped." + reason] = count
+        else:
+            data[prefix + "." + name] = value
+
+    metrics.send(data)
+
+
 def _readSwapTotalFree():
     meminfo = utils.readMemInfo()
     return meminfo['SwapTotal'] // 1024, meminfo['SwapFree'] // 1024
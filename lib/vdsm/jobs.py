@@ -105,6 +105,14 @@ class Job(object):
     def progress(self):
         return None
 
+    @property
+    def phases(self):
+        """
+        Jobs running in phases may return a dict mapping phase name to the
+        seconds spent in the phase.
+        """
+        return None
+
     @property
     def job_type(self):
         return self._JOB_TYPE
@@ -122,6 +130,10 @@ class Job(object):
         if self.progress is not None:
             ret['progress'] = self.progress
 
+        phases = self.phases
+        if phases is not None:
+            ret['phases'] = phases
+
         if self.error:
             ret['error'] = self.error.info()
 
@@ -37,6 +37,9 @@ from vdsm.common.units import MiB
 
 _start = None
 
+# Serialize output from concurrent disk copies.
+_output_lock = threading.Lock()
+
 
 class VMAdapter(object):
     def __init__(self, vm, src):
@@ -73,10 +76,11 @@ class StreamAdapter(object):
 
 
 class Sparseness(object):
-    def __init__(self, opaque, estimated_size):
+    def __init__(self, opaque, estimated_size, disk=None):
         self.done = 0
         self.opaque = opaque
         self.estimated_size = estimated_size
+        self.disk = disk
 
 
 def bytesWriteHandler(stream, buf, opaque):
@@ -87,7 +91,7 @@ def bytesWriteHandler(stream, buf, opaque):
 def recvSkipHandler(stream, length, opaque):
     opaque.done += length
     progress = min(99, opaque.done * 100 // opaque.estimated_size)
-    write_progress(progress)
+    write_progress(progress, opaque.disk)
     fd = opaque.opaque
     cur = os.lseek(fd, length, os.SEEK_CUR)
     return os.ftruncate(fd, cur)
@@ -117,37 +121,64 @@ def arguments(args):
                         help='verbose output')
     parser.add_argument('--allocation', dest='allocation', default='',
                         help='Allocation Policy')
+    parser.add_argument('--parallel', dest='parallel', default=1, type=int,
+                        help='Number of disks to copy concurrently')
 
     return parser.parse_args(args)
 
 
 def write_output(msg):
-    sys.stdout.write('[%7.1f] %s\n' % (time.monotonic_time() - _start, msg))
-    sys.stdout.flush()
+    elapsed = time.monotonic_time() - _start
+    with _output_lock:
+        sys.stdout.write('[%7.1f] %s\n' % (elapsed, msg))
+        sys.stdout.flush()
 
 
 def write_error(e):
     write_output("ERROR: %s" % e)
 
 
-def write_progress(progress):
-    sys.stdout.write('    (%d/100%%)\r' % progress)
-    sys.stdout.flush()
+def write_progress(progress, disk=None):
+    """
+    Write disk copy progress. When copying disks concurrently, the disk
+    number is included, since progress of several disks is interleaved.
+    """
+    with _output_lock:
+        if disk is None:
+            sys.stdout.write('    (%d/100%%)\r' % progress)
+        else:
+            sys.stdout.write('    (disk %d: %d/100%%)\r' % (disk, progress))
+        sys.stdout.flush()
+
+
+def write_estimated_size(estimated_size, disk=None):
+    """
+    Write the estimated size of the disk, using virt-v2v format, used to
+    report copy throughput.
+    """
+    with _output_lock:
+        if disk is None:
+            sys.stdout.write('target_estimated_size = %d\n' % estimated_size)
+        else:
+            sys.stdout.write('disk %d target_estimated_size = %d\n'
+                             % (disk, estimated_size))
+        sys.stdout.flush()
 
 
-def volume_progress(op, done, estimated_size):
+def volume_progress(op, done, estimated_size, disk):
     while op.done < estimated_size:
         progress = min(99, op.done * 100 // estimated_size)
-        write_progress(progress)
+        write_progress(progress, disk)
         if done.wait(1):
             break
-    write_progress(100)
+    write_progress(100, disk)
 
 
 @contextmanager
-def progress(op, estimated_size):
+def progress(op, estimated_size, disk):
     done = threading.Event()
-    th = concurrent.thread(volume_progress, args=(op, done, estimated_size))
+    th = concurrent.thread(volume_progress,
+                           args=(op, done, estimated_size, disk))
     th.start()
     try:
         yield th
@@ -156,17 +187,18 @@ def progress(op, estimated_size):
         th.join()
 
 
-def download_disk(adapter, estimated_size, size, dest, bufsize):
+def download_disk(adapter, estimated_size, size, dest, bufsize, disk=None):
     op = directio.Receive(dest, adapter, size=size, buffersize=bufsize)
-    with progress(op, estimated_size):
+    with progress(op, estimated_size, disk):
         op.run()
     adapter.finish()
 
 
-def download_disk_sparse(stream, estimated_size, size, dest, bufsize):
+def download_disk_sparse(stream, estimated_size, size, dest, bufsize,
+                         disk=None):
     fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
-    op = Sparseness(fd, estimated_size)
-    with progress(op, estimated_size):
+    op = Sparseness(fd, estimated_size, disk)
+    with progress(op, estimated_size, disk):
         stream.sparseRecvAll(bytesWriteHandler, recvSkipHandler, op)
     stream.finish()
     os.close(fd)
@@ -192,6 +224,8 @@ def handle_volume(con, diskno, src, dst, options):
                      (diskno, capacity, allocation))
 
     estimated_size = capacity
+    disk = progress_disk(diskno, options)
+    write_estimated_size(estimated_size, disk)
     stream = con.newStream()
     preallocated = True
 
@@ -204,7 +238,7 @@ def handle_volume(con, diskno, src, dst, options):
             # No need to pass the size, volume download will return -1
             # when the stream finishes
             download_disk_sparse(stream, estimated_size, None, dst,
-                                 options.bufsize)
+                                 options.bufsize, disk)
         except libvirt.libvirtError:
             preallocated = True
             write_output('WARN: sparseness is not supported')
@@ -214,7 +248,7 @@ def handle_volume(con, diskno, src, dst, options):
         sr = StreamAdapter(stream)
         # No need to pass the size, volume download will return -1
         # when the stream finishes
-        download_disk(sr, estimated_size, None, dst, options.bufsize)
+        download_disk(sr, estimated_size, None, dst, options.bufsize, disk)
 
 
 def handle_path(con, diskno, src, dst, options):
@@ -228,8 +262,60 @@ def handle_path(con, diskno, src, dst, options):
         write_output('>>> disk %d, capacity: %d physical %d' %
                      (diskno, capacity, physical))
 
+    disk = progress_disk(diskno, options)
+    write_estimated_size(physical, disk)
     vmAdapter = VMAdapter(vm, src)
-    download_disk(vmAdapter, physical, physical, dst, options.bufsize)
+    download_disk(vmAdapter, physical, physical, dst, options.bufsize, disk)
+
+
+def progress_disk(diskno, options):
+    """
+    Return the disk number to include in progress output, or None when
+    copying one disk at a time.
+    """
+    return diskno if options.parallel > 1 else None
+
+
+def copy_disk(con, diskno, src, dst, fmt, options):
+    if fmt == 'volume':
+        handle_volume(con, diskno, src, dst, options)
+    elif fmt == 'path':
+        handle_path(con, diskno, src, dst, options)
+
+
+def copy_disks_parallel(con, disks, options):
+    """
+    Copy disks using up to options.parallel threads. If copying a disk
+    fails, no new copies are started, and the first error is raised when
+    the running copies are finished.
+    """
+    lock = threading.Lock()
+    pending = iter(disks)
+    errors = []
+
+    def worker():
+        while not errors:
+            with lock:
+                try:
+                    diskno, (src, dst, fmt) = next(pending)
+                except StopIteration:
+                    return
+            try:
+                copy_disk(con, diskno, src, dst, fmt, options)
+            except Exception as e:
+                write_error(e)
+                errors.append(e)
+
+    count = min(options.parallel, len(disks))
+    threads = [concurrent.thread(worker, name="copy/%d" % i)
+               for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
 
 
 def validate_disks(options):
@@ -246,6 +332,10 @@ def validate_disks(options):
         write_output('>>> unsupported allocation policy. (supported: sparse, '
                      'preallocated)')
         sys.exit(1)
+    elif options.parallel < 1:
+        write_output('>>> invalid number of parallel copies: %d'
+                     % options.parallel)
+        sys.exit(1)
 
 
 def main(argv=None):
@@ -260,11 +350,12 @@ def main(argv=None):
                                             get_password(options))
 
     write_output('preparing for copy')
-    disks = six.moves.zip(options.source, options.dest, options.storagetype)
-    for diskno, (src, dst, fmt) in enumerate(disks, start=1):
-        if fmt == 'volume':
-            handle_volume(con, diskno, src, dst, options)
-        elif fmt == 'path':
-            handle_path(con, diskno, src, dst, options)
-        diskno = diskno + 1
+    disks = list(enumerate(
+        six.moves.zip(options.source, options.dest, options.storagetype),
+        start=1))
+    if options.parallel > 1:
+        copy_disks_parallel(con, disks, options)
+    else:
+        for diskno, (src, dst, fmt) in disks:
+            copy_disk(con, diskno, src, dst, fmt, options)
     write_output('Finishing off')
@@ -84,6 +84,14 @@ def cpu_topology(capabilities=None):
     return _numa(capabilities).cpu_topology
 
 
+def invalidate():
+    '''
+    Drop the cached topology, so it is read again from libvirt on the next
+    call. Should be called when host CPUs are added or removed.
+    '''
+    _numa.invalidate()
+
+
 @cache.memoized
 def autonuma_status():
     '''
@@ -26,21 +26,24 @@ profiling facade.
 
 from . import cpu
 from . import memory
+from . import sampler
 
 
 def start():
     cpu.start()
     memory.start()
+    sampler.start()
 
 
 def stop():
     cpu.stop()
     memory.stop()
+    sampler.stop()
 
 
 def status():
     res = {}
-    for profiler in (cpu, memory):
+    for profiler in (cpu, memory, sampler):
         res[profiler.__name__] = {
             "enabled": profiler.is_enabled(),
             "running": profiler.is_running()
@@ -0,0 +1,204 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+"""
+This module provides a low overhead statistical profiler.
+
+The sampler thread takes the stacks of all threads periodically, and
+aggregates them by thread name and stack in a ring buffer of time slots.
+The collected samples can be dumped in collapsed stack format, used by
+flamegraph tools:
+
+    jsonrpc;run (/usr/lib/python3.6/threading.py:850);... 42
+
+Threads created by concurrent.thread are named "group/N"; samples are
+aggregated using the group name (e.g. "jsonrpc").
+
+Unlike the cpu profiler, the sampler does not trace function calls, so its
+overhead depends only on the sampling rate and number of threads.
+"""
+
+import collections
+import logging
+import sys
+import threading
+
+from vdsm.common import concurrent
+from vdsm.common.time import monotonic_time
+from vdsm.config import config
+
+from .errors import UsageError
+
+_lock = threading.Lock()
+_sampler = None
+
+
+class Sampler(object):
+
+    log = logging.getLogger("profiling.sampler")
+
+    def __init__(self, rate, window, history, clock=monotonic_time):
+        """
+        Arguments:
+            rate (float): number of samples per second
+            window (int): number of seconds aggregated in every slot
+            history (int): number of slots to keep
+            clock (callable): for testing
+        """
+        self._interval = 1.0 / rate
+        self._window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (start time, Counter mapping collapsed stack to count)
+        self._slots = collections.deque(maxlen=history)
+        # Cache of frame labels by code object.
+        self._labels = {}
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.log.info("Starting sampling profiler (interval=%.3f)",
+                      self._interval)
+        self._thread = concurrent.thread(self._run, name="sampler")
+        self._thread.start()
+
+    def stop(self):
+        self.log.info("Stopping sampling profiler")
+        self._done.set()
+        self._thread.join()
+
+    def sample(self):
+        """
+        Take one sample of all threads, except the calling thread.
+        """
+        names = {t.ident: t.name for t in threading.enumerate()}
+        current = threading.current_thread().ident
+        stacks = []
+        frames = sys._current_frames()
+        try:
+            for ident, frame in frames.items():
+                if ident == current:
+                    continue
+                name = names.get(ident, "unknown").split("/", 1)[0]
+                stacks.append(name + ";" + self._collapse(frame))
+        finally:
+            # Avoid reference cycles keeping the frames alive.
+            del frames
+
+        now = self._clock()
+        with self._lock:
+            if not self._slots or now - self._slots[-1][0] >= self._window:
+                self._slots.append((now, collections.Counter()))
+            self._slots[-1][1].update(stacks)
+
+    def dump(self, seconds=None):
+        """
+        Return samples collected in the last seconds, or all samples if
+        seconds is None, in collapsed stack format.
+        """
+        since = None if seconds is None else self._clock() - seconds
+        total = collections.Counter()
+        with self._lock:
+            for start, counter in self._slots:
+                # Include the slot containing the start time.
+                if since is None or start + self._window > since:
+                    total.update(counter)
+        return "".join("%s %d\n" % (stack, count)
+                       for stack, count in sorted(total.items()))
+
+    def _run(self):
+        while not self._done.wait(self._interval):
+            try:
+                self.sample()
+            except Exception:
+                self.log.exception("Error sampling threads")
+
+    def _collapse(self, frame):
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                # Use the function first line, so samples from different
+                # lines of the same function are aggregated.
+                label = "%s (%s:%d)" % (
+                    code.co_name, code.co_filename, code.co_firstlineno)
+                self._labels[code] = label
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+
+def start():
+    """ Starts application wide sampling profiler """
+    global _sampler
+    if is_enabled():
+        with _lock:
+            if _sampler:
+                raise UsageError("Sampling profiler is already running")
+            _sampler = Sampler(
+                config.getfloat("devel", "sampling_profile_rate"),
+                config.getint("devel", "sampling_profile_window"),
+                config.getint("devel", "sampling_profile_history"))
+            _sampler.start()
+
+
+def stop():
+    """ Stops application wide sampling profiler """
+    global _sampler
+    if is_enabled():
+        with _lock:
+            _sampler.stop()
+            _sampler = None
+
+
+def is_enabled():
+    return config.getboolean("devel", "sampling_profile_enable")
+
+
+def is_running():
+    with _lock:
+        return _sampler is not None
+
+
+def dump(seconds=None):
+    """
+    Return samples collected in the last seconds in collapsed stack format,
+    or an empty string if the sampler is not running.
+    """
+    with _lock:
+        sampler = _sampler
+    if sampler is None:
+        return ""
+    return sampler.dump(seconds)
+
+
+def dump_file():
+    """
+    Write all samples to the configured file, replacing previous content.
+    """
+    filename = config.get("devel", "sampling_profile_filename")
+    logging.info("Writing profile samples to %s", filename)
+    data = dump()
+    with open(filename, "w") as f:
+        f.write(data)
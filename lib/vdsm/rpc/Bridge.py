@@ -431,6 +431,10 @@ command_info = {
     'Volume_measure': {'ret': 'result'},
     'Host_getAllTasks': {'ret': 'tasks'},
     'Host_getJobs': {'ret': 'jobs'},
+    'Host_getThreadStats': {'ret': 'threads'},
+    'Host_getStackSamples': {'ret': 'samples'},
+    'Host_getLatencyStats': {'ret': 'verbs'},
+    'Host_getSlowRequests': {'ret': 'requests'},
     'Lease_create': {'ret': 'uuid'},
     'Lease_delete': {'ret': 'uuid'},
     'Lease_rebuild_leases': {'ret': 'uuid'},
@@ -35,8 +35,10 @@ from vdsm.storage import exception as se
 from vdsm.storage import lvm
 from vdsm.storage import qemuimg
 from vdsm.storage import resourceManager as rm
+from vdsm.storage import resourceFactories
 from vdsm.storage import task
 from vdsm.storage import volume
+from vdsm.storage import volumemetadata
 from vdsm.storage.sdc import sdCache
 from vdsm.storage.volumemetadata import VolumeMetadata
 
@@ -97,6 +99,7 @@ class BlockVolumeManifest(volume.VolumeManifest):
 
         _, slot = metaId
         sd = sdCache.produce_manifest(self.sdUUID)
+        volumemetadata.count_read()
         try:
             lines = sd.read_metadata_block(slot).splitlines()
         except Exception as e:
@@ -216,6 +219,8 @@ class BlockVolumeManifest(volume.VolumeManifest):
         except Exception as e:
             self.log.error(e, exc_info=True)
             raise se.VolumeMetadataWriteError("%s: %s" % (metaId, e))
+        finally:
+            self.invalidateMetadataSnapshot()
 
     @deprecated  # valid only for domain version < 3, see volume.setrw
     def _setrw(self, rw):
@@ -285,7 +290,10 @@ class BlockVolumeManifest(volume.VolumeManifest):
         Just wipe meta.
         """
         _, slot = metaId
-        sdCache.produce_manifest(self.sdUUID).clear_metadata_block(slot)
+        try:
+            sdCache.produce_manifest(self.sdUUID).clear_metadata_block(slot)
+        finally:
+            self.invalidateMetadataSnapshot()
 
     @classmethod
     def newVolumeLease(cls, metaId, sdUUID, volUUID):
@@ -374,6 +382,47 @@ class BlockVolumeManifest(volume.VolumeManifest):
                                         self.volUUID, access)
         activation.autoRelease = False
 
+    def prepare(self, rw=True, justme=False,
+                chainrw=False, setrw=False, force=False):
+        """
+        Prepare volume for use by consumer.
+
+        When preparing the entire chain, activate all the chain lvs using
+        one lvchange command when the first volume is activated, instead of
+        activating every volume separately.
+        """
+        if justme:
+            return volume.VolumeManifest.prepare(
+                self, rw=rw, justme=justme, chainrw=chainrw, setrw=setrw,
+                force=force)
+
+        with resourceFactories.bulk_activation(
+                self.sdUUID, self.getChain()):
+            return volume.VolumeManifest.prepare(
+                self, rw=rw, justme=justme, chainrw=chainrw, setrw=setrw,
+                force=force)
+
+    def getChain(self):
+        """
+        Return the UUIDs of this volume and its ancestors, starting with this
+        volume, using the lv tags.
+
+        All the lvs are listed once, so this is cheap even for long chains.
+        If a volume or its parent tag is missing, the chain ends at that
+        volume; preparing the volume will report the error.
+        """
+        tags = {lv.name: lv.tags for lv in lvm.getLV(self.sdUUID)}
+        chain = []
+        volUUID = self.volUUID
+        while volUUID != sc.BLANK_UUID and volUUID not in chain:
+            chain.append(volUUID)
+            volUUID = sc.BLANK_UUID
+            for tag in tags.get(chain[-1], ()):
+                if tag.startswith(sc.TAG_PREFIX_PARENT):
+                    volUUID = tag[len(sc.TAG_PREFIX_PARENT):]
+                    break
+        return chain
+
     @classmethod
     def teardown(cls, sdUUID, volUUID, justme=False):
         """
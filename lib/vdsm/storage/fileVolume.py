@@ -39,6 +39,7 @@ from vdsm.storage import outOfProcess as oop
 from vdsm.storage import qemuimg
 from vdsm.storage import task
 from vdsm.storage import volume
+from vdsm.storage import volumemetadata
 from vdsm.storage.compat import sanlock
 from vdsm.storage.sdc import sdCache
 from vdsm.storage.volumemetadata import VolumeMetadata
@@ -165,6 +166,7 @@ class FileVolumeManifest(volume.VolumeManifest):
         volPath, = metaId
         metaPath = self.getMetaVolumePath(volPath)
 
+        volumemetadata.count_read()
         try:
             data = self.oop.readFile(metaPath, direct=True)
         except Exception as e:
@@ -241,6 +243,8 @@ class FileVolumeManifest(volume.VolumeManifest):
         except Exception as e:
             self.log.error(e, exc_info=True)
             raise se.VolumeMetadataWriteError(str(metaId) + str(e))
+        finally:
+            self.invalidateMetadataSnapshot()
 
     @classmethod
     def file_setrw(cls, volPath, rw):
@@ -285,9 +289,12 @@ class FileVolumeManifest(volume.VolumeManifest):
         Remove the meta file
         """
         metaPath = self.getMetaVolumePath()
-        if self.oop.os.path.lexists(metaPath):
-            self.log.info("Removing: %s", metaPath)
-            self.oop.os.unlink(metaPath)
+        try:
+            if self.oop.os.path.lexists(metaPath):
+                self.log.info("Removing: %s", metaPath)
+                self.oop.os.unlink(metaPath)
+        finally:
+            self.invalidateMetadataSnapshot()
 
     @classmethod
     def leaseVolumePath(cls, vol_path):
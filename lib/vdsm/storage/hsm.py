@@ -3220,6 +3220,9 @@ class HSM(object):
         vars.task.getSharedLock(STORAGE, sdUUID)
 
         imgVolumesInfo = []
+        timing = []
+        start = monotonic_time()
+
         dom = sdCache.produce(sdUUID)
         allVols = dom.getAllVolumes()
         # Filter volumes related to this image
@@ -3228,25 +3231,35 @@ class HSM(object):
         if leafUUID not in imgVolumes:
             raise se.VolumeDoesNotExist(leafUUID)
 
+        vols = {volUUID: dom.produceVolume(imgUUID, volUUID)
+                for volUUID in imgVolumes}
+
         for volUUID in imgVolumes:
-            legality = dom.produceVolume(imgUUID, volUUID).getLegality()
+            legality = vols[volUUID].getLegality()
             if legality == sc.ILLEGAL_VOL:
                 if allowIllegal:
                     self.log.info("Preparing illegal volume %s", leafUUID)
                 else:
                     raise se.prepareIllegalVolumeError(volUUID)
 
+        start = self._prepare_phase(timing, "resolve", start)
+
+        # Activate all the volumes and create the links at once, instead of
+        # preparing every volume in the chain separately.
         imgPath = dom.activateVolumes(imgUUID, imgVolumes)
+        start = self._prepare_phase(timing, "activate", start)
         try:
             for volUUID in imgVolumes:
-                dom.produceVolume(imgUUID, volUUID).updateInvalidatedSize()
+                vols[volUUID].updateInvalidatedSize()
+
+            start = self._prepare_phase(timing, "size", start)
 
             if spUUID and spUUID != sd.BLANK_UUID:
                 runImgPath = dom.linkBCImage(imgPath, imgUUID)
             else:
                 runImgPath = imgPath
 
-            leafInfo = dom.produceVolume(imgUUID, leafUUID).getVmVolumeInfo()
+            leafInfo = vols[leafUUID].getVmVolumeInfo()
 
             leafPath = os.path.join(runImgPath, leafUUID)
             for volUUID in imgVolumes:
@@ -3264,6 +3277,8 @@ class HSM(object):
                     })
 
                 imgVolumesInfo.append(volInfo)
+
+            self._prepare_phase(timing, "info", start)
         except Exception:
             # Tear down everyting on failure.
             try:
@@ -3273,9 +3288,23 @@ class HSM(object):
                 self.log.exception("Error tearing down image")
             raise
 
+        self.log.info(
+            "Prepared image %s/%s with %d volumes (%s)",
+            sdUUID, imgUUID, len(imgVolumes),
+            ", ".join("%s=%.3f" % phase for phase in timing))
+
         return {'path': leafPath, 'info': leafInfo,
                 'imgVolumesInfo': imgVolumesInfo}
 
+    def _prepare_phase(self, timing, name, start):
+        """
+        Record the time since start for phase name in timing, and return the
+        start time of the next phase.
+        """
+        now = monotonic_time()
+        timing.append((name, now - start))
+        return now
+
     @public
     def teardownImage(self, sdUUID, spUUID, imgUUID, volUUID=None):
         """
@@ -47,6 +47,8 @@ from vdsm import constants
 from vdsm import utils
 from vdsm.common import errors
 from vdsm.common import commands
+from vdsm.common import concurrent
+from vdsm.common import tracing
 from vdsm.common.compat import subprocess
 from vdsm.common.units import MiB
 
@@ -419,7 +421,9 @@ class LVMCache(object):
     def cmd(self, cmd, devices=tuple(), wants_output=False):
         # Take a shared lock, so set_read_only() can wait for commands using
         # the previous mode.
-        with self._cmd_sem, self._read_only_lock.shared:
+        with tracing.span("lvm.cmd"), \
+                self._cmd_sem, \
+                self._read_only_lock.shared:
 
             # 1. Try the command with fast specific filter including the
             # specified devices. If the command succeeded and wanted output was
@@ -867,6 +871,10 @@ class LVMCache(object):
 
 _lvminfo = LVMCache()
 
+_removers_lock = threading.Lock()
+# vgName -> _LVRemover
+_removers = {}
+
 
 def bootstrap(skiplvs=()):
     """
@@ -1424,7 +1432,79 @@ def createLV(vgName, lvName, size, activate=True, contiguous=False,
 
 
 def removeLVs(vgName, lvNames):
+    """
+    Remove logical volumes lvNames from VG vgName.
+
+    Concurrent calls removing LVs from the same VG are batched, removing all
+    the LVs submitted while the previous lvremove command was running with
+    one lvremove command.
+    """
     assert isinstance(lvNames, (list, tuple))
+    with _removers_lock:
+        remover = _removers.get(vgName)
+        if remover is None:
+            remover = _removers[vgName] = _LVRemover(vgName)
+    remover.remove(lvNames)
+
+
+class _Removal(object):
+
+    def __init__(self, lvNames):
+        self.lvNames = lvNames
+        self.error = None
+
+
+class _LVRemover(object):
+    """
+    Remove LVs from a VG, batching concurrent removals.
+    """
+
+    def __init__(self, vgName):
+        self._vgName = vgName
+        self._group_commit = concurrent.GroupCommit(self._remove_batch)
+
+    def remove(self, lvNames):
+        removal = _Removal(lvNames)
+        self._group_commit.submit(removal)
+        if removal.error is not None:
+            raise removal.error
+
+    def _remove_batch(self, batch):
+        if len(batch) == 1:
+            removals = batch
+        else:
+            lvNames = []
+            for r in batch:
+                lvNames.extend(lv for lv in r.lvNames if lv not in lvNames)
+            try:
+                _removeLVs(self._vgName, lvNames)
+                return
+            except se.CannotRemoveLogicalVolume:
+                log.warning("Removing LVs batch failed, removing LVs "
+                            "separately (vg=%s, lvs=%s)",
+                            self._vgName, lvNames)
+
+            # Some LVs may have been removed by the failed command. If
+            # reloading fails, the LVs are reported as Unreadable, and we
+            # try to remove them again.
+            existing = _lvminfo._reloadlvs(self._vgName, lvNames)
+            removals = []
+            for r in batch:
+                r.lvNames = [lv for lv in r.lvNames
+                             if (self._vgName, lv) in existing]
+                if r.lvNames:
+                    removals.append(r)
+
+        # Remove every request separately to report the error to the right
+        # caller.
+        for r in removals:
+            try:
+                _removeLVs(self._vgName, r.lvNames)
+            except Exception as e:
+                r.error = e
+
+
+def _removeLVs(vgName, lvNames):
     log.info("Removing LVs (vg=%s, lvs=%s)", vgName, lvNames)
     # Assert that the LVs are inactive before remove.
     for lvName in lvNames:
@@ -1547,6 +1627,8 @@ def activateLVs(vgName, lvNames, refresh=True):
     Active lvs may not reflect the current mapping on storage if the lv was
     extended or removed on another host. By default, active lvs are refreshed.
     To skip refresh, call with refresh=False.
+
+    Returns the lvs that were inactive and were activated.
     """
     active = []
     inactive = []
@@ -1564,6 +1646,8 @@ def activateLVs(vgName, lvNames, refresh=True):
         log.info("Activating lvs: vg=%s lvs=%s", vgName, inactive)
         _setLVAvailability(vgName, inactive, "y")
 
+    return inactive
+
 
 def deactivateLVs(vgName, lvNames):
     toDeactivate = [lvName for lvName in lvNames
@@ -35,9 +35,11 @@ from __future__ import absolute_import
 from contextlib import contextmanager
 
 import logging
+import threading
 
 from vdsm import utils
 from vdsm.common import properties
+from vdsm.common.time import monotonic_time
 from vdsm.common.units import MiB
 from vdsm.config import config
 
@@ -52,6 +54,89 @@ from vdsm.storage.sdc import sdCache
 
 log = logging.getLogger('storage.merge')
 
+_slots_lock = threading.Lock()
+# sd_id -> semaphore limiting concurrent merge operations on the domain.
+_slots = {}
+
+
+@contextmanager
+def domain_slot(sd_id, phases):
+    """
+    Run a merge operation on domain sd_id, waiting until less than
+    irs:max_domain_merges merge operations are running on the domain. The
+    time spent waiting is recorded in the "wait" phase.
+
+    Merge operations on the same domain contend for the domain VG lock and
+    storage bandwidth, so running too many of them does not make them
+    faster.
+
+    Waiting blocks the calling thread, typically a storage task thread, so
+    the limit is disabled by default.
+    """
+    limit = config.getint('irs', 'max_domain_merges')
+    if limit <= 0:
+        yield
+        return
+
+    with _slots_lock:
+        slot = _slots.get(sd_id)
+        if slot is None:
+            slot = _slots[sd_id] = threading.BoundedSemaphore(limit)
+
+    with phases.phase("wait"):
+        slot.acquire()
+    try:
+        yield
+    finally:
+        slot.release()
+
+
+class Phases(object):
+    """
+    Time spent in every phase of a merge operation.
+    """
+
+    def __init__(self, clock=monotonic_time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        # List of [name, start, end], end is None while the phase runs.
+        self._phases = []
+
+    @contextmanager
+    def phase(self, name):
+        entry = [name, self._clock(), None]
+        with self._lock:
+            self._phases.append(entry)
+        try:
+            yield
+        finally:
+            entry[2] = self._clock()
+
+    def info(self):
+        """
+        Return a dict mapping phase name to the seconds spent in the phase.
+        For a running phase, report the time since the phase started.
+        """
+        now = self._clock()
+        info = {}
+        with self._lock:
+            for name, start, end in self._phases:
+                elapsed = (now if end is None else end) - start
+                info[name] = info.get(name, 0.0) + elapsed
+        return info
+
+    def __str__(self):
+        with self._lock:
+            names = [entry[0] for entry in self._phases]
+        info = self.info()
+        seen = set()
+        items = []
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                items.append("%s=%.2f" % (name, info[name]))
+        return " ".join(items)
+
 
 class SubchainInfo(properties.Owner):
     sd_id = properties.UUID(required=True)
@@ -175,12 +260,17 @@ class SubchainInfo(properties.Owner):
 
 def prepare(subchain):
     log.info("Preparing subchain %s for merge", subchain)
-    with guarded.context(subchain.locks):
-        with subchain.prepare():
-            _update_base_capacity(subchain.base_vol,
-                                  subchain.top_vol)
-            _extend_base_allocation(subchain.base_vol,
-                                    subchain.top_vol)
+    phases = Phases()
+    with domain_slot(subchain.sd_id, phases):
+        with guarded.context(subchain.locks):
+            with subchain.prepare():
+                with phases.phase("capacity"):
+                    _update_base_capacity(subchain.base_vol,
+                                          subchain.top_vol)
+                with phases.phase("allocation"):
+                    _extend_base_allocation(subchain.base_vol,
+                                            subchain.top_vol)
+    log.info("Prepared subchain %s for merge (%s)", subchain, phases)
 
 
 def _update_base_capacity(base_vol, top_vol):
@@ -250,31 +340,38 @@ def finalize(subchain):
        vdsm chain.
     """
     log.info("Finalizing subchain after merge: %s", subchain)
-    with guarded.context(subchain.locks):
-        # TODO: As each cold merge step - prepare, merge and finalize -
-        # requires different volumes to be prepared, we will add a prepare
-        # helper for each step.
-        with subchain.prepare():
-            subchain.validate()
-            dom = sdCache.produce_manifest(subchain.sd_id)
-            if subchain.top_vol.isLeaf():
-                _finalize_leaf_merge(dom, subchain)
-            else:
-                _finalize_internal_merge(dom, subchain)
+    phases = Phases()
+    with domain_slot(subchain.sd_id, phases):
+        with guarded.context(subchain.locks):
+            # TODO: As each cold merge step - prepare, merge and finalize -
+            # requires different volumes to be prepared, we will add a
+            # prepare helper for each step.
+            with subchain.prepare():
+                with phases.phase("validate"):
+                    subchain.validate()
+                dom = sdCache.produce_manifest(subchain.sd_id)
+                if subchain.top_vol.isLeaf():
+                    _finalize_leaf_merge(dom, subchain, phases)
+                else:
+                    _finalize_internal_merge(dom, subchain, phases)
+
+                if subchain.base_vol.chunked():
+                    # optimal_size must be called when the volume is prepared
+                    with phases.phase("measure"):
+                        optimal_size = subchain.base_vol.optimal_size()
 
             if subchain.base_vol.chunked():
-                # optimal_size must be called when the volume is prepared
-                optimal_size = subchain.base_vol.optimal_size()
+                with phases.phase("shrink"):
+                    _shrink_base_volume(subchain, optimal_size)
+    log.info("Finalized subchain %s (%s)", subchain, phases)
 
-        if subchain.base_vol.chunked():
-            _shrink_base_volume(subchain, optimal_size)
 
-
-def _finalize_leaf_merge(dom, subchain):
-    _update_vdsm_metadata(dom, subchain)
+def _finalize_leaf_merge(dom, subchain, phases):
+    with phases.phase("metadata"):
+        _update_vdsm_metadata(dom, subchain)
 
 
-def _finalize_internal_merge(dom, subchain):
+def _finalize_internal_merge(dom, subchain, phases):
     children = subchain.top_vol.getChildren()
     child = dom.produceVolume(subchain.img_id, children[0])
     rebase = _rebase_operation(subchain.base_vol, child)
@@ -282,12 +379,14 @@ def _finalize_internal_merge(dom, subchain):
     try:
         subchain.top_vol.setLegality(sc.ILLEGAL_VOL)
         try:
-            rebase.run()
+            with phases.phase("rebase"):
+                rebase.run()
         except:
             # Set top volume to legal to enable recovery by retrying the merge.
             _rollback_top_volume_legality(subchain.top_vol)
             raise
-        _update_vdsm_metadata(dom, subchain)
+        with phases.phase("metadata"):
+            _update_vdsm_metadata(dom, subchain)
     finally:
         child.teardown(subchain.sd_id, child.volUUID, justme=True)
 
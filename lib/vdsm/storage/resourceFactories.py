@@ -21,6 +21,8 @@
 from __future__ import absolute_import
 
 import os
+import threading
+from contextlib import contextmanager
 
 from vdsm.config import config
 from vdsm.storage import constants as sc
@@ -33,6 +35,9 @@ import logging
 
 log = logging.getLogger('storage.ResourcesFactories')
 
+# Activation plan of the current thread, see bulk_activation().
+_bulk = threading.local()
+
 
 class LvmActivation(object):
     """
@@ -46,7 +51,11 @@ class LvmActivation(object):
         self._vg = vg
         self._lv = lv
 
-        lvm.activateLVs(self._vg, [self._lv])
+        plan = getattr(_bulk, "plan", None)
+        if plan is not None and plan.includes(vg, lv):
+            plan.activate(lv)
+        else:
+            lvm.activateLVs(self._vg, [self._lv])
 
     def close(self):
         try:
@@ -58,6 +67,85 @@ class LvmActivation(object):
             log.warn("Failure deactivate LV %s/%s (%s)", self._vg, self._lv, e)
 
 
+@contextmanager
+def bulk_activation(vg, lvs):
+    """
+    Activate lvs with one lvchange command for the inactive lvs and one for
+    the active lvs, instead of one command per lv.
+
+    The lvs are activated through their lvmActivation resources. When the
+    first resource of lvs is created in the current thread, all lvs are
+    activated or refreshed. When the other resources are created, the lvs
+    are activated again only if they were deactivated since then. Resources
+    are created with the namespace lock held, so activation cannot race with
+    other consumers of the resources.
+
+    If the flow fails, lvs activated here which the flow did not acquire are
+    deactivated by releasing their resources, unless another consumer is
+    using them.
+    """
+    if getattr(_bulk, "plan", None) is not None:
+        # Nested flow, e.g. preparing the parent volume of the chain.
+        yield
+        return
+
+    plan = _bulk.plan = _ActivationPlan(vg, lvs)
+    try:
+        yield
+    except Exception:
+        plan.deactivate_unused()
+        raise
+    finally:
+        _bulk.plan = None
+
+
+class _ActivationPlan(object):
+
+    def __init__(self, vg, lvs):
+        self._vg = vg
+        self._lvs = lvs
+        # Lvs activated by the plan, None until the first lv is activated.
+        self._activated = None
+        # Lvs activated by resources created in this thread.
+        self._used = set()
+
+    def includes(self, vg, lv):
+        return vg == self._vg and lv in self._lvs
+
+    def activate(self, lv):
+        """
+        Called when creating the lvmActivation resource for lv, with the
+        namespace lock held.
+        """
+        if self._activated is None:
+            self._activated = lvm.activateLVs(self._vg, self._lvs)
+        else:
+            # The lv was activated or refreshed with the rest of the plan
+            # lvs. If it was deactivated since then, activate it again.
+            lvm.activateLVs(self._vg, [lv], refresh=False)
+        self._used.add(lv)
+
+    def deactivate_unused(self):
+        if not self._activated:
+            return
+
+        namespace = rm.getNamespace(sc.LVM_ACTIVATION_NAMESPACE, self._vg)
+        for lv in self._activated:
+            if lv in self._used:
+                continue
+            # Releasing the last reference deactivates the lv. If another
+            # consumer holds the lv exclusively, it is in use and we must
+            # not wait for it.
+            try:
+                res = rm.acquireResource(namespace, lv, rm.SHARED, timeout=0)
+                res.release()
+            except rm.RequestTimedOutError:
+                log.debug("LV %s/%s is in use, not deactivating", self._vg, lv)
+            except Exception as e:
+                log.warning("Failure deactivating unused LV %s/%s (%s)",
+                            self._vg, lv, e)
+
+
 class LvmActivationFactory(rm.SimpleResourceFactory):
     def __init__(self, vg):
         rm.SimpleResourceFactory.__init__(self)
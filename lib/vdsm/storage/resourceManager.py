@@ -33,6 +33,7 @@ from six.moves import queue
 
 from vdsm import utils
 from vdsm.common import concurrent
+from vdsm.common import tracing
 from vdsm.common.logutils import SimpleLogAdapter
 from vdsm.storage import exception as se
 from vdsm.storage import guarded
@@ -442,7 +443,8 @@ class _ResourceManager(object):
             resource.put(res)
 
         request = self.registerResource(namespace, name, lockType, callback)
-        request.wait(timeout)
+        with tracing.span("rm.wait"):
+            request.wait(timeout)
         if not request.granted():
             try:
                 request.cancel()
@@ -339,6 +339,8 @@ class StorageDomainManifest(object):
         self._external_leases_lock = rwlock.RWLock()
         self._alignment = metadata.get(DMDK_ALIGNMENT, sc.ALIGNMENT_1M)
         self._block_size = metadata.get(DMDK_BLOCK_SIZE, sc.BLOCK_SIZE_512)
+        self._external_leases_cache = xlease.IndexCache(
+            alignment=self._alignment, block_size=self._block_size)
 
         # Validate alignment and block size.
 
@@ -712,10 +714,22 @@ class StorageDomainManifest(object):
             vol = xlease.LeasesVolume(
                 backend,
                 alignment=self._alignment,
-                block_size=self._block_size)
+                block_size=self._block_size,
+                cache=self._external_leases_cache)
             with utils.closing(vol):
                 yield vol
 
+    def invalidate_external_leases_cache(self):
+        """
+        Drop the cached external leases index, so the next access reads the
+        index from storage.
+
+        Must be called after modifying the index without using
+        external_leases_volume().
+        """
+        with self._external_leases_cache.lock:
+            self._external_leases_cache.invalidate()
+
     def lease_info(self, lease_id):
         """
         Return information about external lease that can be used to acquire or
@@ -1435,6 +1449,7 @@ class StorageDomain(object):
                     backend,
                     alignment=self._manifest.alignment,
                     block_size=self._manifest.block_size)
+            self._manifest.invalidate_external_leases_cache()
 
     # Images
 
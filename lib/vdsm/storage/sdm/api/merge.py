@@ -32,6 +32,7 @@ import logging
 
 from vdsm.storage import constants as sc
 from vdsm.storage import guarded
+from vdsm.storage import merge
 from vdsm.storage import qemuimg
 
 from . import base
@@ -45,18 +46,29 @@ class Job(base.Job):
                                   subchain.host_id)
         self.subchain = subchain
         self.operation = None
+        self._phases = merge.Phases()
 
     @property
     def progress(self):
         return getattr(self.operation, 'progress', None)
 
+    @property
+    def phases(self):
+        return self._phases.info()
+
     def _run(self):
         self.log.info("Merging subchain %s", self.subchain)
-        with guarded.context(self.subchain.locks):
-            self.subchain.validate()
-            with self.subchain.prepare(), self.subchain.volume_operation():
-                self.operation = qemuimg.commit(
-                    self.subchain.top_vol.getVolumePath(),
-                    topFormat=sc.fmt2str(self.subchain.top_vol.getFormat()),
-                    base=self.subchain.base_vol.getVolumePath())
-                self.operation.run()
+        with merge.domain_slot(self.subchain.sd_id, self._phases):
+            with guarded.context(self.subchain.locks):
+                with self._phases.phase("validate"):
+                    self.subchain.validate()
+                with self.subchain.prepare(), \
+                        self.subchain.volume_operation():
+                    self.operation = qemuimg.commit(
+                        self.subchain.top_vol.getVolumePath(),
+                        topFormat=sc.fmt2str(
+                            self.subchain.top_vol.getFormat()),
+                        base=self.subchain.base_vol.getVolumePath())
+                    with self._phases.phase("commit"):
+                        self.operation.run()
+        self.log.info("Merged subchain %s (%s)", self.subchain, self._phases)
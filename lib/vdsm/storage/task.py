@@ -59,13 +59,17 @@ from weakref import proxy
 import six
 
 from vdsm.common import concurrent
+from vdsm.common import tracing
 from vdsm.common.logutils import SimpleLogAdapter
 from vdsm.common.threadlocal import vars
+from vdsm.common.time import monotonic_time
 from vdsm.config import config
 from vdsm.storage import exception as se
 from vdsm.storage import constants as sc
 from vdsm.storage import outOfProcess as oop
 from vdsm.storage import resourceManager
+from vdsm.storage import taskjournal
+from vdsm.storage import volumemetadata
 
 
 KEY_SEPARATOR = "="
@@ -88,6 +92,13 @@ def getProcPool():
     return oop.getProcessPool(sc.GLOBAL_OOP)
 
 
+def _cleanTask(store, taskID, journaled):
+    if journaled:
+        taskjournal.get(store).remove(taskID)
+    else:
+        getProcPool().fileUtils.cleanupdir(os.path.join(store, taskID))
+
+
 def _eq_encode(s):
     if KEY_SEPARATOR_ENCODED in s:
         raise ValueError("%s includes %s" % (s, KEY_SEPARATOR_ENCODED))
@@ -498,6 +509,9 @@ class Task:
         self.persistPolicy = TaskPersistType.none
         self.cleanPolicy = TaskCleanType.auto
         self.store = None
+        # True if the task is persisted in the store journal, False if
+        # persisted in a task directory, None if not known yet.
+        self.journaled = None
         self.defaultException = None
 
         self.state = State(State.init)
@@ -507,6 +521,8 @@ class Task:
         self.error = se.TaskAborted("Unknown error encountered")
 
         self.mng = None
+        # Called with the task when the task state, result or tag change.
+        self.onChange = None
         self._abort_lock = threading.Lock()
         self._abort_callbacks = set()
         if abort_callback is not None:
@@ -523,23 +539,29 @@ class Task:
         # Used by tests to wait for a task from another thread.
         self._is_done = threading.Event()
 
+        # Trace of the request creating the task, and the time the task was
+        # queued, for tracing jobs running in another thread.
+        self._trace = None
+        self._queued = None
+
         self.log = SimpleLogAdapter(self.log, {"Task": self.id})
 
     def __del__(self):
-        def finalize(log, owner, taskDir):
+        def finalize(log, owner, store, taskID, journaled):
             log.warn("Task was autocleaned")
             owner.releaseAll()
-            if taskDir is not None:
-                getProcPool().fileUtils.cleanupdir(taskDir)
+            if store is not None:
+                _cleanTask(store, taskID, journaled)
 
         if not self.state.isDone():
-            taskDir = None
+            store = None
             if (self.cleanPolicy == TaskCleanType.auto and
                     self.store is not None):
-                taskDir = os.path.join(self.store, self.id)
+                store = self.store
             t = concurrent.thread(
                 finalize,
-                args=(self.log, self.resOwner, taskDir),
+                args=(self.log, self.resOwner, store, self.id,
+                      self.journaled),
                 name="task/" + self.id[:8])
             t.start()
 
@@ -561,6 +583,7 @@ class Task:
 
     def __state_queued(self, fromState):
         try:
+            self._queued = monotonic_time()
             self.mng.queue(self)
         except Exception as e:
             self._setError(e)
@@ -627,6 +650,7 @@ class Task:
                            fromState, state, requestedState)
 
         self.state.moveto(state, force)
+        self._notifyChange()
         if self.persistPolicy == TaskPersistType.auto:
             try:
                 self.persist()
@@ -641,6 +665,15 @@ class Task:
         self.result.result = result
         self.result.code = code
         self.result.message = message
+        self._notifyChange()
+
+    def _notifyChange(self):
+        onChange = self.onChange
+        if onChange is not None:
+            try:
+                onChange(self)
+            except Exception:
+                self.log.exception("Error notifying task change")
 
     @classmethod
     def validateID(cls, taskID):
@@ -648,9 +681,11 @@ class Task:
             raise se.InvalidParameterException("taskID", taskID)
 
     @classmethod
-    def _loadMetaFile(cls, filename, obj, fields):
+    def _loadMetaFile(cls, filename, obj, fields, readLines=None):
+        if readLines is None:
+            readLines = getProcPool().readLines
         try:
-            for line in getProcPool().readLines(filename):
+            for line in readLines(filename):
                 # process current line
                 line = line.decode('utf-8')
                 if line.find(KEY_SEPARATOR) < 0:
@@ -705,39 +740,22 @@ class Task:
             cls.log.error("Unexpected error", exc_info=True)
             raise se.TaskMetaDataSaveError(filename)
 
-    def _loadTaskMetaFile(self, taskDir):
-        taskFile = os.path.join(taskDir, self.id + TASK_EXT)
-        self._loadMetaFile(taskFile, self, Task.fields)
-
-    def _saveTaskMetaFile(self, taskDir):
-        taskFile = os.path.join(taskDir, self.id + TASK_EXT)
-        self._saveMetaFile(taskFile, self, Task.fields)
-
-    def _loadJobMetaFile(self, taskDir, n):
-        taskFile = os.path.join(taskDir, self.id + JOB_EXT + NUM_SEP + str(n))
-        self._loadMetaFile(taskFile, self.jobs[n], Job.fields)
-
-    def _saveJobMetaFile(self, taskDir, n):
-        taskFile = os.path.join(taskDir, self.id + JOB_EXT + NUM_SEP + str(n))
-        self._saveMetaFile(taskFile, self.jobs[n], Job.fields)
-
-    def _loadRecoveryMetaFile(self, taskDir, n):
-        taskFile = os.path.join(taskDir,
-                                self.id + RECOVER_EXT + NUM_SEP + str(n))
-        self._loadMetaFile(taskFile, self.recoveries[n], Recovery.fields)
-
-    def _saveRecoveryMetaFile(self, taskDir, n):
-        taskFile = os.path.join(taskDir,
-                                self.id + RECOVER_EXT + NUM_SEP + str(n))
-        self._saveMetaFile(taskFile, self.recoveries[n], Recovery.fields)
-
-    def _loadTaskResultMetaFile(self, taskDir):
-        taskFile = os.path.join(taskDir, self.id + RESULT_EXT)
-        self._loadMetaFile(taskFile, self.result, TaskResult.fields)
-
-    def _saveTaskResultMetaFile(self, taskDir):
-        taskFile = os.path.join(taskDir, self.id + RESULT_EXT)
-        self._saveMetaFile(taskFile, self.result, TaskResult.fields)
+    def _metaFiles(self):
+        """
+        Return list of (name, obj, fields) for the meta files describing the
+        task current state.
+        """
+        files = [(self.id + TASK_EXT, self, Task.fields)]
+        if self.state == State.finished:
+            files.append((self.id + RESULT_EXT, self.result,
+                          TaskResult.fields))
+        for jn, job in enumerate(self.jobs):
+            files.append((self.id + JOB_EXT + NUM_SEP + str(jn), job,
+                          Job.fields))
+        for rn, recovery in enumerate(self.recoveries):
+            files.append((self.id + RECOVER_EXT + NUM_SEP + str(rn), recovery,
+                          Recovery.fields))
+        return files
 
     def _getResourcesKeyList(self, taskDir):
         keys = []
@@ -755,22 +773,45 @@ class Task:
         taskDir = os.path.join(storPath, str(self.id) + str(ext))
         if not getProcPool().os.path.exists(taskDir):
             raise se.TaskDirError("load: no such task dir '%s'" % taskDir)
+        self._loadMeta(taskDir)
+        self.journaled = False
+
+    def _loadRecord(self, record):
+        self.log.debug("%s: load from journal", self)
+        if self.state != State.init:
+            raise se.TaskMetaDataLoadError("task %s - can't load self: "
+                                           "not in init state" % self)
+        meta = record["meta"]
+
+        def readLines(name):
+            return [line.encode("utf-8") for line in meta[name]]
+
+        self._loadMeta("", readLines)
+        self.journaled = True
+
+    def _loadMeta(self, taskDir, readLines=None):
+        def load(name, obj, fields):
+            self._loadMetaFile(os.path.join(taskDir, name), obj, fields,
+                               readLines)
+
         oldid = self.id
-        self._loadTaskMetaFile(taskDir)
+        load(self.id + TASK_EXT, self, Task.fields)
         if self.id != oldid:
             raise se.TaskMetaDataLoadError("task %s: loaded file do not match"
                                            " id (%s != %s)" %
                                            (self, self.id, oldid))
         if self.state == State.finished:
-            self._loadTaskResultMetaFile(taskDir)
+            load(self.id + RESULT_EXT, self.result, TaskResult.fields)
         for jn in range(self.njobs):
             self.jobs.append(Job("load", None))
-            self._loadJobMetaFile(taskDir, jn)
+            load(self.id + JOB_EXT + NUM_SEP + str(jn), self.jobs[jn],
+                 Job.fields)
             self.jobs[jn].setOwnerTask(self)
         for rn in range(self.nrecoveries):
             self.recoveries.append(Recovery("load", "load",
                                             "load", "load", ""))
-            self._loadRecoveryMetaFile(taskDir, rn)
+            load(self.id + RECOVER_EXT + NUM_SEP + str(rn),
+                 self.recoveries[rn], Recovery.fields)
             self.recoveries[rn].setOwnerTask(self)
 
     def _save(self, storPath):
@@ -785,13 +826,8 @@ class Task:
         try:
             self.njobs = len(self.jobs)
             self.nrecoveries = len(self.recoveries)
-            self._saveTaskMetaFile(taskDir)
-            if self.state == State.finished:
-                self._saveTaskResultMetaFile(taskDir)
-            for jn in range(self.njobs):
-                self._saveJobMetaFile(taskDir, jn)
-            for rn in range(self.nrecoveries):
-                self._saveRecoveryMetaFile(taskDir, rn)
+            for name, obj, fields in self._metaFiles():
+                self._saveMetaFile(os.path.join(taskDir, name), obj, fields)
         except Exception as e:
             self.log.error("Unexpected error", exc_info=True)
             try:
@@ -806,9 +842,20 @@ class Task:
         getProcPool().fileUtils.cleanupdir(origTaskDir + BACKUP_EXT)
         getProcPool().fileUtils.fsyncPath(origTaskDir)
 
+    def _saveRecord(self, storPath):
+        self.log.debug("_saveRecord: journal %s", storPath)
+        try:
+            self.njobs = len(self.jobs)
+            self.nrecoveries = len(self.recoveries)
+            meta = {name: self._dump(obj, fields)
+                    for name, obj, fields in self._metaFiles()}
+            taskjournal.get(storPath).save({"id": self.id, "meta": meta})
+        except Exception as e:
+            self.log.error("Unexpected error", exc_info=True)
+            raise se.TaskPersistError("%s persist failed: %s" % (self, e))
+
     def _clean(self, storPath):
-        taskDir = os.path.join(storPath, self.id)
-        getProcPool().fileUtils.cleanupdir(taskDir)
+        _cleanTask(storPath, self.id, self.journaled)
 
     def _recoverDone(self):
         # protect agains races with stop/abort
@@ -1028,6 +1075,7 @@ class Task:
         if KEY_SEPARATOR in tag:
             raise ValueError("tag cannot include %s character" % KEY_SEPARATOR)
         self.tag = six.text_type(tag)
+        self._notifyChange()
 
     def isDone(self):
         return self.state.isDone()
@@ -1119,13 +1167,17 @@ class Task:
         self.setCleanPolicy(cleanPolicy)
         if self.persistPolicy != TaskPersistType.none and not self.store:
             raise se.TaskPersistError("no store defined")
-        taskDir = os.path.join(self.store, self.id)
-        try:
-            getProcPool().fileUtils.createdir(taskDir)
-        except Exception as e:
-            self.log.error("Unexpected error", exc_info=True)
-            raise se.TaskPersistError("%s: cannot access/create taskdir"
-                                      " %s: %s" % (self, taskDir, e))
+        # Loaded tasks keep the format they were loaded from.
+        if self.journaled is None:
+            self.journaled = config.getboolean("irs", "task_journal")
+        if not self.journaled:
+            taskDir = os.path.join(self.store, self.id)
+            try:
+                getProcPool().fileUtils.createdir(taskDir)
+            except Exception as e:
+                self.log.error("Unexpected error", exc_info=True)
+                raise se.TaskPersistError("%s: cannot access/create taskdir"
+                                          " %s: %s" % (self, taskDir, e))
         if (self.persistPolicy == TaskPersistType.auto and
                 self.state != State.init):
             self.persist()
@@ -1150,7 +1202,10 @@ class Task:
             raise se.TaskPersistError("no store defined")
         if self.state == State.init:
             raise se.TaskStateError("can't persist in state %s" % self.state)
-        self._save(self.store)
+        if self.journaled:
+            self._saveRecord(self.store)
+        else:
+            self._save(self.store)
 
     @classmethod
     def loadTask(cls, store, taskid):
@@ -1171,8 +1226,18 @@ class Task:
         t._load(store, ext)
         return t
 
+    @classmethod
+    def loadRecord(cls, record):
+        """
+        Load a task from a journal record.
+        """
+        t = Task(record["id"])
+        t._loadRecord(record)
+        return t
+
     @threadlocal_task
     def prepare(self, func, *args, **kwargs):
+        self._trace = tracing.current()
         message = self.error
         try:
             self._incref()
@@ -1185,7 +1250,11 @@ class Task:
             code = 0
             try:
                 if func:
-                    result = self._run(func, *args, **kwargs)
+                    # Read volume metadata once per volume in the
+                    # synchronous part of the verb. Jobs of async tasks may
+                    # run for hours, so they always read fresh metadata.
+                    with volumemetadata.snapshot(self.name):
+                        result = self._run(func, *args, **kwargs)
             except se.TaskAborted as e:
                 self.log.info("aborting: %s", e)
                 code = e.abortedcode
@@ -1217,15 +1286,19 @@ class Task:
     @threadlocal_task
     def commit(self, args=None):
         self.log.debug("committing task: %s", self.id)
-        try:
-            self._incref()
-        except se.TaskAborted:
-            self._doAbort()
-            return
-        try:
-            self._updateState(State.running)
-        finally:
-            self._decref()
+        with tracing.resume(self._trace):
+            if self._queued is not None:
+                tracing.record("task.queue", self._queued)
+            try:
+                self._incref()
+            except se.TaskAborted:
+                self._doAbort()
+                return
+            try:
+                with tracing.span("task.run"):
+                    self._updateState(State.running)
+            finally:
+                self._decref()
 
     @contextmanager
     def abort_callback(self, callback):
@@ -23,10 +23,13 @@ import os
 import logging
 import threading
 
+from collections import defaultdict
+
 import six
 
 from vdsm.config import config
 from vdsm.storage import exception as se
+from vdsm.storage import taskjournal
 from vdsm.storage.task import Task, Job, TaskCleanType
 from vdsm.storage.threadPool import ThreadPool
 
@@ -42,6 +45,16 @@ class TaskManager:
         self._tasks = {}
         self._unqueuedTasks = []
         self._insertTaskLock = threading.Lock()
+        # Secondary indexes and cached reports, updated when tasks change.
+        self._indexLock = threading.Lock()
+        # task id -> (tag, state) used to index the task
+        self._indexed = {}
+        # tag -> set of task ids
+        self._byTag = defaultdict(set)
+        # state -> set of task ids
+        self._byState = defaultdict(set)
+        # (name, tag) -> (report, stale task ids)
+        self._reports = {}
 
     def queue(self, task):
         return self._queueTask(task, task.commit)
@@ -56,12 +69,12 @@ class TaskManager:
                     'Task id already in use: {0}'.format(task.id))
 
             self.log.debug("queuing task: %s", task.id)
-            self._tasks[task.id] = task
+            self._addTask(task)
 
         try:
             if not self.tp.queueTask(task.id, method):
                 self.log.error("unable to queue task: %s", task.dumpTask())
-                del self._tasks[task.id]
+                self._removeTask(task.id)
                 raise se.AddTaskError()
             self.log.debug("task queued: %s", task.id)
         except Exception:
@@ -79,6 +92,105 @@ class TaskManager:
         task.addJob(Job(jobName, func, *args))
         self.log.debug("scheduled job %s for task %s ", jobName, task.id)
 
+    def _addTask(self, task):
+        with self._indexLock:
+            self._tasks[task.id] = task
+            self._index(task)
+        task.onChange = self._taskChanged
+
+    def _removeTask(self, taskID):
+        with self._indexLock:
+            task = self._tasks.pop(taskID, None)
+            if task is None:
+                return
+            self._unindex(taskID)
+        task.onChange = None
+
+    def _taskChanged(self, task):
+        # Called by tasks threads when task state, result or tag change.
+        with self._indexLock:
+            if self._tasks.get(task.id) is task:
+                self._index(task)
+
+    def _index(self, task):
+        # Must be called with _indexLock held.
+        key = (task.tag, str(task.state))
+        old = self._indexed.get(task.id)
+        if old != key:
+            if old is not None:
+                self._unindexKey(task.id, old)
+            self._indexed[task.id] = key
+            self._byTag[key[0]].add(task.id)
+            self._byState[key[1]].add(task.id)
+        self._invalidate(task.id)
+
+    def _unindex(self, taskID):
+        # Must be called with _indexLock held.
+        key = self._indexed.pop(taskID, None)
+        if key is not None:
+            self._unindexKey(taskID, key)
+        self._invalidate(taskID)
+
+    def _invalidate(self, taskID):
+        # Must be called with _indexLock held.
+        for report, stale in six.itervalues(self._reports):
+            stale.add(taskID)
+
+    def _unindexKey(self, taskID, key):
+        tag, state = key
+        self._byTag[tag].discard(taskID)
+        if not self._byTag[tag]:
+            del self._byTag[tag]
+        self._byState[state].discard(taskID)
+        if not self._byState[state]:
+            del self._byState[state]
+
+    def _taskIDs(self, tag=None, state=None):
+        # Must be called with _indexLock held.
+        if tag:
+            # Tags are matched like "tag in task.getTags()".
+            ids = set()
+            for t in self._byTag:
+                if tag in t:
+                    ids.update(self._byTag[t])
+        else:
+            ids = set(self._tasks)
+        if state is not None:
+            ids.intersection_update(self._byState.get(str(state), ()))
+        return ids
+
+    def _report(self, name, tag, getter):
+        """
+        Return a dict mapping task id to the value returned by getter for all
+        tasks with tag.
+
+        The report is cached, and only tasks changed since the last call are
+        updated.
+        """
+        with self._indexLock:
+            cached = self._reports.get((name, tag))
+            if cached is None:
+                report = {taskID: getter(self._tasks[taskID])
+                          for taskID in self._taskIDs(tag)}
+                self._reports[(name, tag)] = (report, set())
+            else:
+                report, stale = cached
+                for taskID in stale:
+                    key = self._indexed.get(taskID)
+                    if key is not None and (not tag or tag in key[0]):
+                        report[taskID] = getter(self._tasks[taskID])
+                    else:
+                        report.pop(taskID, None)
+                stale.clear()
+            return dict(report)
+
+    def getTaskIDs(self, tag=None, state=None):
+        """
+        Return a set of the ids of tasks with tag and state.
+        """
+        with self._indexLock:
+            return self._taskIDs(tag, state)
+
     def _getTask(self, taskID):
         Task.validateID(taskID)
         t = self._tasks.get(taskID, None)
@@ -105,16 +217,8 @@ class TaskManager:
         """ Return Task status for all tasks by type.
         """
         self.log.debug("Entry.")
-        subRes = {}
-        for taskID, task in self._tasks.items():
-            if not tag or tag in task.getTags():
-                try:
-                    subRes[taskID] = self.getTaskStatus(taskID)
-                except se.UnknownTask:
-                    # Return statuses for existing tasks only.
-                    self.log.warn("Unknown task %s. "
-                                  "Maybe task was already cleared.",
-                                  taskID)
+        subRes = self._report("statuses", tag,
+                              lambda t: t.deprecated_getStatus())
         self.log.debug("Return: %s", subRes)
         return subRes
 
@@ -123,14 +227,7 @@ class TaskManager:
         Return Tasks for all public tasks.
         """
         self.log.debug("Entry.")
-        subRes = {}
-        for taskID, task in self._tasks.items():
-            try:
-                subRes[taskID] = task.getDetails()
-            except se.UnknownTask:
-                # Return info for existing tasks only.
-                self.log.warn("Unknown task %s. Maybe task was already "
-                              "cleared.", taskID)
+        subRes = self._report("details", None, lambda t: t.getDetails())
         self.log.debug("Return: %s", subRes)
         return subRes
 
@@ -139,9 +236,8 @@ class TaskManager:
         Remove Tasks from managed tasks list
         """
         self.log.debug("Entry.")
-        for taskID, task in list(six.iteritems(self._tasks)):
-            if not tag or tag in task.getTags():
-                self._tasks.pop(taskID, None)
+        for taskID in self.getTaskIDs(tag):
+            self._removeTask(taskID)
         self.log.debug("Return")
 
     def stopTask(self, taskID, force=False):
@@ -167,7 +263,7 @@ class TaskManager:
         # TODO: Should we stop here implicitly ???
         t = self._getTask(taskID)
         t.clean()
-        del self._tasks[taskID]
+        self._removeTask(taskID)
         self.log.debug("Return.")
 
     def getTaskInfo(self, taskID):
@@ -184,16 +280,7 @@ class TaskManager:
             i.e - not internal.
         """
         self.log.debug("Entry.")
-        subRes = {}
-        for taskID, task in self._tasks.items():
-            if not tag or tag in task.getTags():
-                try:
-                    subRes[taskID] = self.getTaskInfo(taskID)
-                except se.UnknownTask:
-                    # Return info for existing tasks only.
-                    self.log.warn("Unknown task %s. "
-                                  "Maybe task was already cleared.",
-                                  taskID)
+        subRes = self._report("infos", tag, lambda t: t.getInfo())
         self.log.debug("Return. Response: %s", subRes)
         return subRes
 
@@ -201,22 +288,46 @@ class TaskManager:
         if not os.path.exists(store):
             self.log.debug("task dump path %s does not exist.", store)
             return
+        try:
+            records = taskjournal.load(store)
+        except Exception:
+            self.log.error("taskManager: Cannot load tasks journal in %s",
+                           store, exc_info=True)
+            records = {}
+        for taskID, record in six.iteritems(records):
+            self.log.debug("Loading journaled task %s", taskID)
+            try:
+                t = Task.loadRecord(record)
+                self._loadDumpedTask(store, t)
+            except Exception:
+                self.log.error("taskManager: Skipping journaled task: %s",
+                               taskID,
+                               exc_info=True)
+
         # taskID is the root part of each (root.ext) entry in the dump task dir
         tasksIDs = set(os.path.splitext(tid)[0] for tid in os.listdir(store))
+        tasksIDs.discard(taskjournal.JOURNAL_DIR)
         for taskID in tasksIDs:
+            if taskID in records:
+                self.log.warning("Ignoring directory of journaled task %s",
+                                 taskID)
+                continue
             self.log.debug("Loading dumped task %s", taskID)
             try:
                 t = Task.loadTask(store, taskID)
-                t.setPersistence(store,
-                                 str(t.persistPolicy),
-                                 str(t.cleanPolicy))
-                self._unqueuedTasks.append(t)
+                self._loadDumpedTask(store, t)
             except Exception:
                 self.log.error("taskManager: Skipping directory: %s",
                                taskID,
                                exc_info=True)
                 continue
 
+    def _loadDumpedTask(self, store, t):
+        t.setPersistence(store,
+                         str(t.persistPolicy),
+                         str(t.cleanPolicy))
+        self._unqueuedTasks.append(t)
+
     def recoverDumpedTasks(self):
         for task in self._unqueuedTasks[:]:
             self.queueRecovery(task)
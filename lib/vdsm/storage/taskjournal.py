@@ -0,0 +1,257 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Append-only journal for persisting storage tasks.
+
+Saving a task in a task directory takes about 10 ioprocess calls (creating a
+temporary directory, writing every meta file, renaming and cleaning up the
+directories), and persistent tasks are saved on every state change.
+
+The journal keeps the state of all the tasks in a store in a sequence of
+segment files in the journal directory. A segment is written once and never
+modified. Records saved by concurrent tasks while a segment is written are
+collected and written together in the next segment (group commit), so
+saving a task takes 2 ioprocess calls shared by all the tasks in the batch.
+
+When the journal has too many segments, it is compacted by writing the last
+record of every live task to a snapshot segment and removing the older
+segments. Loading the journal replays the segments in order, starting from
+the last complete snapshot. A snapshot is complete only if its last record
+was written, so an interrupted compaction is ignored, and the tasks are
+loaded from the older segments.
+
+Records are dicts with the task "id", and either a "meta" dict mapping task
+meta file name to meta lines, or "removed": True.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import errno
+import json
+import logging
+import os
+import threading
+
+import six
+
+from vdsm.common import concurrent
+from vdsm.storage import constants as sc
+from vdsm.storage import outOfProcess as oop
+
+# Name of the journal directory in the task store.
+JOURNAL_DIR = "journal"
+
+SEGMENT_EXT = ".segment"
+
+# Compact the journal when it has this number of segments.
+COMPACT_SEGMENTS = 64
+
+# First and last lines of a segment written by compaction.
+SNAPSHOT = {"snapshot": True}
+SNAPSHOT_END = {"snapshot_end": True}
+
+log = logging.getLogger("storage.TaskManager.Journal")
+
+_lock = threading.Lock()
+_journals = {}
+
+
+def get(store):
+    """
+    Return the journal of store, creating it if needed.
+    """
+    with _lock:
+        journal = _journals.get(store)
+        if journal is None:
+            journal = _journals[store] = Journal(store)
+        return journal
+
+
+def load(store):
+    """
+    Read the journal of store from storage, returning a dict mapping task id
+    to the last record of the task.
+
+    Must be called when starting to use a store (e.g. when becoming SPM),
+    since another host may have modified the journal.
+    """
+    with _lock:
+        journal = _journals[store] = Journal(store)
+    return journal.load()
+
+
+def _ioproc():
+    return oop.getProcessPool(sc.GLOBAL_OOP)
+
+
+class Journal(object):
+
+    def __init__(self, store):
+        self._path = os.path.join(store, JOURNAL_DIR)
+        self._group_commit = concurrent.GroupCommit(self._commit)
+        # Serializes access to storage.
+        self._io_lock = threading.Lock()
+        # task id -> last record, None until the journal is loaded.
+        self._records = None
+        # Sequence numbers of the segments on storage.
+        self._segments = []
+        self._created = False
+
+    @property
+    def path(self):
+        return self._path
+
+    def load(self):
+        """
+        Read the journal from storage, returning a dict mapping task id to
+        the last record of the task.
+        """
+        with self._io_lock:
+            self._load()
+            return dict(self._records)
+
+    def save(self, record):
+        """
+        Save a task record, returning when the record is on storage.
+        """
+        self._group_commit.submit(record)
+
+    def remove(self, task_id):
+        """
+        Remove a task from the journal, returning when the removal is on
+        storage.
+        """
+        self._group_commit.submit({"id": task_id, "removed": True})
+
+    def _commit(self, records):
+        with self._io_lock:
+            self._flush(records)
+
+    def _load(self):
+        records = {}
+        segments = []
+        for path in _ioproc().glob.glob(
+                os.path.join(self._path, "*" + SEGMENT_EXT)):
+            name = os.path.basename(path)
+            try:
+                segments.append(int(name[:-len(SEGMENT_EXT)]))
+            except ValueError:
+                log.warning("Ignoring unexpected file %s", path)
+        segments.sort()
+
+        for seq in segments:
+            segment = list(self._read_segment(seq))
+            if segment and segment[0] == SNAPSHOT:
+                if segment[-1] != SNAPSHOT_END:
+                    # Compaction was interrupted, and the older segments
+                    # were not removed.
+                    log.warning("Ignoring incomplete snapshot %s",
+                                self._segment_path(seq))
+                    continue
+                records.clear()
+                segment = segment[1:-1]
+            for record in segment:
+                _apply(records, record)
+
+        log.debug("Loaded %d tasks from %d segments in %s",
+                  len(records), len(segments), self._path)
+        self._records = records
+        self._segments = segments
+
+    def _flush(self, records):
+        if self._records is None:
+            self._load()
+
+        self._write_segment(records)
+        for record in records:
+            _apply(self._records, record)
+
+        if len(self._segments) >= COMPACT_SEGMENTS:
+            # The records are on storage now, we can retry compacting on the
+            # next flush.
+            try:
+                self._compact()
+            except Exception:
+                log.exception("Error compacting journal %s", self._path)
+
+    def _compact(self):
+        old = self._segments[:]
+        records = [SNAPSHOT]
+        records.extend(self._records[k] for k in sorted(self._records))
+        records.append(SNAPSHOT_END)
+        self._write_segment(records)
+
+        log.info("Compacted %d segments to %d tasks in %s",
+                 len(old), len(self._records), self._path)
+
+        # If removing fails, old segments are ignored when loading since
+        # they are older than the snapshot.
+        for seq in old:
+            path = self._segment_path(seq)
+            try:
+                _ioproc().os.unlink(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    log.warning("Cannot remove segment %s: %s", path, e)
+            self._segments.remove(seq)
+
+    def _read_segment(self, seq):
+        path = self._segment_path(seq)
+        data = _ioproc().readFile(path)
+        for line in data.splitlines():
+            try:
+                yield json.loads(line.decode("utf-8"))
+            except ValueError:
+                # Segment write was interrupted, the rest of the segment was
+                # never acknowledged.
+                log.warning("Ignoring incomplete segment %s", path)
+                return
+
+    def _write_segment(self, records):
+        iop = _ioproc()
+        if not self._created:
+            iop.fileUtils.createdir(self._path)
+            self._created = True
+
+        seq = self._segments[-1] + 1 if self._segments else 0
+        path = self._segment_path(seq)
+        data = b"".join(_encode(record) for record in records)
+        iop.writeFile(path, data)
+        iop.fileUtils.fsyncPath(self._path)
+        self._segments.append(seq)
+
+    def _segment_path(self, seq):
+        return os.path.join(self._path, "%016d%s" % (seq, SEGMENT_EXT))
+
+
+def _apply(records, record):
+    if record.get("removed"):
+        records.pop(record["id"], None)
+    else:
+        records[record["id"]] = record
+
+
+def _encode(record):
+    line = json.dumps(record, sort_keys=True) + "\n"
+    if six.PY2:
+        return line
+    return line.encode("utf-8")
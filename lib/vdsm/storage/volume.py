@@ -37,6 +37,7 @@ from vdsm.storage import guarded
 from vdsm.storage import qemuimg
 from vdsm.storage import resourceManager as rm
 from vdsm.storage import task
+from vdsm.storage import volumemetadata
 from vdsm.storage.sdc import sdCache
 from vdsm.storage.volumemetadata import VolumeMetadata
 
@@ -113,12 +114,28 @@ class VolumeManifest(object):
         """
         Get a value of a specific key
         """
-        meta = self.getMetadata()
+        meta = self.getMetadataSnapshot()
         try:
             return meta[key]
         except KeyError:
             raise se.MetaDataKeyNotFoundError(str(meta) + ":" + str(key))
 
+    def getMetadataSnapshot(self):
+        """
+        Return the volume metadata from the current metadata snapshot,
+        reading it from storage only on the first access. The returned
+        metadata must not be modified; use getMetadata() to read metadata
+        for updating it.
+        """
+        return volumemetadata.cached(
+            (self.sdUUID, self.volUUID), self.getMetadata)
+
+    def invalidateMetadataSnapshot(self):
+        """
+        Must be called after the volume metadata is written or removed.
+        """
+        volumemetadata.invalidate((self.sdUUID, self.volUUID))
+
     def getVolumePath(self):
         """
         Get the path of the volume file/link
@@ -238,7 +255,7 @@ class VolumeManifest(object):
                       self.sdUUID, self.imgUUID, self.volUUID)
         info = {}
         try:
-            meta = self.getMetadata()
+            meta = self.getMetadataSnapshot()
             info = self.metadata2info(meta)
             # Get the image actual size on disk
             vsize = self.getVolumeSize()
@@ -498,7 +515,7 @@ class VolumeManifest(object):
             return
 
         # Bypass the size validation in getSize() by using metadata directly.
-        capacity = self.getMetadata().capacity
+        capacity = self.getMetadataSnapshot().capacity
 
         # We use unsafe here as image may be locked by qemu in some cases, for
         # example when preparing a disk of running VM. However, using unsafe
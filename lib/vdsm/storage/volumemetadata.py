@@ -20,8 +20,11 @@
 
 from __future__ import absolute_import
 
+import collections
 import logging
+import threading
 import time
+from contextlib import contextmanager
 
 import six
 
@@ -282,3 +285,100 @@ class VolumeMetadata(object):
             "type": self.type,
             "voltype": self.voltype
         }
+
+
+# Volume metadata snapshots.
+#
+# Reading volume metadata is a storage read (metadata slot on block storage,
+# ioprocess read on file storage), and a single verb may need the same
+# metadata many times, for example when checking the legality, type and
+# parent of every volume in a chain. Inside a snapshot scope, metadata read
+# for getters is read once per volume and reused until the scope exits, or
+# until the volume metadata is written by any thread.
+
+_snapshot = threading.local()
+
+# Generation counters, incremented when volume metadata is written. Volumes
+# are mapped to a fixed number of counters, so writing a volume may also
+# invalidate other volumes sharing its counter, but the counters do not
+# grow with the number of volumes.
+_GENERATIONS = 256
+_generations = [0] * _GENERATIONS
+_generations_lock = threading.Lock()
+
+# Number of metadata reads per verb.
+_reads = collections.Counter()
+_reads_lock = threading.Lock()
+
+
+@contextmanager
+def snapshot(verb):
+    """
+    Cache volume metadata read in the current thread until the context
+    exits, counting metadata reads under verb. Nested scopes use the
+    outermost snapshot.
+    """
+    if getattr(_snapshot, "cache", None) is not None:
+        yield
+        return
+
+    _snapshot.cache = {}
+    _snapshot.verb = verb
+    try:
+        yield
+    finally:
+        _snapshot.cache = None
+        _snapshot.verb = None
+
+
+def cached(key, read):
+    """
+    Return metadata for key from the current snapshot, calling read() to
+    read the metadata on the first access. Without a snapshot scope, always
+    calls read().
+
+    The returned metadata is shared by all users of the snapshot and must
+    not be modified.
+    """
+    cache = getattr(_snapshot, "cache", None)
+    if cache is None:
+        return read()
+
+    # Must be taken before reading, so a write completed after this point is
+    # detected on the next access.
+    generation = _generations[hash(key) % _GENERATIONS]
+    entry = cache.get(key)
+    if entry is not None and entry[0] == generation:
+        return entry[1]
+
+    md = read()
+    cache[key] = (generation, md)
+    return md
+
+
+def invalidate(key):
+    """
+    Invalidate metadata for key in all snapshots. Must be called after the
+    metadata is written or removed, including when writing failed.
+    """
+    with _generations_lock:
+        _generations[hash(key) % _GENERATIONS] += 1
+
+
+def count_read():
+    """
+    Count a metadata read for the verb of the current snapshot, or for
+    "other" if the read was done outside of a snapshot scope.
+    """
+    verb = getattr(_snapshot, "verb", None) or "other"
+    with _reads_lock:
+        _reads[verb] += 1
+
+
+def reads():
+    """
+    Return a dict mapping verb name to the number of volume metadata reads
+    since vdsm was started.
+    """
+    with _reads_lock:
+        return dict(_reads)
@@ -131,6 +131,7 @@ import logging
 import mmap
 import os
 import struct
+import threading
 import time
 
 from collections import namedtuple
@@ -493,6 +494,7 @@ class Record(object):
 
 # Record with empty values, mark a free record in the index.
 EMPTY_RECORD = Record("", 0)
+EMPTY_RECORD_BYTES = EMPTY_RECORD.bytes()
 
 
 class LeasesVolume(object):
@@ -503,26 +505,43 @@ class LeasesVolume(object):
     the index keeping volume metadata and the mapping from lease id to leased
     offset.
 
-    The index is read when creating an instance, and ever read again. To read
-    the data from storage, recreated the index. Changes to the instance are
-    written immediately to storage.
+    The index is read when creating an instance, and never read again. To
+    read the data from storage, recreate the instance. Changes to the instance
+    are written immediately to storage.
+
+    If cache is specified, the index is shared with other instances using the
+    same cache, and read from storage only if the index metadata on storage
+    was modified since the index was loaded.
     """
 
     def __init__(
             self, file, alignment=sc.ALIGNMENT_1M,
-            block_size=sc.BLOCK_SIZE_512):
-        log.debug("Loading index from %r", file.name)
+            block_size=sc.BLOCK_SIZE_512, cache=None):
         self._file = file
         self._alignment = alignment
         self._block_size = block_size
-        self._index = VolumeIndex(alignment, block_size)
+        self._cache = cache
+        if cache is None:
+            log.debug("Loading index from %r", file.name)
+            self._index = VolumeIndex(alignment, block_size)
+            self._lock = threading.Lock()
+        else:
+            self._index = cache.index
+            self._lock = cache.lock
         try:
-            self._index.load(file)
-            self._md = self._index.read_metadata()
+            with self._lock:
+                if cache is None:
+                    self._index.load(file)
+                else:
+                    cache.revalidate(file)
+                self._md = self._index.read_metadata()
             if self._md.updating:
                 raise IndexIsUpdating(self._md)
         except:
-            self._index.close()
+            if cache is None:
+                self._index.close()
+            else:
+                cache.invalidate()
             raise
         log.debug("Loaded %s", self._md)
 
@@ -553,11 +572,17 @@ class LeasesVolume(object):
         """
         log.debug("Looking up lease %r in lockspace %r",
                   lease_id, self.lockspace)
-        recnum = self._index.find_record(lease_id)
-        if recnum == -1:
-            raise se.NoSuchLease(lease_id)
+        with self._lock:
+            recnum = self._index.find_record(lease_id)
+            if recnum == -1 and self._cache is not None:
+                # The lease may have been added by an older version that does
+                # not modify the index metadata.
+                self._cache.reload(self._file)
+                recnum = self._index.find_record(lease_id)
+            if recnum == -1:
+                raise se.NoSuchLease(lease_id)
 
-        record = self._index.read_record(recnum)
+            record = self._index.read_record(recnum)
         if record.updating:
             raise LeaseUpdating(lease_id)
 
@@ -603,6 +628,7 @@ class LeasesVolume(object):
 
         record = Record(lease_id, offset)
         self._write_record(recnum, record)
+        self._touch()
 
         return LeaseInfo(self.lockspace, lease_id, self._file.name, offset)
 
@@ -636,6 +662,7 @@ class LeasesVolume(object):
             sector=self._block_size)
 
         self._write_record(recnum, EMPTY_RECORD)
+        self._touch()
 
     def leases(self):
         """
@@ -643,23 +670,43 @@ class LeasesVolume(object):
         """
         log.debug("Getting all leases for lockspace %r", self.lockspace)
         leases = {}
-        for recnum in range(MAX_RECORDS):
-            # TODO: handle bad records - currently will raise InvalidRecord and
-            # fail the request.
-            record = self._index.read_record(recnum)
-            # Record can be:
-            # - free - empty resource
-            # - used - non empty resource, may be updating
-            if record.resource:
-                leases[record.resource] = {
-                    "offset": lease_offset(recnum, self._alignment),
-                    "updating": record.updating,
-                }
+        with self._lock:
+            for recnum in range(MAX_RECORDS):
+                # TODO: handle bad records - currently will raise
+                # InvalidRecord and fail the request.
+                record = self._index.read_record(recnum)
+                # Record can be:
+                # - free - empty resource
+                # - used - non empty resource, may be updating
+                if record.resource:
+                    leases[record.resource] = {
+                        "offset": lease_offset(recnum, self._alignment),
+                        "updating": record.updating,
+                    }
         return leases
 
     def close(self):
-        log.debug("Closing index for lockspace %r", self.lockspace)
-        self._index.close()
+        # A cached index is owned by the cache.
+        if self._cache is None:
+            log.debug("Closing index for lockspace %r", self.lockspace)
+            self._index.close()
+
+    def _touch(self):
+        """
+        Update the index mtime on storage, invalidating cached indexes on
+        other hosts.
+
+        The mtime is in seconds, so we make sure it is increased even if the
+        index was modified during the last second.
+        """
+        mtime = max(int(time.time()), self._md.mtime + 1)
+        md = IndexMetadata(self._md.version, self._md.lockspace, mtime=mtime)
+        block = self._index.copy_metadata_block()
+        with utils.closing(block):
+            block.write_metadata(md)
+            block.dump(self._file)
+        self._index.write_metadata(md)
+        self._md = md
 
     def _write_record(self, recnum, record):
         """
@@ -799,32 +846,27 @@ class VolumeIndex(object):
         self._offset = offset
         self._block_size = block_size
         self._buf = mmap.mmap(-1, INDEX_SIZE, mmap.MAP_SHARED)
+        # Lookup table mapping lease id (bytes) to record number.
+        self._records = {}
+        # Bitmap of free records; bit N is set if record N is free.
+        self._free = 0
 
     def find_record(self, lease_id):
         """
         Search for lease_id record. Returns record number if found, -1
         otherwise.
         """
-        prefix = LOOKUP_STRUCT.pack(lease_id.encode("ascii"))
-
-        # TODO: continue search if offset is not aligned to record size.
-        offset = self._buf.find(prefix, RECORD_BASE)
-        if offset == -1:
-            return -1
-
-        return self._record_number(offset)
+        # Lease ids are truncated when stored in the index.
+        key = lease_id.encode("ascii")[:LOOKUP_STRUCT.size - 1]
+        return self._records.get(key, -1)
 
     def find_free_record(self):
         """
         Find the first free record. Returns record number if found, -1
         otherwise.
         """
-        # TODO: continue search if offset is not aligned to record size.
-        offset = self._buf.find(EMPTY_RECORD.bytes(), RECORD_BASE)
-        if offset == -1:
-            return -1
-
-        return self._record_number(offset)
+        # Isolate the lowest set bit.
+        return (self._free & -self._free).bit_length() - 1
 
     def read_record(self, recnum):
         """
@@ -844,8 +886,11 @@ class VolumeIndex(object):
         storage.
         """
         offset = self._record_offset(recnum)
+        data = record.bytes()
+        self._forget_record(recnum, self._buf[offset:offset + RECORD_SIZE])
         self._buf.seek(offset)
-        self._buf.write(record.bytes())
+        self._buf.write(data)
+        self._add_record(recnum, data)
 
     def read_metadata(self):
         """
@@ -877,6 +922,19 @@ class VolumeIndex(object):
         nread = file.pread(self._offset, self._buf)
         if nread < len(self._buf):
             raise TruncatedIndex(len(self._buf), nread)
+        self._build_lookup()
+
+    def metadata_changed(self, file):
+        """
+        Return True if the metadata block on storage is different from the
+        metadata block in the index.
+        """
+        buf = mmap.mmap(-1, self._block_size, mmap.MAP_SHARED)
+        with utils.closing(buf, log=log.name):
+            nread = file.pread(self._offset, buf)
+            if nread < self._block_size:
+                raise TruncatedIndex(self._block_size, nread)
+            return buf[:METADATA_SIZE] != self._buf[:METADATA_SIZE]
 
     def dump(self, file):
         """
@@ -892,6 +950,9 @@ class VolumeIndex(object):
         return ChangeBlock(
             self._offset, self._buf, block_start, self._block_size)
 
+    def copy_metadata_block(self):
+        return ChangeBlock(self._offset, self._buf, 0, self._block_size)
+
     @contextmanager
     def updating(self, lockspace, file):
         """
@@ -915,7 +976,7 @@ class VolumeIndex(object):
 
         # And write the first block (which contains the metadata area) to
         # storage.
-        block = ChangeBlock(self._offset, self._buf, 0, self._block_size)
+        block = self.copy_metadata_block()
         with utils.closing(block):
             block.dump(file)
 
@@ -928,6 +989,74 @@ class VolumeIndex(object):
     def _record_number(self, offset):
         return (offset - RECORD_BASE) // RECORD_SIZE
 
+    def _build_lookup(self):
+        self._records = {}
+        self._free = 0
+        for recnum in range(MAX_RECORDS):
+            offset = self._record_offset(recnum)
+            self._add_record(recnum, self._buf[offset:offset + RECORD_SIZE])
+
+    def _add_record(self, recnum, data):
+        if data == EMPTY_RECORD_BYTES:
+            self._free |= 1 << recnum
+            return
+        resource = data[:LOOKUP_STRUCT.size - 1].rstrip(b"\0")
+        # If the index contains duplicate records, keep the first one.
+        if resource and self._records.get(resource, recnum) >= recnum:
+            self._records[resource] = recnum
+
+    def _forget_record(self, recnum, data):
+        if data == EMPTY_RECORD_BYTES:
+            self._free &= ~(1 << recnum)
+            return
+        resource = data[:LOOKUP_STRUCT.size - 1].rstrip(b"\0")
+        if self._records.get(resource) == recnum:
+            del self._records[resource]
+
+
+class IndexCache(object):
+    """
+    Cache of a leases volume index, shared by LeasesVolume instances of the
+    same storage domain.
+
+    The cached index is validated by reading the index metadata block, and
+    loaded from storage only if the metadata was modified. Modifying the index
+    using LeasesVolume updates the index mtime, so changes made on other hosts
+    are detected.
+
+    Users must hold the lock when accessing the index.
+    """
+
+    def __init__(self, alignment=sc.ALIGNMENT_1M,
+                 block_size=sc.BLOCK_SIZE_512):
+        self.lock = threading.Lock()
+        self.index = VolumeIndex(alignment, block_size)
+        self._valid = False
+        # Number of times the index was loaded from storage.
+        self.loads = 0
+
+    def revalidate(self, file):
+        """
+        Load the index from storage if it was never loaded or the index
+        metadata was modified.
+        """
+        if self._valid and not self.index.metadata_changed(file):
+            return
+        self.reload(file)
+
+    def reload(self, file):
+        log.debug("Loading index from %r", file.name)
+        self._valid = False
+        self.index.load(file)
+        self._valid = True
+        self.loads += 1
+
+    def invalidate(self):
+        self._valid = False
+
+    def close(self):
+        self.index.close()
+
 
 class ChangeBlock(object):
     """
@@ -965,6 +1094,18 @@ class ChangeBlock(object):
         self._buf.seek(offset)
         self._buf.write(record.bytes())
 
+    def write_metadata(self, metadata):
+        """
+        Write metadata block.
+
+        Raises ValueError if this block does not contain the metadata.
+        """
+        if self._offset != 0:
+            raise ValueError("Block at offset %s does not contain metadata"
+                             % self._offset)
+        self._buf.seek(0)
+        self._buf.write(metadata.bytes())
+
     def dump(self, file):
         """
         Write the block to storage and wait until the data reach storage.
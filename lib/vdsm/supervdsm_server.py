@@ -43,6 +43,7 @@ from vdsm.common import concurrent
 from vdsm.common import constants
 from vdsm.common import lockfile
 from vdsm.common import sigutils
+from vdsm.common import supervdsm
 from vdsm.common import time
 from vdsm.common import zombiereaper
 
@@ -210,6 +211,13 @@ class _SuperVdsm(object):
     def hbaRescan(self):
         return hba._rescan()
 
+    def batch(self, calls):
+        """
+        Run several calls in one request, returning list of
+        ("#RETURN", value) or ("#ERROR", exception) tuples.
+        """
+        return supervdsm.run_batch(self, calls)
+
 
 def terminate(signo, frame):
     global _running
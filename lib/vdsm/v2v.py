@@ -92,7 +92,12 @@ _RASD_NS = 'http://schemas.dmtf.org/wbem/wscim/1/cim-schema/2/' \
 
 ImportProgress = namedtuple('ImportProgress',
                             ['current_disk', 'disk_count', 'description'])
-DiskProgress = namedtuple('DiskProgress', ['progress'])
+# disk is None when disks are copied one at a time; the progress is for the
+# current disk.
+DiskProgress = namedtuple('DiskProgress', ['progress', 'disk'])
+DiskProgress.__new__.__defaults__ = (None,)
+DiskEstimatedSize = namedtuple('DiskEstimatedSize', ['size', 'disk'])
+DiskEstimatedSize.__new__.__defaults__ = (None,)
 
 
 class STATUS:
@@ -290,6 +295,9 @@ def get_jobs_status():
             'description': job.description.decode('utf-8'),
             'progress': job.progress
         }
+        throughput = job.throughput
+        if throughput is not None:
+            ret[job_id]['throughput'] = throughput
     return ret
 
 
@@ -677,7 +685,9 @@ class KVMCommand(V2VCommand):
         cmd = [EXT_KVM_2_OVIRT,
                '--uri', self._uri,
                '--bufsize',
-               str(config.getint('v2v', 'kvm2ovirt_buffer_size'))]
+               str(config.getint('v2v', 'kvm2ovirt_buffer_size')),
+               '--parallel',
+               str(config.getint('v2v', 'kvm2ovirt_parallel_disks'))]
         if self._username is not None:
             cmd.extend([
                 '--username', self._username,
@@ -818,9 +828,14 @@ class ImportVm(object):
 
         self._status = STATUS.STARTING
         self._description = ''
-        self._disk_progress = 0
+        # disk number -> progress (0-100)
+        self._disks_progress = {}
+        # disk number -> estimated size in bytes
+        self._disks_size = {}
         self._disk_count = 1
         self._current_disk = 1
+        self._copy_start = None
+        self._copy_end = None
         self._aborted = False
         self._proc = None
 
@@ -852,8 +867,24 @@ class ImportVm(object):
         portion ie if we have 2 disks the first will take
         0-50 and the second 50-100
         '''
-        completed = (self._disk_count - 1) * 100
-        return (completed + self._disk_progress) // self._disk_count
+        completed = sum(self._disks_progress.values())
+        return completed // self._disk_count
+
+    @property
+    def throughput(self):
+        '''
+        Estimated number of bytes copied per second since the first disk
+        copy started, or None if the disks sizes are not known yet.
+        '''
+        if self._copy_start is None or not self._disks_size:
+            return None
+        end = self._copy_end or monotonic_time()
+        elapsed = end - self._copy_start
+        if elapsed <= 0:
+            return None
+        copied = sum(size * self._disks_progress.get(disk, 0) // 100
+                     for disk, size in self._disks_size.items())
+        return int(copied / elapsed)
 
     @traceback(msg="Error importing vm")
     def _run(self):
@@ -878,6 +909,7 @@ class ImportVm(object):
 
         with self._command.execute() as self._proc:
             self._watch_process_output()
+            self._copy_end = monotonic_time()
             self._wait_for_process()
 
             if self._proc.returncode != 0:
@@ -907,19 +939,29 @@ class ImportVm(object):
                 self._status = STATUS.COPYING_DISK
                 logging.info("Job %r copying disk %d/%d",
                              self._id, event.current_disk, event.disk_count)
-                self._disk_progress = 0
+                if self._copy_start is None:
+                    self._copy_start = monotonic_time()
+                self._disks_progress[event.current_disk] = 0
                 self._current_disk = event.current_disk
                 self._disk_count = event.disk_count
                 self._description = event.description
             elif isinstance(event, DiskProgress):
-                self._disk_progress = event.progress
+                disk = self._event_disk(event)
+                self._disks_progress[disk] = event.progress
                 if event.progress % 10 == 0:
                     logging.info("Job %r copy disk %d progress %d/100",
-                                 self._id, self._current_disk, event.progress)
+                                 self._id, disk, event.progress)
+            elif isinstance(event, DiskEstimatedSize):
+                self._disks_size[self._event_disk(event)] = event.size
             else:
                 raise RuntimeError("Job %r got unexpected parser event: %s" %
                                    (self._id, event))
 
+    def _event_disk(self, event):
+        if event.disk is None:
+            return self._current_disk
+        return event.disk
+
     def abort(self):
         self._status = STATUS.ABORTED
         logging.info('Job %r aborting...', self._id)
@@ -950,21 +992,60 @@ class ImportVm(object):
 
 
 class OutputParser(object):
+    """
+    Parse virt-v2v and kvm2ovirt output, yielding ImportProgress,
+    DiskProgress and DiskEstimatedSize events.
+
+    When kvm2ovirt copies several disks concurrently, progress and size
+    lines include the disk number, and progress of several disks is
+    interleaved.
+
+    virt-v2v reports the estimated size of every target in its target
+    listing, before copying the first disk. These sizes have no disk
+    number, and are listed in the order the disks are copied.
+    """
     COPY_DISK_RE = re.compile(br'.*(Copying disk (\d+)/(\d+)).*')
-    DISK_PROGRESS_RE = re.compile(br'\s+\((\d+).*')
+    DISK_PROGRESS_RE = re.compile(br'\s+\((?:disk (\d+): )?(\d+).*')
+    ESTIMATED_SIZE_RE = re.compile(
+        br'(?:disk (\d+) )?target_estimated_size = (\d+)')
+    LINE_END_RE = re.compile(br'[\r\n]')
 
     def parse(self, stream):
-        for line in stream:
+        # Disks being copied, waiting for progress 100.
+        copying = set()
+        current_disk = None
+        # Number of targets listed before copying started.
+        targets = 0
+        for line in self._iter_lines(stream):
             if b'Copying disk' in line:
                 description, current_disk, disk_count = self._parse_line(line)
-                yield ImportProgress(int(current_disk), int(disk_count),
+                current_disk = int(current_disk)
+                copying.add(current_disk)
+                yield ImportProgress(current_disk, int(disk_count),
                                      description)
-                for chunk in self._iter_progress(stream):
-                    progress = self._parse_progress(chunk)
-                    if progress is not None:
-                        yield DiskProgress(progress)
-                    if progress == 100:
-                        break
+            elif current_disk is None:
+                event = self._parse_estimated_size(line)
+                if event is not None:
+                    if event.disk is None:
+                        targets += 1
+                        event = event._replace(disk=targets)
+                    yield event
+            elif copying:
+                event = self._parse_progress(line)
+                if event is None:
+                    event = self._parse_estimated_size(line)
+                    if event is not None:
+                        yield event
+                    continue
+                disk = current_disk if event.disk is None else event.disk
+                if disk not in copying:
+                    continue
+                yield event
+                if event.progress == 100:
+                    copying.discard(disk)
+
+        if copying:
+            raise OutputParserError('copy-disk stream closed unexpectedly')
 
     def _parse_line(self, line):
         m = self.COPY_DISK_RE.match(line)
@@ -973,27 +1054,42 @@ class OutputParser(object):
                                     ', line: %r' % line)
         return m.group(1), m.group(2), m.group(3)
 
-    def _iter_progress(self, stream):
-        chunk = b''
+    def _iter_lines(self, stream):
+        """
+        Read the stream in chunks, yielding lines terminated by newline or
+        carriage return, since progress lines end with carriage return.
+        """
+        partial = b''
         while True:
-            c = stream.read(1)
-            if not c:
-                raise OutputParserError('copy-disk stream closed unexpectedly')
-            chunk += c
-            if c in [b'\n', b'\r']:
-                yield chunk
-                chunk = b''
-
-    def _parse_progress(self, chunk):
-        m = self.DISK_PROGRESS_RE.match(chunk)
+            chunk = stream.read1(BUFFSIZE)
+            if not chunk:
+                break
+            lines = self.LINE_END_RE.split(partial + chunk)
+            partial = lines.pop()
+            for line in lines:
+                if line:
+                    yield line
+        if partial:
+            yield partial
+
+    def _parse_progress(self, line):
+        m = self.DISK_PROGRESS_RE.match(line)
         if m is None:
             return None
         try:
-            return int(m.group(1))
+            disk = int(m.group(1)) if m.group(1) else None
+            return DiskProgress(int(m.group(2)), disk)
         except ValueError:
             raise OutputParserError('error parsing progress regex: %r'
                                     % m.groups)
 
+    def _parse_estimated_size(self, line):
+        m = self.ESTIMATED_SIZE_RE.search(line)
+        if m is None:
+            return None
+        disk = int(m.group(1)) if m.group(1) else None
+        return DiskEstimatedSize(int(m.group(2)), disk)
+
 
 def _mem_to_mib(size, unit):
     lunit = unit.lower()
@@ -45,11 +45,13 @@ from vdsm.common import libvirtconnection
 from vdsm.common import sigutils
 from vdsm.common import supervdsm
 from vdsm.common import time
+from vdsm.common import tracing
 from vdsm.common import zombiereaper
 from vdsm.common.panic import panic
 from vdsm.config import config
 from vdsm.network.initializer import init_unprivileged_network_components
 from vdsm.profiling import profile
+from vdsm.profiling import sampler
 from vdsm.storage.hsm import HSM
 from vdsm.storage.dispatcher import Dispatcher
 from vdsm.virt import periodic
@@ -81,13 +83,23 @@ def serve_clients(log):
             irs.spmStop(
                 irs.getConnectedStoragePoolsList()['poollist'][0])
 
+    def sigusr2Handler(signum, frame):
+        log.info("Received signal %s, dumping profile samples" % signum)
+        try:
+            sampler.dump_file()
+        except Exception:
+            log.exception("Error dumping profile samples")
+
     sigutils.register()
     signal.signal(signal.SIGTERM, sigtermHandler)
     signal.signal(signal.SIGUSR1, sigusr1Handler)
+    signal.signal(signal.SIGUSR2, sigusr2Handler)
     zombiereaper.registerSignalHandler()
 
     profile.start()
     metrics.start()
+    if config.getboolean('devel', 'tracing_enable'):
+        tracing.start(config.getint('devel', 'tracing_requests'))
 
     libvirtconnection.start_event_loop()
 
@@ -121,6 +133,7 @@ def serve_clients(log):
 
             profile.stop()
         finally:
+            tracing.stop()
             metrics.stop()
             health.stop()
             periodic.stop()
@@ -0,0 +1,149 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Compact representation of libvirt bulk stats.
+
+libvirt returns the stats of every VM as a dict, with a key for every counter
+of every device (e.g. "block.3.rd.bytes"). StatsCache keeps the last samples
+of every VM, so on a host running many VMs with many devices we keep hundreds
+of thousands of keys and int objects.
+
+The keys of a VM change only when devices are added or removed, and VMs with
+the same devices have the same keys. The keys are kept once in a Schema,
+shared by all the samples with the same keys, and every sample keeps only the
+values: integers in an array, and other values (e.g. device names and paths)
+in a tuple.
+
+Samples are read through the Stats mapping, so code reading the samples does
+not depend on the representation.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import array
+import threading
+import weakref
+
+import six
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+# Signed 64 bit integer.
+_INT_TYPE = 'q' if six.PY3 else 'l'
+
+_lock = threading.Lock()
+
+# keys -> Schema, dropped when no sample uses the schema.
+_schemas = weakref.WeakValueDictionary()
+
+
+def pack(stats):
+    """
+    Return a compact Stats mapping with the items of stats, a dict of bulk
+    stats of one VM.
+
+    If stats cannot be packed (e.g. an integer value does not fit in 64
+    bits), stats is returned as is.
+    """
+    keys = tuple(stats)
+    values = list(six.itervalues(stats))
+    schema = _schema(keys, values)
+    try:
+        ints = array.array(
+            _INT_TYPE, [values[i] for i in schema.int_positions])
+    except (TypeError, OverflowError):
+        return stats
+    other = tuple(_intern(values[i]) for i in schema.other_positions)
+    return Stats(schema, ints, other)
+
+
+class Schema(object):
+    """
+    Keys of packed samples, and the location of every value.
+    """
+
+    __slots__ = ("keys", "index", "int_positions", "other_positions",
+                 "__weakref__")
+
+    def __init__(self, keys, values):
+        self.keys = tuple(six.moves.intern(str(k)) for k in keys)
+        # key -> index in ints if >= 0, else ~index in other.
+        self.index = {}
+        self.int_positions = []
+        self.other_positions = []
+        for i, (key, value) in enumerate(zip(self.keys, values)):
+            if type(value) in six.integer_types:
+                self.index[key] = len(self.int_positions)
+                self.int_positions.append(i)
+            else:
+                self.index[key] = ~len(self.other_positions)
+                self.other_positions.append(i)
+
+
+class Stats(Mapping):
+    """
+    Read only mapping of packed bulk stats of one VM.
+    """
+
+    __slots__ = ("_schema", "_ints", "_other")
+
+    def __init__(self, schema, ints, other):
+        self._schema = schema
+        self._ints = ints
+        self._other = other
+
+    def __getitem__(self, key):
+        i = self._schema.index[key]
+        if i >= 0:
+            return self._ints[i]
+        return self._other[~i]
+
+    def __contains__(self, key):
+        return key in self._schema.index
+
+    def __iter__(self):
+        return iter(self._schema.keys)
+
+    def __len__(self):
+        return len(self._schema.keys)
+
+    def __repr__(self):
+        return "<Stats %r>" % dict(self)
+
+
+def _schema(keys, values):
+    with _lock:
+        schema = _schemas.get(keys)
+        if schema is None:
+            schema = Schema(keys, values)
+            _schemas[schema.keys] = schema
+        return schema
+
+
+def _intern(value):
+    # Device names and paths are the same in every sample.
+    if type(value) is str:
+        return six.moves.intern(value)
+    return value
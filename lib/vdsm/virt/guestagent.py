@@ -249,7 +249,8 @@ class GuestAgent(object):
             self._create,
             self._connect,
             self._onChannelRead,
-            self._onChannelTimeout)
+            self._onChannelTimeout,
+            key=self._socketName)
 
     def _handleAPIVersion(self, version):
         """ Handles the API version value from the heartbeat
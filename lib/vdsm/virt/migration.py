@@ -23,6 +23,7 @@ from __future__ import division
 
 import io
 import collections
+import contextlib
 import re
 import threading
 import time
@@ -40,9 +41,11 @@ from vdsm.common import xmlutils
 from vdsm.common.compat import pickle
 from vdsm.common.define import NORMAL
 from vdsm.common.network.address import normalize_literal_addr
+from vdsm.common.time import monotonic_time
 from vdsm.common.units import MiB
 from vdsm.virt.utils import DynamicBoundedSemaphore
 
+from vdsm.virt import migrationscheduler
 from vdsm.virt import virdomain
 from vdsm.virt import vmexitreason
 from vdsm.virt import vmstatus
@@ -80,6 +83,11 @@ class MigrationLimitExceeded(RuntimeError):
     """
 
 
+def _total_bandwidth():
+    bandwidth = config.getint('vars', 'migration_total_bandwidth')
+    return bandwidth if bandwidth > 0 else None
+
+
 class PostCopyPhase:
     NONE = 0
     REQUESTED = 1
@@ -92,7 +100,7 @@ class SourceThread(object):
     """
     _RECOVERY_LOOP_PAUSE = 10
 
-    ongoingMigrations = DynamicBoundedSemaphore(1)
+    ongoingMigrations = migrationscheduler.Scheduler(1, _total_bandwidth())
 
     def __init__(self, vm, dst='', dstparams='',
                  mode=MODE_REMOTE, method=METHOD_ONLINE,
@@ -115,6 +123,10 @@ class SourceThread(object):
             kwargs.get('maxBandwidth') or
             config.getint('vars', 'migration_max_bandwidth')
         )
+        # Maximum bandwidth requested for this migration; the bandwidth
+        # actually used may be lower when the host bandwidth is shared.
+        self._requestedBandwidth = self._maxBandwidth
+        self._priority = int(kwargs.get('priority', 0))
         self._incomingLimit = kwargs.get('incomingLimit')
         self._outgoingLimit = kwargs.get('outgoingLimit')
         self.status = {
@@ -406,7 +418,7 @@ class SourceThread(object):
             while not self._started:
                 try:
                     self.log.info("Migration semaphore: acquiring")
-                    with SourceThread.ongoingMigrations:
+                    with self._scheduled():
                         self.log.info("Migration semaphore: acquired")
                         timeout = config.getint(
                             'vars', 'guest_lifecycle_event_reply_timeout')
@@ -443,6 +455,48 @@ class SourceThread(object):
             self._recover(str(e))
             self.log.exception("Failed to migrate")
 
+    @contextlib.contextmanager
+    def _scheduled(self):
+        if not SourceThread.ongoingMigrations.acquire(
+                self, self._migrationCanceledEvt):
+            self._raiseAbortError()
+        try:
+            yield
+        finally:
+            SourceThread.ongoingMigrations.release(self)
+
+    # Migration scheduler job interface.
+
+    @property
+    def priority(self):
+        return self._priority
+
+    @property
+    def memory(self):
+        return self._vm.mem_size_mb() * MiB
+
+    @property
+    def max_bandwidth(self):
+        return self._requestedBandwidth
+
+    def dirty_rate(self):
+        monitor = self._monitorThread
+        if monitor is None or monitor.estimate is None:
+            return None
+        return monitor.estimate.dirty_rate
+
+    def set_bandwidth(self, bandwidth):
+        self._maxBandwidth = bandwidth
+        # Before the migration starts, the bandwidth is passed to libvirt
+        # when starting the migration.
+        if self._monitorThread is not None:
+            self.log.debug('setting scheduled migration bandwidth to %d',
+                           bandwidth)
+            self._vm._dom.migrateSetMaxSpeed(bandwidth)
+
+    def __str__(self):
+        return 'migration of %s' % self._vm.id
+
     def _startUnderlyingMigration(self, startTime, machineParams):
         if self.hibernating:
             self._started = True
@@ -526,8 +580,9 @@ class SourceThread(object):
 
             self._vm.log.info('starting migration to %s '
                               'with miguri %s', duri, muri)
-            self._monitorThread = MonitorThread(self._vm, startTime,
-                                                self._convergence_schedule)
+            self._monitorThread = MonitorThread(
+                self._vm, startTime, self._convergence_schedule,
+                on_sample=SourceThread.ongoingMigrations.rebalance)
             self._perform_with_conv_schedule(duri, muri)
             self.log.info("migration took %d seconds to complete",
                           (time.time() - startTime) + destCreationTime)
@@ -635,8 +690,12 @@ class SourceThread(object):
 
     def set_max_bandwidth(self, bandwidth):
         self._vm.log.debug('setting migration max bandwidth to %d', bandwidth)
-        self._maxBandwidth = bandwidth
-        self._vm._dom.migrateSetMaxSpeed(bandwidth)
+        self._requestedBandwidth = bandwidth
+        if SourceThread.ongoingMigrations.total_bandwidth is None:
+            self._maxBandwidth = bandwidth
+            self._vm._dom.migrateSetMaxSpeed(bandwidth)
+        else:
+            SourceThread.ongoingMigrations.rebalance()
 
     def stop(self):
         # if its locks we are before the migrateToURI3()
@@ -689,18 +748,97 @@ def exponential_downtime(downtime, steps):
         yield downtime
 
 
+Estimate = collections.namedtuple('Estimate', [
+    # bytes per second
+    'transfer_rate',
+    # bytes per second
+    'dirty_rate',
+    # seconds to transfer the remaining data, None if not converging
+    'eta',
+])
+
+
+class ConvergenceEstimator(object):
+    """
+    Estimate migration transfer rate, dirty rate and time to completion from
+    consecutive Progress samples.
+
+    Time is taken from the job elapsed time reported by libvirt, so the
+    estimates do not depend on the sampling intervals. Rates are smoothed
+    using exponential moving average.
+    """
+
+    # Weight of the newest sample.
+    ALPHA = 0.5
+
+    def __init__(self):
+        self._last = None
+        self._transfer_rate = None
+        self._dirty_rate = None
+
+    def update(self, progress):
+        """
+        Add a new sample and return an Estimate, or None if there are not
+        enough samples yet.
+        """
+        last, self._last = self._last, progress
+        if last is None:
+            return None
+
+        elapsed = (progress.time_elapsed - last.time_elapsed) / 1000
+        if elapsed <= 0:
+            return self._estimate(progress)
+
+        transferred = progress.data_processed - last.data_processed
+        transfer_rate = max(0, transferred / elapsed)
+        # Data dirtied during this interval was added to the remaining data
+        # while the transferred data was removed from it.
+        reduced = last.data_remaining - progress.data_remaining
+        dirty_rate = max(0, (transferred - reduced) / elapsed)
+
+        self._transfer_rate = self._smooth(self._transfer_rate, transfer_rate)
+        self._dirty_rate = self._smooth(self._dirty_rate, dirty_rate)
+        return self._estimate(progress)
+
+    def _smooth(self, current, value):
+        if current is None:
+            return value
+        return self.ALPHA * value + (1 - self.ALPHA) * current
+
+    def _estimate(self, progress):
+        if self._transfer_rate is None:
+            return None
+        net_rate = self._transfer_rate - self._dirty_rate
+        if net_rate > 0:
+            eta = progress.data_remaining / net_rate
+        elif progress.data_remaining == 0:
+            eta = 0
+        else:
+            eta = None
+        return Estimate(self._transfer_rate, self._dirty_rate, eta)
+
+
 class MonitorThread(object):
     _MIGRATION_MONITOR_INTERVAL = config.getint(
         'vars', 'migration_monitor_interval')  # seconds
+    _MIGRATION_MONITOR_MIN_INTERVAL = config.getint(
+        'vars', 'migration_monitor_min_interval')  # seconds
 
-    def __init__(self, vm, startTime, conv_schedule):
+    # Sample more often when the dirty rate is above this fraction of the
+    # transfer rate.
+    _HIGH_DIRTY_RATIO = 0.8
+
+    def __init__(self, vm, startTime, conv_schedule, on_sample=None):
         super(MonitorThread, self).__init__()
         self._stop = threading.Event()
         self._vm = vm
         self._startTime = startTime
         self.daemon = True
         self.progress = None
+        self.estimate = None
         self._conv_schedule = conv_schedule
+        self._on_sample = on_sample
+        self._last_event = None
         self._thread = concurrent.thread(
             self.run, name='migmon/' + self._vm.id[:8])
 
@@ -736,11 +874,17 @@ class MonitorThread(object):
     def monitor_migration(self):
         lowmark = None
         initial_iteration = last_iteration = None
+        estimator = ConvergenceEstimator()
+        interval = self._MIGRATION_MONITOR_INTERVAL
+        # Number of monitor intervals the migration was not converging since
+        # the last iteration, each counted as a stalling iteration.
+        extra_stalling = 0
+        diverging_since = None
 
         self._execute_init(self._conv_schedule['init'])
 
         while not self._stop.isSet():
-            stopped = self._stop.wait(self._MIGRATION_MONITOR_INTERVAL)
+            stopped = self._stop.wait(interval)
             if stopped:
                 break
 
@@ -748,6 +892,7 @@ class MonitorThread(object):
             # It may happen that the migration did not start yet
             # so we'll keep waiting
             if not ongoing(job_stats):
+                interval = self._MIGRATION_MONITOR_INTERVAL
                 continue
 
             progress = Progress.from_job_stats(job_stats)
@@ -757,7 +902,10 @@ class MonitorThread(object):
                 # previously cancelled migrations.
                 initial_iteration = last_iteration = progress.mem_iteration
 
-            self._vm.send_migration_status_event()
+            estimate = estimator.update(progress)
+            interval = self._next_interval(progress, estimate)
+
+            self._send_status_event()
 
             if self._vm.post_copy != PostCopyPhase.NONE:
                 # Post-copy mode is a final state of a migration -- it either
@@ -788,15 +936,79 @@ class MonitorThread(object):
             if not self._vm.post_copy and\
                progress.mem_iteration > last_iteration:
                 last_iteration = progress.mem_iteration
+                diverging_since = None
                 current_iteration = last_iteration - initial_iteration
                 self._vm.log.debug('new iteration: %i', current_iteration)
-                self._next_action(current_iteration)
+                self._next_action(current_iteration + extra_stalling)
+            elif not self._vm.post_copy and estimate is not None and \
+                    estimate.eta is None:
+                # Iterations may take very long when the guest dirties
+                # memory faster than we can transfer it. Do not wait for
+                # the iteration boundary to make the next action.
+                if diverging_since is None:
+                    diverging_since = progress.time_elapsed
+                elif (progress.time_elapsed - diverging_since >=
+                        self._MIGRATION_MONITOR_INTERVAL * 1000):
+                    diverging_since = progress.time_elapsed
+                    extra_stalling += 1
+                    current_iteration = last_iteration - initial_iteration
+                    self._vm.log.debug(
+                        'migration not converging (transfer rate %iMBps,'
+                        ' dirty rate %iMBps)',
+                        estimate.transfer_rate // MiB,
+                        estimate.dirty_rate // MiB)
+                    self._next_action(current_iteration + extra_stalling)
+            else:
+                diverging_since = None
 
             if self._stop.isSet():
                 break
 
             self.progress = progress
+            self.estimate = estimate
+            if self._on_sample is not None:
+                self._on_sample()
             self._vm.log.info('%s', progress)
+            if estimate is not None:
+                self._vm.log.debug(
+                    'Migration estimate: transfer rate %iMBps,'
+                    ' dirty rate %iMBps, eta %s seconds, next sample in'
+                    ' %.1f seconds',
+                    estimate.transfer_rate // MiB,
+                    estimate.dirty_rate // MiB,
+                    'unknown' if estimate.eta is None else
+                    '%.1f' % estimate.eta,
+                    interval)
+
+    def _next_interval(self, progress, estimate):
+        """
+        Return the time to wait before the next sample. Sample more often
+        when the migration is about to converge, or when the dirty rate is
+        high, so we can react quickly. Otherwise sample at the normal
+        monitor interval.
+        """
+        max_interval = self._MIGRATION_MONITOR_INTERVAL
+        min_interval = min(self._MIGRATION_MONITOR_MIN_INTERVAL, max_interval)
+        if estimate is None:
+            return max_interval
+        if (estimate.transfer_rate > 0 and
+                estimate.dirty_rate >=
+                estimate.transfer_rate * self._HIGH_DIRTY_RATIO):
+            return min_interval
+        if estimate.eta is not None and estimate.eta < max_interval * 2:
+            return max(min_interval, min(max_interval, estimate.eta / 2))
+        return max_interval
+
+    def _send_status_event(self):
+        """
+        Send migration status event, at most once per monitor interval,
+        regardless of the sampling interval.
+        """
+        now = monotonic_time()
+        if (self._last_event is None or
+                now - self._last_event >= self._MIGRATION_MONITOR_INTERVAL):
+            self._last_event = now
+            self._vm.send_migration_status_event()
 
     def stop(self):
         self._vm.log.debug('stopping migration monitor thread')
@@ -0,0 +1,234 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Host wide scheduler for outgoing migrations.
+
+The scheduler limits the number of concurrent outgoing migrations, starting
+queued migrations by priority and memory size, and splits the available
+bandwidth between the active migrations.
+
+Migrations are represented by job objects, providing:
+
+priority        Migrations with higher priority are started first.
+memory          Memory size of the VM in bytes. Among migrations with the
+                same priority, smaller VMs are started first, to free
+                bandwidth for the rest of the migrations as soon as possible.
+max_bandwidth   Maximum bandwidth of the migration in MiB/s.
+dirty_rate()    Return the current dirty rate of the VM in bytes per second,
+                or None if not known yet.
+set_bandwidth(bandwidth)
+                Called when the bandwidth (in MiB/s) allocated to the
+                migration was changed.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import itertools
+import logging
+import threading
+
+from vdsm.common.units import MiB
+
+# Minimal bandwidth (MiB/s) allocated to an active migration.
+MIN_BANDWIDTH = 1
+
+# A migration needs more bandwidth than its dirty rate to converge.
+CONVERGENCE_MARGIN = 1.25
+
+
+def allocate(jobs, total_bandwidth, min_bandwidth=MIN_BANDWIDTH):
+    """
+    Split total_bandwidth (MiB/s) between jobs, ordered by scheduling
+    order.
+
+    Every job gets at least min_bandwidth. Then jobs get enough bandwidth to
+    converge (their dirty rate with some margin), in scheduling order, so
+    the first jobs can complete instead of all the jobs stalling. The rest of
+    the bandwidth is split evenly. A job never gets more than its
+    max_bandwidth.
+
+    If total_bandwidth is None, every job gets its max_bandwidth.
+
+    Returns a dict mapping job to bandwidth in MiB/s.
+    """
+    if total_bandwidth is None:
+        return {job: job.max_bandwidth for job in jobs}
+    if not jobs:
+        return {}
+
+    alloc = {job: min(min_bandwidth, job.max_bandwidth) for job in jobs}
+    remaining = total_bandwidth - sum(alloc.values())
+
+    for job in jobs:
+        if remaining <= 0:
+            break
+        dirty_rate = job.dirty_rate()
+        if dirty_rate is None:
+            continue
+        needed = int(dirty_rate * CONVERGENCE_MARGIN // MiB) + 1
+        extra = min(needed, job.max_bandwidth) - alloc[job]
+        if extra > 0:
+            extra = min(extra, remaining)
+            alloc[job] += extra
+            remaining -= extra
+
+    # Split the rest evenly, giving what capped jobs cannot use to the
+    # others.
+    hungry = [job for job in jobs if alloc[job] < job.max_bandwidth]
+    while remaining > 0 and hungry:
+        share = max(1, remaining // len(hungry))
+        for job in hungry:
+            extra = min(share, job.max_bandwidth - alloc[job], remaining)
+            alloc[job] += extra
+            remaining -= extra
+            if remaining == 0:
+                break
+        hungry = [job for job in hungry if alloc[job] < job.max_bandwidth]
+
+    return alloc
+
+
+class Scheduler(object):
+    """
+    Queue outgoing migrations and split bandwidth between them.
+
+    Replaces a plain semaphore; the bound can be modified while migrations
+    are running, like DynamicBoundedSemaphore.
+    """
+
+    _log = logging.getLogger("virt.migrationscheduler")
+
+    def __init__(self, bound, total_bandwidth=None):
+        """
+        bound               Maximum number of concurrent migrations.
+        total_bandwidth     Bandwidth (MiB/s) shared by all migrations, or
+                            None to let every migration use its own maximum
+                            bandwidth.
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._bound = bound
+        self._total_bandwidth = total_bandwidth
+        self._counter = itertools.count()
+        # job -> sort key
+        self._waiting = {}
+        # job -> sort key
+        self._active = {}
+        # job -> allocated bandwidth
+        self._allocation = {}
+
+    @property
+    def bound(self):
+        return self._bound
+
+    @bound.setter
+    def bound(self, value):
+        with self._cond:
+            self._bound = value
+            self._cond.notify_all()
+
+    @property
+    def total_bandwidth(self):
+        return self._total_bandwidth
+
+    @total_bandwidth.setter
+    def total_bandwidth(self, value):
+        with self._cond:
+            self._total_bandwidth = value
+        self.rebalance()
+
+    def acquire(self, job, canceled=None):
+        """
+        Wait until job can start. Returns True when the job was started, or
+        False if canceled (a threading.Event) was set while waiting.
+        """
+        with self._cond:
+            key = (-job.priority, job.memory, next(self._counter))
+            self._waiting[job] = key
+            try:
+                while not self._can_start(job):
+                    if canceled is not None and canceled.is_set():
+                        return False
+                    # Wake up periodically to check the canceled event.
+                    self._cond.wait(1)
+            finally:
+                del self._waiting[job]
+            self._active[job] = key
+            # Let the next waiting job check if it can start too.
+            self._cond.notify_all()
+        self._log.debug("Started job %s (active=%d, waiting=%d)",
+                        job, len(self._active), len(self._waiting))
+        self.rebalance()
+        return True
+
+    def release(self, job):
+        with self._cond:
+            del self._active[job]
+            self._allocation.pop(job, None)
+            self._cond.notify_all()
+        self._log.debug("Finished job %s (active=%d, waiting=%d)",
+                        job, len(self._active), len(self._waiting))
+        self.rebalance()
+
+    def active(self):
+        """
+        Return list of active jobs in scheduling order.
+        """
+        with self._cond:
+            return self._sorted(self._active)
+
+    def waiting(self):
+        """
+        Return list of waiting jobs in scheduling order.
+        """
+        with self._cond:
+            return self._sorted(self._waiting)
+
+    def rebalance(self):
+        """
+        Split the bandwidth between the active jobs again, notifying jobs
+        whose bandwidth was changed. Should be called when the dirty rate of
+        the jobs changes.
+        """
+        with self._cond:
+            jobs = self._sorted(self._active)
+            alloc = allocate(jobs, self._total_bandwidth)
+            changed = [(job, bw) for job, bw in alloc.items()
+                       if self._allocation.get(job) != bw]
+            self._allocation.update(changed)
+
+        # Notifying jobs may call libvirt, don't block other jobs.
+        for job, bandwidth in changed:
+            self._log.debug("Setting bandwidth of job %s to %d MiB/s",
+                            job, bandwidth)
+            try:
+                job.set_bandwidth(bandwidth)
+            except Exception:
+                self._log.exception("Error setting bandwidth of job %s", job)
+
+    def _can_start(self, job):
+        if len(self._active) >= self._bound:
+            return False
+        head = min(self._waiting, key=self._waiting.get)
+        return head is job
+
+    def _sorted(self, jobs):
+        return sorted(jobs, key=jobs.get)
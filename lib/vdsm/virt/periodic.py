@@ -25,6 +25,7 @@ from __future__ import division
 Code to perform periodic maintenance and bookkeeping of the VMs.
 """
 
+from collections import defaultdict
 import logging
 import threading
 
@@ -37,7 +38,9 @@ from vdsm import throttledlog
 from vdsm.common import errors
 from vdsm.common import exception
 from vdsm.common import libvirtconnection
+from vdsm.common.time import monotonic_time
 from vdsm.config import config
+from vdsm.host import api as hostapi
 from vdsm.virt import migration
 from vdsm.virt import recovery
 from vdsm.virt import sampling
@@ -52,6 +55,7 @@ _TASK_PER_WORKER = config.getint('sampling', 'periodic_task_per_worker')
 _TASKS = _WORKERS * _TASK_PER_WORKER
 _MAX_WORKERS = config.getint('sampling', 'max_workers')
 _THROTTLING_INTERVAL = 10  # seconds
+_METRICS_ENABLED = config.getboolean('metrics', 'enabled')
 
 _operations = []
 _executor = None
@@ -235,11 +239,28 @@ class VmDispatcher(object):
     """
     Adapter class. Dispatch an Operation to all VMs, to improve
     isolation among them.
+
+    VMs are divided between slots, and every call dispatches the VMs of the
+    next slot, so the operation should be called `slots` times per period.
+    This spreads the per-VM operations over the period instead of
+    dispatching all of them at once.
+
+    A VM is not dispatched while its previous run is pending, to avoid
+    piling up operations on slow VMs. VMs that missed their slot (e.g.
+    because the executor was full) are dispatched on the next call, and VMs
+    waiting the longest are dispatched first.
     """
 
     _log = logging.getLogger("virt.periodic.VmDispatcher")
 
-    def __init__(self, get_vms, executor, create, timeout):
+    # Reasons for skipping a VM.
+    NOT_RUNNABLE = "not_runnable"
+    PENDING = "pending"
+    EXECUTOR_FULL = "executor_full"
+    ERROR = "error"
+
+    def __init__(self, get_vms, executor, create, timeout, period=0,
+                 slots=1, clock=monotonic_time):
         """
         get_vms: callable which will return a dict which maps
                  vm_ids to vm_instances
@@ -248,17 +269,40 @@ class VmDispatcher(object):
                 dispatch, with its timeout
         timeout: per-vm operation timeout, in seconds
                  (fractions allowed).
+        period: per-vm operation period, in seconds. If 0, every call
+                dispatches all the VMs.
+        slots: number of slots the VMs are divided between.
+        clock: callable returning monotonic time, for testing.
         """
         self._get_vms = get_vms
         self._executor = executor
         self._create = create
         self._timeout = timeout
+        self._period = period
+        self._slots = slots
+        self._clock = clock
+        self._lock = threading.Lock()
+        # vm_id -> _VmState
+        self._vms = {}
+        # Number of VMs in every slot.
+        self._slot_load = [0] * slots
+        self._next_slot = 0
+        # reason -> number of VMs skipped in the last call
+        self._skipped = {}
 
     def __call__(self):
         vms = self._get_vms()
-        skipped = []
-
-        for vm_id, vm_obj in six.viewitems(vms):
+        skipped = defaultdict(list)
+        executor_full = False
+
+        for vm_id, vm_obj, state in self._due(vms):
+            op = None
+            if state.pending:
+                skipped[self.PENDING].append(vm_id)
+                continue
+            if executor_full:
+                skipped[self.EXECUTOR_FULL].append(vm_id)
+                continue
             try:
                 op = self._create(vm_obj)
 
@@ -272,22 +316,124 @@ class VmDispatcher(object):
                 # definitely want to avoid known-bad situation and to
                 # needlessly overload libvirt.
                 if not op.runnable:
-                    skipped.append(vm_id)
+                    skipped[self.NOT_RUNNABLE].append(vm_id)
                     continue
 
             except Exception:
                 # we want to make sure to have VM UUID logged
-                self._log.exception("while dispatching %s", op)
+                self._log.exception("while dispatching %s on %s",
+                                    op or self._create, vm_id)
+                skipped[self.ERROR].append(vm_id)
             else:
-                try:
-                    self._executor.dispatch(op, self._timeout)
-                except exception.ResourceExhausted:
-                    skipped.append(vm_id)
+                if not self._dispatch(state, op):
+                    # The executor is full, no point in trying the rest.
+                    skipped[self.EXECUTOR_FULL].append(vm_id)
+                    executor_full = True
+
+        with self._lock:
+            self._skipped = {reason: len(vm_ids)
+                             for reason, vm_ids in six.iteritems(skipped)}
 
         if skipped:
             self._log.warning('could not run %s on %s',
-                              self._create, skipped)
-        return skipped  # for testing purposes
+                              self._create, dict(skipped))
+        if _METRICS_ENABLED:
+            hostapi.send_periodic_metrics(self.name, self.stats())
+
+        # for testing purposes
+        return [vm_id for vm_ids in six.itervalues(skipped)
+                for vm_id in vm_ids]
+
+    @property
+    def name(self):
+        return getattr(self._create, "__name__", str(self._create))
+
+    def stats(self):
+        """
+        Return dict with the number of VMs, the number of VMs with a
+        pending operation, the maximal latency (from dispatching to
+        completion) of the last run, and the number of VMs skipped in the
+        last call by reason.
+        """
+        with self._lock:
+            return {
+                "vms": len(self._vms),
+                "pending": sum(1 for st in six.itervalues(self._vms)
+                               if st.pending),
+                "max_latency": max([st.latency
+                                    for st in six.itervalues(self._vms)
+                                    if st.latency is not None] or [0]),
+                "skipped": dict(self._skipped),
+            }
+
+    def _due(self, vms):
+        """
+        Return list of (vm_id, vm_obj, state) of VMs due in this call,
+        VMs waiting the longest first.
+        """
+        now = self._clock()
+        due = []
+        with self._lock:
+            self._update_vms(vms)
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self._slots
+
+            for vm_id, vm_obj in six.viewitems(vms):
+                state = self._vms[vm_id]
+                if state.last_dispatch is None:
+                    due.append((vm_id, vm_obj, state))
+                    continue
+                waiting = now - state.last_dispatch
+                if state.slot == slot:
+                    # Avoid running twice in the same period if the VM was
+                    # dispatched late in the previous period.
+                    if waiting >= self._period / 2:
+                        due.append((vm_id, vm_obj, state))
+                elif waiting >= self._period + self._period / self._slots:
+                    # Missed its slot.
+                    due.append((vm_id, vm_obj, state))
+
+        due.sort(key=lambda item: item[2].last_dispatch or -1)
+        return due
+
+    def _update_vms(self, vms):
+        # Must be called when holding the lock.
+        for vm_id in list(self._vms):
+            if vm_id not in vms:
+                state = self._vms.pop(vm_id)
+                self._slot_load[state.slot] -= 1
+
+        for vm_id in vms:
+            if vm_id not in self._vms:
+                slot = self._slot_load.index(min(self._slot_load))
+                self._vms[vm_id] = _VmState(slot)
+                self._slot_load[slot] += 1
+
+    def _dispatch(self, state, op):
+        with self._lock:
+            if state.pending:
+                # Dispatched by another call.
+                return True
+            state.pending = True
+            last_dispatch = state.last_dispatch
+            state.last_dispatch = self._clock()
+        dispatched = False
+        try:
+            self._executor.dispatch(_VmTask(self, state, op), self._timeout)
+            dispatched = True
+        except exception.ResourceExhausted:
+            return False
+        finally:
+            if not dispatched:
+                with self._lock:
+                    state.pending = False
+                    state.last_dispatch = last_dispatch
+        return True
+
+    def _done(self, state):
+        with self._lock:
+            state.pending = False
+            state.latency = self._clock() - state.last_dispatch
 
     def __repr__(self):
         return '<VmDispatcher operation=%s at 0x%x>' % (
@@ -295,6 +441,37 @@ class VmDispatcher(object):
         )
 
 
+class _VmState(object):
+
+    __slots__ = ("slot", "pending", "last_dispatch", "latency")
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.pending = False
+        self.last_dispatch = None
+        self.latency = None
+
+
+class _VmTask(object):
+    """
+    Run a per-VM operation, reporting completion to the dispatcher.
+    """
+
+    def __init__(self, dispatcher, state, op):
+        self._dispatcher = dispatcher
+        self._state = state
+        self._op = op
+
+    def __call__(self):
+        try:
+            self._op()
+        finally:
+            self._dispatcher._done(self._state)
+
+    def __repr__(self):
+        return repr(self._op)
+
+
 class _RunnableOnVm(object):
     def __init__(self, vm):
         self._vm = vm
@@ -393,10 +570,13 @@ def _kill_long_paused_vms(cif):
 
 
 def _create(cif, scheduler):
+    slots = config.getint('sampling', 'periodic_vm_slots')
+
     def per_vm_operation(func, period):
         disp = VmDispatcher(
-            cif.getVMs, _executor, func, _timeout_from(period))
-        return Operation(disp, period, scheduler)
+            cif.getVMs, _executor, func, _timeout_from(period),
+            period=period, slots=slots)
+        return Operation(disp, period / slots, scheduler)
 
     ops = [
         # Needs dispatching because updating the volume stats needs
@@ -433,18 +613,8 @@ def _create(cif, scheduler):
     ]
 
     if config.getboolean('sampling', 'enable'):
+        ops.extend(_bulk_stats_operations(cif, scheduler))
         ops.extend([
-            # libvirt sampling using bulk stats can block, but unresponsive
-            # domains are handled inside VMBulkstatsMonitor for performance
-            # reasons; thus, does not need dispatching.
-            Operation(
-                sampling.VMBulkstatsMonitor(
-                    libvirtconnection.get(cif),
-                    cif.getVMs,
-                    sampling.stats_cache),
-                config.getint('vars', 'vm_sample_interval'),
-                scheduler),
-
             Operation(
                 sampling.HostMonitor(cif=cif),
                 config.getint('vars', 'host_sample_stats_interval'),
@@ -455,3 +625,39 @@ def _create(cif, scheduler):
         ])
 
     return ops
+
+
+def _bulk_stats_operations(cif, scheduler):
+    # libvirt sampling using bulk stats can block, but unresponsive
+    # domains are handled inside VMBulkstatsMonitor for performance
+    # reasons; thus, does not need dispatching.
+    def monitor(stats_types, name, separate=False):
+        return sampling.VMBulkstatsMonitor(
+            libvirtconnection.get(cif),
+            cif.getVMs,
+            sampling.stats_cache,
+            stats_types=stats_types,
+            name=name,
+            separate=separate)
+
+    interval = config.getint('vars', 'vm_sample_interval')
+    devices_interval = config.getint('vars', 'vm_sample_devices_interval')
+
+    if devices_interval in (0, interval):
+        return [
+            Operation(
+                monitor(sampling.BULK_STATS_TYPES, "all"),
+                interval,
+                scheduler),
+        ]
+
+    return [
+        Operation(
+            monitor(sampling.BULK_STATS_MAIN, "main"),
+            interval,
+            scheduler),
+        Operation(
+            monitor(sampling.BULK_STATS_DEVICES, "devices", separate=True),
+            devices_interval,
+            scheduler),
+    ]
@@ -80,7 +80,35 @@ _MAX_WORKERS = config.getint('guest_agent', 'max_workers')
 
 _COMMAND_TIMEOUT = config.getint('guest_agent', 'qga_command_timeout')
 _TASK_TIMEOUT = config.getint('guest_agent', 'qga_task_timeout')
+# Initial and maximal time (in sec) to wait before polling unresponsive
+# QEMU-GA again. The interval is doubled on every consecutive failure.
 _THROTTLING_INTERVAL = 60
+_MAX_THROTTLING_INTERVAL = 16 * _THROTTLING_INTERVAL
+
+
+class AgentHealth(object):
+    """
+    Track the responsiveness of QEMU-GA in a single VM.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.last_failure = None
+        self.next_attempt = None
+
+    def failed(self, now):
+        self.failures += 1
+        self.last_failure = now
+        backoff = min(_THROTTLING_INTERVAL * 2 ** (self.failures - 1),
+                      _MAX_THROTTLING_INTERVAL)
+        self.next_attempt = now + backoff
+
+    def succeeded(self):
+        self.failures = 0
+        self.next_attempt = None
+
+    def available(self, now):
+        return self.next_attempt is None or now >= self.next_attempt
 
 
 class QemuGuestAgentPoller(object):
@@ -99,8 +127,14 @@ class QemuGuestAgentPoller(object):
         self._capabilities = {}
         self._guest_info_lock = threading.Lock()
         self._guest_info = defaultdict(dict)
-        self._last_failure_lock = threading.Lock()
-        self._last_failure = {}
+        self._health_lock = threading.Lock()
+        self._health = {}
+        self._schedule_lock = threading.Lock()
+        # vm_id -> {check class: last run timestamp}
+        self._last_run = defaultdict(dict)
+        # vm_id -> dispatch timestamp of the pending batch
+        self._pending = {}
+        self._checks = []
 
     def start(self):
         if not config.getboolean('guest_agent', 'enable_qga_poller'):
@@ -108,14 +142,35 @@ class QemuGuestAgentPoller(object):
                           ' configuration')
             return
 
-        def per_vm_operation(job, period):
-            disp = periodic.VmDispatcher(
-                self._cif.getVMs, self._executor,
-                lambda vm: job(vm, self),
-                _TASK_TIMEOUT)
-            return periodic.Operation(
-                disp, period, self._scheduler, timeout=_TASK_TIMEOUT,
-                executor=self._executor)
+        # The checks are run in this order, capabilities must be checked
+        # first since the other checks depend on them.
+        self._checks = [
+            # Monitor what QEMU-GA offers
+            (CapabilityCheck,
+             config.getint('guest_agent', 'qga_info_period')),
+
+            # Basic system information
+            (SystemInfoCheck,
+             config.getint('guest_agent', 'qga_sysinfo_period')),
+            (NetworkInterfacesCheck,
+             config.getint('guest_agent', 'qga_sysinfo_period')),
+
+            # List of active users
+            (ActiveUsersCheck,
+             config.getint('guest_agent', 'qga_active_users_period')),
+
+            # Filesystem info and disk mapping
+            (DiskInfoCheck,
+             config.getint('guest_agent', 'qga_disk_info_period')),
+        ]
+
+        # All the checks due for a VM are run by a single batch, so a VM with
+        # unresponsive QEMU-GA occupies at most one worker.
+        disp = periodic.VmDispatcher(
+            self._cif.getVMs, self._executor,
+            lambda vm: BatchCheck(vm, self),
+            _TASK_TIMEOUT)
+        period = min(period for _, period in self._checks)
 
         self._operations = [
 
@@ -124,28 +179,9 @@ class QemuGuestAgentPoller(object):
                 config.getint('guest_agent', 'cleanup_period'),
                 self._scheduler, executor=self._executor),
 
-            # Monitor what QEMU-GA offers
-            per_vm_operation(
-                CapabilityCheck,
-                config.getint('guest_agent', 'qga_info_period')),
-
-            # Basic system information
-            per_vm_operation(
-                SystemInfoCheck,
-                config.getint('guest_agent', 'qga_sysinfo_period')),
-            per_vm_operation(
-                NetworkInterfacesCheck,
-                config.getint('guest_agent', 'qga_sysinfo_period')),
-
-            # List of active users
-            per_vm_operation(
-                ActiveUsersCheck,
-                config.getint('guest_agent', 'qga_active_users_period')),
-
-            # Filesystem info and disk mapping
-            per_vm_operation(
-                DiskInfoCheck,
-                config.getint('guest_agent', 'qga_disk_info_period')),
+            periodic.Operation(
+                disp, period, self._scheduler, timeout=_TASK_TIMEOUT,
+                executor=self._executor),
         ]
 
         self.log.info("Starting QEMU-GA poller")
@@ -182,11 +218,79 @@ class QemuGuestAgentPoller(object):
             self._guest_info[vm_id].update(info)
 
     def last_failure(self, vm_id):
-        return self._last_failure.get(vm_id, None)
+        with self._health_lock:
+            health = self._health.get(vm_id)
+            return None if health is None else health.last_failure
 
     def set_failure(self, vm_id):
-        with self._last_failure_lock:
-            self._last_failure[vm_id] = monotonic_time()
+        with self._health_lock:
+            health = self._health.setdefault(vm_id, AgentHealth())
+            health.failed(monotonic_time())
+            self.log.debug(
+                'QEMU-GA in vm_id=%s failed %d times, next attempt in %d'
+                ' seconds', vm_id, health.failures,
+                health.next_attempt - health.last_failure)
+
+    def set_success(self, vm_id):
+        with self._health_lock:
+            health = self._health.get(vm_id)
+            if health is not None and health.failures:
+                self.log.debug('QEMU-GA in vm_id=%s is responsive again',
+                               vm_id)
+                health.succeeded()
+
+    def failures(self, vm_id):
+        with self._health_lock:
+            health = self._health.get(vm_id)
+            return 0 if health is None else health.failures
+
+    def agent_available(self, vm_id):
+        """
+        Return False if QEMU-GA in the VM failed recently and we are still
+        backing off.
+        """
+        with self._health_lock:
+            health = self._health.get(vm_id)
+            return health is None or health.available(monotonic_time())
+
+    def due_checks(self, vm_id):
+        """
+        Return the list of checks due for vm_id. Returns an empty list if
+        nothing is due or the previous batch is still pending.
+        """
+        with self._schedule_lock:
+            return self._due_checks(vm_id, monotonic_time())
+
+    def start_batch(self, vm_id):
+        """
+        Like due_checks(), but also mark the VM as having a pending batch if
+        any check is due.
+        """
+        now = monotonic_time()
+        with self._schedule_lock:
+            due = self._due_checks(vm_id, now)
+            if due:
+                self._pending[vm_id] = now
+            return due
+
+    def _due_checks(self, vm_id, now):
+        # Must be called with _schedule_lock held.
+        pending = self._pending.get(vm_id)
+        # The batch may have been discarded by the executor, give up
+        # waiting for it after a while.
+        if pending is not None and now - pending < _TASK_TIMEOUT:
+            return []
+        last_run = self._last_run[vm_id]
+        return [check for check, period in self._checks
+                if now - last_run.get(check, -period) >= period]
+
+    def check_done(self, vm_id, check):
+        with self._schedule_lock:
+            self._last_run[vm_id][check] = monotonic_time()
+
+    def end_batch(self, vm_id):
+        with self._schedule_lock:
+            self._pending.pop(vm_id, None)
 
     def call_qga_command(self, vm, command, args=None):
         """
@@ -219,6 +323,7 @@ class QemuGuestAgentPoller(object):
             # Most likely the QEMU-GA is not installed or is unresponsive
             self.set_failure(vm.id)
             return None
+        self.set_success(vm.id)
 
         try:
             parsed = json.loads(ret)
@@ -280,10 +385,16 @@ class QemuGuestAgentPoller(object):
                 if vm_id not in vm_container:
                     del self._guest_info[vm_id]
                     removed.add(vm_id)
-        with self._last_failure_lock:
-            for vm_id in copy.copy(self._last_failure):
+        with self._health_lock:
+            for vm_id in copy.copy(self._health):
                 if vm_id not in vm_container:
-                    del self._last_failure[vm_id]
+                    del self._health[vm_id]
+                    removed.add(vm_id)
+        with self._schedule_lock:
+            for vm_id in copy.copy(self._last_run):
+                if vm_id not in vm_container:
+                    del self._last_run[vm_id]
+                    self._pending.pop(vm_id, None)
                     removed.add(vm_id)
         self.log.debug('Cleaned up old data for VMs: %s', removed)
 
@@ -297,11 +408,51 @@ class _RunnableOnVmGuestAgent(periodic._RunnableOnVm):
     def runnable(self):
         if not self._vm.isDomainReadyForCommands():
             return False
-        last_failure = self._qga_poller.last_failure(self._vm.id)
-        if last_failure is not None and \
-                (monotonic_time() - last_failure) < _THROTTLING_INTERVAL:
+        return self._qga_poller.agent_available(self._vm.id)
+
+
+class BatchCheck(_RunnableOnVmGuestAgent):
+    """
+    Run all the checks due for a VM in a single work item. When QEMU-GA
+    fails, the rest of the checks are skipped and they will run in the
+    next batch, after the poller backed off.
+    """
+    def __init__(self, vm, qga_poller):
+        super(BatchCheck, self).__init__(vm, qga_poller)
+        self._checks = []
+
+    @property
+    def runnable(self):
+        if not super(BatchCheck, self).runnable:
             return False
-        return True
+        return bool(self._qga_poller.due_checks(self._vm.id))
+
+    def __call__(self):
+        self._checks = self._qga_poller.start_batch(self._vm.id)
+        if not self._checks:
+            # Another batch got here first, or nothing is due any more.
+            return
+        try:
+            super(BatchCheck, self).__call__()
+        finally:
+            self._qga_poller.end_batch(self._vm.id)
+
+    def _execute(self):
+        failures = self._qga_poller.failures(self._vm.id)
+        for check in self._checks:
+            check(self._vm, self._qga_poller)._execute()
+            if self._qga_poller.failures(self._vm.id) > failures:
+                self._qga_poller.log.debug(
+                    'QEMU-GA in vm_id=%s failed, skipping remaining'
+                    ' checks', self._vm.id)
+                break
+            self._qga_poller.check_done(self._vm.id, check)
+
+    def __repr__(self):
+        return '<%s vm=%s checks=%s at 0x%x>' % (
+            self.__class__.__name__, self._vm.id,
+            [c.__name__ for c in self._checks], id(self)
+        )
 
 
 class ActiveUsersCheck(_RunnableOnVmGuestAgent):
@@ -22,11 +22,15 @@ from __future__ import absolute_import
 from __future__ import division
 
 import logging
+import threading
 
 import libvirt
 
+from vdsm.common import concurrent
 from vdsm.common import libvirtconnection
 from vdsm.common import response
+from vdsm.common.time import monotonic_time
+from vdsm.config import config
 from vdsm.virt import vmchannels
 from vdsm.virt import vmstatus
 from vdsm.virt import vmxml
@@ -60,24 +64,39 @@ def _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
     return False
 
 
-def _list_domains():
+def _domain_info(dom_obj):
+    """
+    Return (dom_obj, dom_xml, external) tuple for domain that should be
+    recovered, or None.
+    """
+    dom_uuid = 'unknown'
+    try:
+        dom_uuid = dom_obj.UUIDString()
+        logging.debug("Found domain %s", dom_uuid)
+        dom_xml = dom_obj.XMLDesc(0)
+    except libvirt.libvirtError as e:
+        if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+            logging.exception("domain %s is dead", dom_uuid)
+            return None
+        raise
+    if _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
+        return None
+    return dom_obj, dom_xml, _is_external_vm(dom_xml)
+
+
+def _list_domains(workers=1):
     conn = libvirtconnection.get()
     domains = []
-    for dom_obj in conn.listAllDomains():
-        dom_uuid = 'unknown'
-        try:
-            dom_uuid = dom_obj.UUIDString()
-            logging.debug("Found domain %s", dom_uuid)
-            dom_xml = dom_obj.XMLDesc(0)
-        except libvirt.libvirtError as e:
-            if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
-                logging.exception("domain %s is dead", dom_uuid)
-            else:
-                raise
-        else:
-            if _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
-                continue
-            domains.append((dom_obj, dom_xml, _is_external_vm(dom_xml),))
+    # Getting the domain XML is a libvirt call per domain, fetch the domains
+    # concurrently.
+    results = concurrent.tmap(
+        _domain_info, conn.listAllDomains(), max_workers=workers,
+        name="recovery")
+    for res in results:
+        if not res.succeeded:
+            raise res.value
+        if res.value is not None:
+            domains.append(res.value)
     return domains
 
 
@@ -112,27 +131,89 @@ def _recovery_params(vm_id, dom_xml, external):
     return params
 
 
-def all_domains(cif):
-    doms = _list_domains()
-    num_doms = len(doms)
-    for idx, (dom_obj, dom_xml, external) in enumerate(doms):
+class _Progress(object):
+    """
+    Track progress of concurrent domains recovery.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self._lock = threading.Lock()
+        self._done = 0
+        self._slowest = (None, 0)
+
+    def done(self, vm_id, elapsed):
+        """
+        Record recovery of vm_id, returning the number of domains handled.
+        """
+        with self._lock:
+            self._done += 1
+            if elapsed > self._slowest[1]:
+                self._slowest = (vm_id, elapsed)
+            return self._done
+
+    @property
+    def slowest(self):
+        with self._lock:
+            return self._slowest
+
+
+def all_domains(cif, workers=None):
+    """
+    Recover all the domains running on this host.
+
+    Domains are listed and recovered concurrently by up to workers threads
+    (vars:recovery_workers by default). Preparing the storage of the
+    recovered VMs is done later, serially, after connecting to the storage
+    pool.
+    """
+    if workers is None:
+        workers = config.getint('vars', 'recovery_workers')
+
+    start = monotonic_time()
+    doms = _list_domains(workers)
+    list_time = monotonic_time() - start
+    cif.log.info('recovery: found %d domains in %.2f seconds',
+                 len(doms), list_time)
+
+    progress = _Progress(len(doms))
+
+    def recover(dom):
+        dom_obj, dom_xml, external = dom
         vm_id = dom_obj.UUIDString()
-        if _recover_domain(cif, vm_id, dom_xml, external):
+        dom_start = monotonic_time()
+        recovered = _recover_domain(cif, vm_id, dom_xml, external)
+        elapsed = monotonic_time() - dom_start
+        idx = progress.done(vm_id, elapsed)
+        if recovered:
             cif.log.info(
-                'recovery [1:%d/%d]: recovered domain %s',
-                idx + 1, num_doms, vm_id)
+                'recovery [1:%d/%d]: recovered domain %s in %.2f seconds',
+                idx, progress.total, vm_id, elapsed)
         elif external:
             cif.log.info("Failed to recover external domain: %s" % (vm_id,))
         else:
             cif.log.info(
                 'recovery [1:%d/%d]: loose domain %s found, killing it.',
-                idx + 1, num_doms, vm_id)
+                idx, progress.total, vm_id)
             try:
                 dom_obj.destroy()
             except libvirt.libvirtError:
                 cif.log.exception(
                     'recovery [1:%d/%d]: failed to kill loose domain %s',
-                    idx + 1, num_doms, vm_id)
+                    idx, progress.total, vm_id)
+
+    for res in concurrent.tmap(recover, doms, max_workers=workers,
+                               name="recovery"):
+        if not res.succeeded:
+            cif.log.error("recovery: unexpected error: %s", res.value)
+
+    if doms:
+        slowest_id, slowest_time = progress.slowest
+        cif.log.info(
+            'recovery: recovered %d domains in %.2f seconds (listing: %.2f'
+            ' seconds, slowest domain: %s in %.2f seconds)',
+            len(doms), monotonic_time() - start, list_time, slowest_id,
+            slowest_time)
 
 
 def lookup_external_vms(cif):
@@ -32,7 +32,6 @@ Support for VM and host statistics sampling.
 from collections import defaultdict, deque, namedtuple
 import logging
 import os
-import re
 import threading
 import time
 
@@ -40,10 +39,14 @@ from vdsm import hugepages
 from vdsm import numa
 from vdsm import utils
 import vdsm.common.time
+from vdsm.common import concurrent
+from vdsm.common import supervdsm
 from vdsm.common.units import KiB, MiB
 from vdsm.config import config
 from vdsm.constants import P_VDSM_RUN
 from vdsm.host import api as hostapi
+from vdsm.storage import volumemetadata
+from vdsm.virt import bulkstats
 from vdsm.virt.utils import ExpiringCache
 
 
@@ -54,16 +57,33 @@ _METRICS_ENABLED = config.getboolean('metrics', 'enabled')
 _NOWAIT_ENABLED = config.getboolean('vars', 'nowait_domain_stats')
 
 
+def _read_cpu_stat():
+    """
+    Return the cpu lines of /proc/stat, starting with the total line.
+
+    The cpu lines are the first lines in /proc/stat; the rest of the file
+    (e.g. the huge intr line on big hosts) is not read.
+    """
+    lines = []
+    with open('/proc/stat') as f:
+        for line in f:
+            if not line.startswith('cpu'):
+                break
+            lines.append(line)
+    return lines
+
+
 class TotalCpuSample(object):
     """
     A sample of total CPU consumption.
 
     The sample is taken at initialization time and can't be updated.
     """
-    def __init__(self):
-        with open('/proc/stat') as f:
-            self.user, userNice, self.sys, self.idle = \
-                map(int, f.readline().split()[1:5])
+    def __init__(self, line=None):
+        if line is None:
+            line = _read_cpu_stat()[0]
+        self.user, userNice, self.sys, self.idle = \
+            map(int, line.split(None, 5)[1:5])
         self.user += userNice
 
 
@@ -73,26 +93,41 @@ class CpuCoreSample(object):
 
     The sample is taken at initialization time and can't be updated.
     """
-    CPU_CORE_STATS_PATTERN = re.compile(r'cpu(\d+)\s+(.*)')
 
-    def __init__(self):
-        self.coresSample = {}
-        with open('/proc/stat') as src:
-            for line in src:
-                match = self.CPU_CORE_STATS_PATTERN.match(line)
-                if match:
-                    coreSample = {}
-                    user, userNice, sys, idle = \
-                        map(int, match.group(2).split()[0:4])
-                    coreSample['user'] = user
-                    coreSample['userNice'] = userNice
-                    coreSample['sys'] = sys
-                    coreSample['idle'] = idle
-                    self.coresSample[match.group(1)] = coreSample
+    def __init__(self, lines=None, size=0):
+        """
+        Initialize a CpuCoreSample.
+
+        :param lines: per core lines from /proc/stat, read from /proc/stat
+            if not specified.
+        :param size: expected number of cores, used to preallocate the
+            samples.
+        """
+        if lines is None:
+            lines = _read_cpu_stat()[1:]
+        # (user, userNice, sys, idle) indexed by core id. Offline cores are
+        # not reported in /proc/stat, so some items may be None.
+        self._samples = [None] * size
+        self.online = []
+        for line in lines:
+            name, user, userNice, sys, idle = line.split(None, 5)[:5]
+            core = int(name[3:])
+            if core >= len(self._samples):
+                self._samples.extend([None] * (core + 1 - len(self._samples)))
+            self._samples[core] = (int(user), int(userNice), int(sys),
+                                   int(idle))
+            self.online.append(core)
+
+    @property
+    def coresSample(self):
+        return {str(core): self.getCoreSample(core) for core in self.online}
 
     def getCoreSample(self, coreId):
-        strCoreId = str(coreId)
-        return self.coresSample.get(strCoreId)
+        try:
+            user, userNice, sys, idle = self._samples[int(coreId)]
+        except (ValueError, IndexError, TypeError):
+            return None
+        return {'user': user, 'userNice': userNice, 'sys': sys, 'idle': idle}
 
 
 class NumaNodeMemorySample(object):
@@ -104,14 +139,13 @@ class NumaNodeMemorySample(object):
     def __init__(self):
         self.nodesMemSample = {}
         numaTopology = numa.topology()
-        for nodeIndex in numaTopology:
+        # work around libvirt bug (if not built with numactl)
+        if len(numaTopology) == 1:
+            cells = [(nodeIndex, -1) for nodeIndex in numaTopology]
+        else:
+            cells = [(nodeIndex, int(nodeIndex)) for nodeIndex in numaTopology]
+        for nodeIndex, memInfo in self._memory_by_cells(cells):
             nodeMemSample = {}
-            # work around libvirt bug (if not built with numactl)
-            if len(numaTopology) == 1:
-                idx = -1
-            else:
-                idx = int(nodeIndex)
-            memInfo = numa.memory_by_cell(idx)
             nodeMemSample['memFree'] = memInfo['free']
             # in case the numa node has zero memory assigned, report the whole
             # memory as used
@@ -121,6 +155,52 @@ class NumaNodeMemorySample(object):
                     int(100.0 * int(memInfo['free']) // int(memInfo['total']))
             self.nodesMemSample[nodeIndex] = nodeMemSample
 
+    def _memory_by_cells(self, cells):
+        if len(cells) == 1:
+            nodeIndex, idx = cells[0]
+            return [(nodeIndex, numa.memory_by_cell(idx))]
+
+        # Every cell is a libvirt call; on big hosts reading the cells one
+        # by one takes most of the sampling time.
+        def read(cell):
+            nodeIndex, idx = cell
+            return nodeIndex, numa.memory_by_cell(idx)
+
+        results = []
+        for res in concurrent.tmap(read, cells, name="numa/meminfo"):
+            if not res.succeeded:
+                raise res.value
+            results.append(res.value)
+        return results
+
+
+class _HostFacts(object):
+    """
+    Host facts that change only when CPUs are added or removed.
+
+    Online CPUs are detected from /proc/stat on every sample. When they
+    change, the cached host topology is dropped.
+    """
+
+    _log = logging.getLogger("virt.sampling.HostFacts")
+
+    def __init__(self):
+        self.online = None
+        self.size = 0
+
+    def update(self, online):
+        if online == self.online:
+            return
+        if self.online is not None:
+            self._log.info("Online CPUs changed from %s to %s, updating "
+                           "host topology", self.online, online)
+            numa.invalidate()
+        self.online = online
+        self.size = online[-1] + 1 if online else 0
+
+
+_host_facts = _HostFacts()
+
 
 class PidCpuSample(object):
     """
@@ -163,8 +243,11 @@ class HostSample(object):
         """
         self.timestamp = time.time()
         self.pidcpu = PidCpuSample(pid)
-        self.ncpus = os.sysconf('SC_NPROCESSORS_ONLN')
-        self.totcpu = TotalCpuSample()
+        cpu_stat = _read_cpu_stat()
+        self.totcpu = TotalCpuSample(cpu_stat[0])
+        self.cpuCores = CpuCoreSample(cpu_stat[1:], _host_facts.size)
+        _host_facts.update(self.cpuCores.online)
+        self.ncpus = len(self.cpuCores.online)
         meminfo = utils.readMemInfo()
         freeOrCached = (meminfo['MemFree'] +
                         meminfo['Cached'] + meminfo['Buffers'])
@@ -183,7 +266,6 @@ class HostSample(object):
         except:
             self.thpState = 'never'
         self.hugepages = hugepages.state()
-        self.cpuCores = CpuCoreSample()
         self.numaNodeMem = NumaNodeMemorySample()
 
 
@@ -240,6 +322,15 @@ _StatsSample = namedtuple('StatsSample',
 
 
 class StatsSample(_StatsSample):
+
+    def __new__(cls, first_value, last_value, interval, stats_age,
+                intervals=None):
+        self = _StatsSample.__new__(
+            cls, first_value, last_value, interval, stats_age)
+        # Intervals of stats sampled separately, see StatsCache.
+        self.intervals = intervals or {}
+        return self
+
     def is_empty(self):
         return (
             self.first_value is None and
@@ -273,6 +364,12 @@ class StatsCache(object):
     to take the sample timestamp BEFORE to start the possibly-blocking call.
     If we take the timestamp after the call, we have no means to distinguish
     between a well behaving call and an unblocked stuck call.
+
+    Some stats may be sampled separately, at a different interval, by
+    putting them with the stats_types they were sampled with. The last
+    samples of every group are merged into the samples of the main group,
+    and the interval of every group is reported in StatsSample.intervals,
+    mapping stats_types to interval.
     """
 
     _log = logging.getLogger("virt.sampling.StatsCache")
@@ -283,6 +380,10 @@ class StatsCache(object):
         self._samples = SampleWindow(size=2, timefn=self._clock)
         self._last_sample_time = 0
         self._vm_last_timestamp = defaultdict(int)
+        # stats_types -> SampleWindow, for stats sampled separately.
+        self._groups = {}
+        # stats_types -> last sample time
+        self._groups_sample_time = defaultdict(int)
 
     def add(self, vmid):
         """
@@ -317,8 +418,12 @@ class StatsCache(object):
             if first_sample is None or last_sample is None:
                 return StatsSample(None, None, None, stats_age)
 
-            return StatsSample(first_sample, last_sample,
-                               interval, stats_age)
+            if not self._groups:
+                return StatsSample(first_sample, last_sample,
+                                   interval, stats_age)
+
+            return self._merge(vmid, first_sample, last_sample, interval,
+                               stats_age, self._group_stats())
 
     def get_batch(self):
         """
@@ -331,13 +436,25 @@ class StatsCache(object):
                 return None
 
             ts = self._clock()
+            vm_ids = [vm_id for vm_id in last_batch
+                      if (vm_id in first_batch and
+                          vm_id in self._vm_last_timestamp)]
+
+            if not self._groups:
+                return {
+                    vm_id: StatsSample(
+                        first_batch[vm_id], last_batch[vm_id], interval,
+                        ts - self._vm_last_timestamp[vm_id]
+                    )
+                    for vm_id in vm_ids
+                }
+
+            group_stats = self._group_stats()
             return {
-                vm_id: StatsSample(
-                    first_batch[vm_id], last_batch[vm_id], interval,
-                    ts - self._vm_last_timestamp[vm_id]
-                )
-                for vm_id in last_batch if (vm_id in first_batch and
-                                            vm_id in self._vm_last_timestamp)
+                vm_id: self._merge(
+                    vm_id, first_batch[vm_id], last_batch[vm_id], interval,
+                    ts - self._vm_last_timestamp[vm_id], group_stats)
+                for vm_id in vm_ids
             }
 
     def clock(self):
@@ -346,20 +463,34 @@ class StatsCache(object):
         """
         return self._clock()
 
-    def put(self, bulk_stats, monotonic_ts):
+    def put(self, bulk_stats, monotonic_ts, stats_types=None):
         """
         Add a new bulk sample to the collection.
         `monotonic_ts' is the sample time which must be associated with
         the sample.
+        `stats_types' are the libvirt stats types of stats sampled
+        separately from the main bulk sample, or None for the main bulk
+        sample.
         Discard silently out of order samples, which are assumed to be
         returned by unblocked stuck calls, to avoid overwrite fresh data
         with stale one.
         """
         with self._lock:
-            last_sample_time = self._last_sample_time
+            if stats_types is None:
+                last_sample_time = self._last_sample_time
+            else:
+                last_sample_time = self._groups_sample_time[stats_types]
+
             if monotonic_ts >= last_sample_time:
-                self._samples.append(bulk_stats)
-                self._last_sample_time = monotonic_ts
+                if stats_types is None:
+                    self._samples.append(bulk_stats)
+                    self._last_sample_time = monotonic_ts
+                else:
+                    if stats_types not in self._groups:
+                        self._groups[stats_types] = SampleWindow(
+                            size=2, timefn=self._clock)
+                    self._groups[stats_types].append(bulk_stats)
+                    self._groups_sample_time[stats_types] = monotonic_ts
 
                 self._update_ts(bulk_stats, monotonic_ts)
             else:
@@ -372,6 +503,29 @@ class StatsCache(object):
         for vmid in bulk_stats:
             self._vm_last_timestamp[vmid] = monotonic_ts
 
+    def _group_stats(self):
+        return [(stats_types,) + window.stats()
+                for stats_types, window in six.iteritems(self._groups)]
+
+    def _merge(self, vmid, first_sample, last_sample, interval, stats_age,
+               group_stats):
+        first_value = dict(first_sample)
+        last_value = dict(last_sample)
+        intervals = {}
+        for stats_types, first_batch, last_batch, group_interval in \
+                group_stats:
+            if first_batch is None:
+                continue
+            group_first = first_batch.get(vmid)
+            group_last = last_batch.get(vmid)
+            if group_first is None or group_last is None:
+                continue
+            first_value.update(group_first)
+            last_value.update(group_last)
+            intervals[stats_types] = group_interval
+        return StatsSample(first_value, last_value, interval, stats_age,
+                           intervals)
+
 
 stats_cache = StatsCache()
 
@@ -386,23 +540,41 @@ stats_cache = StatsCache()
 _TTL = 40.0
 
 
-BULK_STATS_TYPES = (
+# Stats cheap to collect.
+BULK_STATS_MAIN = (
     libvirt.VIR_DOMAIN_STATS_STATE |
     libvirt.VIR_DOMAIN_STATS_CPU_TOTAL |
     libvirt.VIR_DOMAIN_STATS_BALLOON |
-    libvirt.VIR_DOMAIN_STATS_VCPU |
+    libvirt.VIR_DOMAIN_STATS_VCPU
+)
+
+# Stats of VM devices, expensive to collect on VMs with many disks, since
+# block stats include the backing chain of every disk.
+BULK_STATS_DEVICES = (
     libvirt.VIR_DOMAIN_STATS_INTERFACE |
     libvirt.VIR_DOMAIN_STATS_BLOCK
 )
 
+BULK_STATS_TYPES = BULK_STATS_MAIN | BULK_STATS_DEVICES
+
 
 class VMBulkstatsMonitor(object):
     def __init__(self, conn, get_vms, stats_cache,
-                 stats_types=BULK_STATS_TYPES, ttl=_TTL):
+                 stats_types=BULK_STATS_TYPES, ttl=_TTL, name="all",
+                 separate=False):
+        """
+        name        Name of the sampled stats group, used for logging and
+                    metrics.
+        separate    If True, stats_types are sampled separately from the
+                    main bulk sample, at a different interval, and merged
+                    with the main bulk sample by stats_cache.
+        """
         self._conn = conn
         self._get_vms = get_vms
         self._stats_cache = stats_cache
         self._stats_types = stats_types
+        self._name = name
+        self._separate = separate
         self._skip_doms = ExpiringCache(ttl)
         self._sampling = threading.Semaphore()  # used as glorified counter
         self._log = logging.getLogger("virt.sampling.VMBulkstatsMonitor")
@@ -434,18 +606,26 @@ class VMBulkstatsMonitor(object):
                 else:
                     bulk_stats = []
         except Exception:
-            self._log.exception("vm sampling failed")
+            self._log.exception("vm sampling failed (group %s)", self._name)
             log_status = False
         else:
-            self._stats_cache.put(_translate(bulk_stats), timestamp)
+            if self._separate:
+                self._stats_cache.put(
+                    _translate(bulk_stats), timestamp, self._stats_types)
+            else:
+                self._stats_cache.put(_translate(bulk_stats), timestamp)
         finally:
             if acquired:
                 self._sampling.release()
         if log_status:
+            elapsed = self._stats_cache.clock() - timestamp
             self._log.debug(
-                'sampled timestamp %r elapsed %.3f acquired %r domains %s',
-                timestamp, self._stats_cache.clock() - timestamp, acquired,
+                'sampled group %s timestamp %r elapsed %.3f acquired %r '
+                'domains %s',
+                self._name, timestamp, elapsed, acquired,
                 'all' if fast_path else len(doms))
+            if _METRICS_ENABLED:
+                hostapi.send_vm_sampling_metrics(self._name, elapsed)
 
     def _get_responsive_doms(self):
         vms = self._get_vms()
@@ -478,14 +658,21 @@ class HostMonitor(object):
         self._cif = cif
 
     def __call__(self):
+        start = vdsm.common.time.monotonic_time()
         sample = HostSample(self._pid)
+        elapsed = vdsm.common.time.monotonic_time() - start
         self._samples.append(sample)
 
         if self._cif and _METRICS_ENABLED:
+            hostapi.send_sampling_metrics(elapsed)
             stats = hostapi.get_stats(self._cif, self._samples.stats())
             hostapi.send_metrics(stats)
+            hostapi.send_vmchannels_metrics(
+                self._cif.channelListener.stats())
+            hostapi.send_supervdsm_metrics(supervdsm.getProxy().stats())
+            hostapi.send_volume_metadata_metrics(volumemetadata.reads())
 
 
 def _translate(bulk_stats):
-    return dict((dom.UUIDString(), stats)
+    return dict((dom.UUIDString(), bulkstats.pack(stats))
                 for dom, stats in bulk_stats)
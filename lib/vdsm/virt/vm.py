@@ -457,6 +457,13 @@ class Vm(object):
         self._ioTuneInfo = []
         self._ioTuneValues = {}
         self._vmJobs = None
+        # Block jobs changed since the last update, modified only when
+        # holding self._jobsLock.
+        self._blockJobsChanged = set()
+        # jobID -> (libvirt job info, pivot ready), updated only for changed
+        # jobs, or when reconciling all jobs.
+        self._blockJobsInfo = {}
+        self._blockJobsReconciled = 0
         self._clientIp = ''
         self._clientPort = ''
         self._monitorable = False
@@ -1736,7 +1743,8 @@ class Vm(object):
             decStats = vmstats.produce(self,
                                        vm_sample.first_value,
                                        vm_sample.last_value,
-                                       vm_sample.interval)
+                                       vm_sample.interval,
+                                       vm_sample.intervals)
             if monitorable:
                 self._setUnresponsiveIfTimeout(stats, vm_sample.stats_age)
         except Exception:
@@ -5044,6 +5052,7 @@ class Vm(object):
         self._updateDomainDescriptor()
 
     def untrackBlockJob(self, jobID):
+        self._blockJobsInfo.pop(jobID, None)
         with self._confLock:
             try:
                 del self._blockJobs[jobID]
@@ -5110,21 +5119,46 @@ class Vm(object):
     @property
     def hasVmJobs(self):
         """
-        Return True if there are VM jobs to monitor
+        Return True if there are VM jobs to monitor.
+
+        Block jobs are updated when libvirt reports a block job event, and
+        while a job is being cleaned up. All jobs are reconciled every
+        vm_jobs_reconcile_interval seconds in case an event was missed.
         """
         with self._jobsLock:
             # we always do a full check the first time we run.
             # This may be wasteful on normal flow,
             # but covers pretty nicely the recovering flow.
-            return self._vmJobs is None or bool(self._blockJobs)
+            if self._vmJobs is None or self._blockJobsChanged:
+                return True
+            return bool(self._blockJobs) and self._reconcileBlockJobsNeeded()
 
     def updateVmJobs(self):
+        now = vdsm.common.time.monotonic_time()
+        with self._jobsLock:
+            reconcile = (self._vmJobs is None or
+                         self._reconcileBlockJobsNeeded(now))
         try:
-            self._vmJobs = self.queryBlockJobs()
+            self._vmJobs = self.queryBlockJobs(reconcile=reconcile)
         except Exception:
             self.log.exception("Error updating VM jobs")
+        else:
+            if reconcile:
+                self._blockJobsReconciled = now
+
+    def _reconcileBlockJobsNeeded(self, now=None):
+        if now is None:
+            now = vdsm.common.time.monotonic_time()
+        interval = config.getint('vars', 'vm_jobs_reconcile_interval')
+        return now - self._blockJobsReconciled >= interval
 
-    def queryBlockJobs(self):
+    def queryBlockJobs(self, reconcile=True):
+        """
+        Return a dict mapping tracked block job ID to job info.
+
+        If reconcile is False, query libvirt only for jobs changed since the
+        last query, and report the last known info for other jobs.
+        """
         def startCleanup(job, drive, needPivot):
             t = LiveMergeCleanupThread(self, job, drive, needPivot)
             t.start()
@@ -5135,6 +5169,8 @@ class Vm(object):
         # another call to merge() where the job has been recorded but not yet
         # started.
         with self._jobsLock:
+            changed = self._blockJobsChanged
+            self._blockJobsChanged = set()
             for storedJob in list(self._blockJobs.values()):
                 jobID = storedJob['jobID']
                 self.log.debug("Checking job %s", jobID)
@@ -5179,27 +5215,37 @@ class Vm(object):
                          'drive': storedJob['drive']}
 
                 liveInfo = None
+                doPivot = False
                 if 'gone' not in storedJob:
-                    try:
-                        liveInfo = self._dom.blockJobInfo(drive.name, 0)
-                    except libvirt.libvirtError:
-                        self.log.exception("Error getting block job info")
-                        jobsRet[jobID] = entry
-                        continue
+                    cached = self._blockJobsInfo.get(jobID)
+                    if reconcile or jobID in changed or cached is None:
+                        try:
+                            liveInfo = self._dom.blockJobInfo(drive.name, 0)
+                        except libvirt.libvirtError:
+                            self.log.exception("Error getting block job info")
+                            # Try again on the next update.
+                            self._blockJobsChanged.add(jobID)
+                            jobsRet[jobID] = entry
+                            continue
+                        if liveInfo:
+                            self.log.debug("Job %s live info: %s",
+                                           jobID, liveInfo)
+                            doPivot = self._activeLayerCommitReady(
+                                liveInfo, drive)
+                        self._blockJobsInfo[jobID] = (liveInfo, doPivot)
+                    else:
+                        liveInfo, doPivot = cached
 
                 if liveInfo:
-                    self.log.debug("Job %s live info: %s", jobID, liveInfo)
                     entry['bandwidth'] = liveInfo['bandwidth']
                     entry['cur'] = str(liveInfo['cur'])
                     entry['end'] = str(liveInfo['end'])
-                    doPivot = self._activeLayerCommitReady(liveInfo, drive)
                 else:
                     # Libvirt has stopped reporting this job so we know it will
                     # never report it again.
                     if 'gone' not in storedJob:
                         self.log.info("Libvirt job %s was terminated", jobID)
                     storedJob['gone'] = True
-                    doPivot = False
                 if not liveInfo or doPivot:
                     if not cleanThread:
                         # There is no cleanup thread so the job must have just
@@ -5211,6 +5257,9 @@ class Vm(object):
                         # Let previously started cleanup thread continue
                         self.log.debug("Still waiting for block job %s to be "
                                        "synchronized", jobID)
+                        # The cleanup thread does not report when it is
+                        # done, check it again on the next update.
+                        self._blockJobsChanged.add(jobID)
                     elif not cleanThread.isSuccessful():
                         # At this point we know the thread is not alive and the
                         # cleanup failed.  Retry it with a new thread.
@@ -5224,8 +5273,9 @@ class Vm(object):
         """
         Implement virConnectDomainEventBlockJobCallback.
 
-        Currently we only log the event; we may want to use this to optimize
-        waiting for completion.
+        The event does not include the job progress; the job is marked as
+        changed, and the next BlockjobMonitor cycle queries libvirt for the
+        job info and starts the cleanup if the job has ended.
 
         For more info see:
         https://libvirt.org/html/libvirt-libvirt-domain.html#virConnectDomainEventBlockJobCallback
@@ -5240,6 +5290,8 @@ class Vm(object):
                 for job in self._blockJobs.values():
                     if job['drive'] == drive:
                         job_id = job['jobID']
+                        # Update the job on the next BlockjobMonitor cycle.
+                        self._blockJobsChanged.add(job_id)
 
         type_name = blockjob.type_name(job_type)
 
@@ -5347,6 +5399,7 @@ class Vm(object):
             except BlockJobExistsError:
                 self.log.error("A block job is already active on this disk")
                 return response.error('mergeErr')
+            self._blockJobsChanged.add(jobUUID)
 
             orig_chain = [entry.uuid for entry in chains[drive['alias']]]
             chain_str = volume_chain_to_str(orig_chain)
@@ -25,9 +25,11 @@ import errno
 import threading
 import time
 import select
+import zlib
 
 from vdsm.common import concurrent
 from vdsm.common.osutils import uninterruptible_poll
+from vdsm.common.time import monotonic_time
 
 # How many times a reconnect should be performed before a cooldown will be
 # applied
@@ -40,13 +42,20 @@ GUESTFS_DEVICE_NAME = 'org.libguestfs.channel.0'
 QEMU_GA_DEVICE_NAME = 'org.qemu.guest_agent.0'
 AGENT_DEVICE_NAMES = (LEGACY_DEVICE_NAME, QEMU_GA_DEVICE_NAME)
 
+# Maximum difference in the number of channels between the most loaded and
+# the least loaded shard. When exceeded, channels are placed on or moved to
+# the least loaded shard.
+MAX_SHARD_IMBALANCE = 2
 
-class Listener(object):
+
+class _Shard(object):
     """
-    An events driven listener which handle messages from virtual machines.
+    A single epoll thread serving a subset of the listener's channels.
     """
-    def __init__(self, log):
+    def __init__(self, listener, index, log):
+        self.index = index
         self.log = log
+        self._listener = listener
         self._quit = False
         self._epoll = select.epoll()
         self._channels = {}
@@ -54,9 +63,13 @@ class Listener(object):
         self._update_lock = threading.Lock()
         self._add_channels = {}
         self._del_channels = []
+        self._move_targets = []
         self._timeout = None
+        self._events = 0
+        self._callbacks_time = 0.0
+        self._max_callback_time = 0.0
         self._thread = concurrent.thread(
-            self.run, name='vmchannels'
+            self.run, name='vmchannels/%d' % index
         )
 
     def start(self):
@@ -72,6 +85,13 @@ class Listener(object):
             self.log.debug("Failed to unregister FD from epoll (ENOENT): %d",
                            fileno)
 
+    def _account(self, started):
+        elapsed = monotonic_time() - started
+        self._events += 1
+        self._callbacks_time += elapsed
+        if elapsed > self._max_callback_time:
+            self._max_callback_time = elapsed
+
     def _handle_event(self, fileno, event):
         """ Handle an epoll event occurred on a specific file descriptor. """
         reconnect = False
@@ -87,6 +107,7 @@ class Listener(object):
             if obj:
                 obj['timeout_seen'] = False
                 obj['reconnects'] = 0
+                started = monotonic_time()
                 try:
                     if obj['read_cb']():
                         obj['read_time'] = time.time()
@@ -94,6 +115,8 @@ class Listener(object):
                         reconnect = True
                 except:
                     self.log.exception("Exception on read callback.")
+                finally:
+                    self._account(started)
             else:
                 self.log.debug("Received epoll event %.08X for no longer "
                                "tracked fd = %d", event, fileno)
@@ -102,6 +125,9 @@ class Listener(object):
             self._prepare_reconnect(fileno)
 
     def _prepare_reconnect(self, fileno):
+        # The update lock is held for the whole operation so the channel is
+        # always found by unregister(), even while its fileno is replaced.
+        with self._update_lock:
             # fileno will be closed by create_cb
             self._unregister_fd(fileno)
             obj = self._channels.pop(fileno)
@@ -112,8 +138,7 @@ class Listener(object):
                 self.log.exception("An error occurred in the create callback "
                                    "fileno: %d.", fileno)
             else:
-                with self._update_lock:
-                    self._unconnected[fileno] = obj
+                self._unconnected[fileno] = obj
 
     def _handle_timeouts(self):
         """
@@ -126,18 +151,33 @@ class Listener(object):
                 if not obj.get('timeout_seen', False):
                     self.log.debug("Timeout on fileno %d.", fileno)
                     obj['timeout_seen'] = True
+                started = monotonic_time()
                 try:
                     obj['timeout_cb']()
                     obj['read_time'] = now
                 except:
                     self.log.exception("Exception on timeout callback.")
+                finally:
+                    self._account(started)
 
     def _do_add_channels(self):
-        """ Add new channels to unconnected channels list. """
+        """
+        Add new channels to unconnected channels list. Connected channels
+        moved from another shard are registered directly.
+        """
         for (fileno, obj) in self._add_channels.items():
-            self.log.debug("fileno %d was added to unconnected channels.",
-                           fileno)
-            self._unconnected[fileno] = obj
+            connected = obj.pop('connected', False)
+            if fileno in self._del_channels:
+                continue
+            if connected:
+                self.log.debug("fileno %d was moved to shard %d.",
+                               fileno, self.index)
+                self._channels[fileno] = obj
+                self._epoll.register(fileno, select.EPOLLIN)
+            else:
+                self.log.debug("fileno %d was added to unconnected channels.",
+                               fileno)
+                self._unconnected[fileno] = obj
         self._add_channels.clear()
 
     def _do_del_channels(self):
@@ -154,6 +194,12 @@ class Listener(object):
         with self._update_lock:
             self._do_add_channels()
             self._do_del_channels()
+            targets = self._move_targets
+            self._move_targets = []
+        # Must be called without the update lock, moving a channel takes the
+        # listener lock before the shards' locks.
+        for target in targets:
+            self._listener._move_channel(self, target)
 
     def _handle_unconnected(self):
         """
@@ -202,57 +248,224 @@ class Listener(object):
                 self._handle_unconnected()
 
     def run(self):
-        """ The listener thread's function. """
-        self.log.debug("Starting VM channels listener thread.")
+        """ The shard thread's function. """
+        self.log.debug("Starting VM channels listener thread %d.", self.index)
         self._quit = False
         try:
             while not self._quit:
                 self._wait_for_events()
         except:
             self.log.exception("Unhandled exception caught in vm channels "
-                               "listener thread")
+                               "listener thread %d", self.index)
         finally:
-            self.log.debug("VM channels listener thread has ended.")
+            self.log.debug("VM channels listener thread %d has ended.",
+                           self.index)
 
     def stop(self):
-        """" Stop the listener execution. """
         self._quit = True
+
+    def settimeout(self, seconds):
+        self._timeout = seconds
+
+    def load(self):
+        """ Return the number of channels tracked by this shard. """
+        with self._update_lock:
+            tracked = set(self._add_channels)
+            tracked.update(self._unconnected)
+            tracked.update(self._channels)
+            tracked.difference_update(self._del_channels)
+            return len(tracked)
+
+    def add(self, fileno, obj):
+        with self._update_lock:
+            self._add_channels[fileno] = obj
+
+    def unregister(self, fileno):
+        """
+        Unregister fileno if it is tracked by this shard. Returns True if the
+        channel was tracked.
+        """
+        with self._update_lock:
+            if fileno in self._del_channels:
+                return False
+            if fileno in self._add_channels or fileno in self._unconnected:
+                self._del_channels.append(fileno)
+                return True
+            if fileno in self._channels:
+                # NOTE: unregister_fd has to be called here, otherwise it'd
+                # be removed from epoll after the socket has been closed,
+                # which is incorrect
+                # NOTE: unregister_fd must be only called if fileno is not in
+                # _add_channels and not in _unconnected because it might be
+                # about to reconnect after an error or has just been added.
+                # In those cases fileno is not being tracked by epoll and
+                # would result in an ENOENT error
+                self._unregister_fd(fileno)
+                self._del_channels.append(fileno)
+                return True
+            return False
+
+    def request_move(self, target):
+        """
+        Ask this shard's thread to move one channel to target. Channels are
+        moved only by the owning thread, since the callbacks of a channel
+        must never run concurrently.
+        """
+        with self._update_lock:
+            self._move_targets.append(target)
+
+    def detach_channel(self):
+        """
+        Remove one channel from this shard, preferring channels which are not
+        connected. Must be called from the shard thread.
+
+        Returns (fileno, obj, connected) or (None, None, False) if there is no
+        channel that can be moved.
+        """
+        with self._update_lock:
+            for channels in (self._add_channels, self._unconnected):
+                for fileno in channels:
+                    if fileno not in self._del_channels:
+                        return fileno, channels.pop(fileno), False
+            for fileno in self._channels:
+                if fileno not in self._del_channels:
+                    self._unregister_fd(fileno)
+                    return fileno, self._channels.pop(fileno), True
+        return None, None, False
+
+    def attach_channel(self, fileno, obj, connected):
+        with self._update_lock:
+            obj['connected'] = connected
+            self._add_channels[fileno] = obj
+
+    def stats(self):
+        """
+        Return load statistics for this shard. The maximum callback time is
+        reset on each call.
+        """
+        with self._update_lock:
+            max_callback_time = self._max_callback_time
+            self._max_callback_time = 0.0
+            return {
+                'connected': len(self._channels),
+                'unconnected': (len(self._unconnected) +
+                                len(self._add_channels)),
+                'events': self._events,
+                'callbacks_time': self._callbacks_time,
+                'max_callback_time': max_callback_time,
+            }
+
+
+class Listener(object):
+    """
+    An events driven listener which handle messages from virtual machines.
+
+    Channels are sharded across several epoll threads, so a slow callback
+    delays only the channels served by the same thread. A channel is placed
+    on the shard selected by its key (typically the VM channel path), unless
+    this shard is loaded much more than the others. When channels are
+    unregistered, channels are moved from the most loaded shard to keep the
+    shards balanced.
+    """
+    def __init__(self, log, shards=1):
+        if shards < 1:
+            raise ValueError("Invalid number of shards: %d" % shards)
+        self.log = log
+        self._lock = threading.Lock()
+        self._timeout = None
+        self._shards = [_Shard(self, i, log) for i in range(shards)]
+
+    def start(self):
+        self.log.info("Starting VM channels listener with %d threads",
+                      len(self._shards))
+        for shard in self._shards:
+            shard.start()
+
+    def stop(self):
+        """" Stop the listener execution. """
+        for shard in self._shards:
+            shard.stop()
         self.log.debug("VM channels listener was stopped.")
 
     def settimeout(self, seconds):
         """ Set the timeout value (in seconds) for all channels. """
         self.log.info("Setting channels' timeout to %d seconds.", seconds)
         self._timeout = seconds
+        for shard in self._shards:
+            shard.settimeout(seconds)
 
     def timeout(self):
         """ Returns the currently configured timeout value """
         return self._timeout
 
     def register(self, create_callback, connect_callback, read_callback,
-                 timeout_callback):
-        """ Register a new file descriptor to the listener. """
+                 timeout_callback, key=None):
+        """
+        Register a new file descriptor to the listener. If key is specified,
+        it is used to select the shard serving the channel, otherwise the
+        file descriptor is used.
+        """
         fileno = create_callback()
-        self.log.debug("Add fileno %d to listener's channels.", fileno)
-        with self._update_lock:
-            self._add_channels[fileno] = {
+        if key is None:
+            key = fileno
+        with self._lock:
+            shard = self._select_shard(key)
+            self.log.debug("Add fileno %d to listener's channels (shard %d).",
+                           fileno, shard.index)
+            shard.add(fileno, {
                 'connect_cb': connect_callback,
                 'read_cb': read_callback, 'timeout_cb': timeout_callback,
-                'create_cb': create_callback, 'read_time': 0.0}
+                'create_cb': create_callback, 'read_time': 0.0})
 
     def unregister(self, fileno):
         """ Unregister an exist file descriptor from the listener. """
         self.log.debug("Delete fileno %d from listener.", fileno)
-        with self._update_lock:
-            # Threadsafe, fileno will be closed by caller
-            # NOTE: unregister_fd has to be called here, otherwise it'd be
-            # removed from epoll after the socket has been closed, which is
-            # incorrect
-            # NOTE: unregister_fd must be only called if fileno is not in
-            # _add_channels and not in _unconnected because it might be
-            # about to reconnect after an error or has just been added.
-            # In those cases fileno is not being tracked by epoll and
-            # would result in an ENOENT error
-            if (fileno not in self._add_channels and
-                    fileno not in self._unconnected):
-                self._unregister_fd(fileno)
-            self._del_channels.append(fileno)
+        # Threadsafe, fileno will be closed by caller
+        with self._lock:
+            for shard in self._shards:
+                if shard.unregister(fileno):
+                    break
+            else:
+                self.log.debug("fileno %d is not tracked by listener",
+                               fileno)
+                return
+            self._rebalance()
+
+    def stats(self):
+        """
+        Return a list of per shard load statistics, see _Shard.stats().
+        """
+        return [shard.stats() for shard in self._shards]
+
+    def _select_shard(self, key):
+        # Use stable hash so the same key maps to the same shard in every
+        # run, making it easier to debug.
+        preferred = self._shards[
+            zlib.crc32(str(key).encode('utf-8')) % len(self._shards)]
+        least = min(self._shards, key=lambda s: s.load())
+        if preferred.load() - least.load() >= MAX_SHARD_IMBALANCE:
+            return least
+        return preferred
+
+    def _rebalance(self):
+        # Called with self._lock held.
+        if len(self._shards) < 2:
+            return
+        loads = sorted((shard.load(), shard.index) for shard in self._shards)
+        (min_load, min_index), (max_load, max_index) = loads[0], loads[-1]
+        if max_load - min_load > MAX_SHARD_IMBALANCE:
+            self._shards[max_index].request_move(self._shards[min_index])
+
+    def _move_channel(self, source, target):
+        """
+        Called from the source shard thread to move one channel to target.
+        """
+        with self._lock:
+            if source.load() - target.load() <= MAX_SHARD_IMBALANCE:
+                return
+            fileno, obj, connected = source.detach_channel()
+            if fileno is None:
+                return
+            self.log.debug("Moving fileno %d from shard %d to shard %d",
+                           fileno, source.index, target.index)
+            target.attach_channel(fileno, obj, connected)
@@ -24,6 +24,7 @@ from __future__ import division
 import contextlib
 import logging
 
+import libvirt
 import six
 
 from vdsm.common.time import monotonic_time
@@ -35,24 +36,41 @@ from vdsm.virt.utils import isVdsmImage
 _log = logging.getLogger('virt.vmstats')
 
 
-def produce(vm, first_sample, last_sample, interval):
+def produce(vm, first_sample, last_sample, interval, intervals=None):
     """
     Translates vm samples into stats.
+
+    intervals maps libvirt stats types sampled separately to the interval
+    between their samples (see sampling.StatsCache). Other stats use
+    interval.
     """
 
     stats = {}
 
-    cpu(stats, first_sample, last_sample, interval)
-    networks(vm, stats, first_sample, last_sample, interval)
-    disks(vm, stats, first_sample, last_sample, interval)
+    cpu(stats, first_sample, last_sample,
+        _interval(intervals, libvirt.VIR_DOMAIN_STATS_CPU_TOTAL, interval))
+    networks(vm, stats, first_sample, last_sample,
+             _interval(intervals, libvirt.VIR_DOMAIN_STATS_INTERFACE,
+                       interval))
+    disks(vm, stats, first_sample, last_sample,
+          _interval(intervals, libvirt.VIR_DOMAIN_STATS_BLOCK, interval))
     balloon(vm, stats, last_sample)
     cpu_count(stats, last_sample)
     tune_io(vm, stats)
-    memory(stats, first_sample, last_sample, interval)
+    memory(stats, first_sample, last_sample,
+           _interval(intervals, libvirt.VIR_DOMAIN_STATS_BALLOON, interval))
 
     return stats
 
 
+def _interval(intervals, stats_type, interval):
+    if intervals:
+        for stats_types, group_interval in six.iteritems(intervals):
+            if stats_types & stats_type:
+                return group_interval
+    return interval
+
+
 def translate(vm_stats):
     stats = {}
 
@@ -19,6 +19,7 @@ import logging
 from six.moves import queue
 
 from vdsm.common import exception as vdsmexception
+from vdsm.common import tracing
 
 from vdsm.common.compat import json
 from vdsm.common.logutils import Suppressed, traceback
@@ -257,9 +258,10 @@ class JsonRpcTask(object):
         self._handler = handler
         self._ctx = ctx
         self._req = req
+        self._queued = monotonic_time()
 
     def __call__(self):
-        self._handler(self._ctx, self._req)
+        self._handler(self._ctx, self._req, queued=self._queued)
 
     def __repr__(self):
         return '<JsonRpcTask %s at 0x%x>' % (
@@ -300,9 +302,16 @@ class JsonRpcServer(object):
             self._next_report += self._timeout
             self._counter = 0
 
-    def _serveRequest(self, ctx, req):
+    def _serveRequest(self, ctx, req, queued=None):
         start_time = monotonic_time()
-        response = self._handle_request(req, ctx)
+        trace = tracing.begin(
+            req.method, flow_id=getattr(ctx.context, "flow_id", None))
+        if queued is not None:
+            tracing.record("executor.queue", queued)
+        try:
+            response = self._handle_request(req, ctx)
+        finally:
+            tracing.end(trace)
         error = getattr(response, "error", None)
         if error is None:
             response_log = "succeeded"
@@ -524,3 +524,62 @@ class TestValidatingEvent:
 
         assert all(invalidated)
         assert not event.valid
+
+
+class TestGroupCommit:
+
+    def test_submit(self):
+        batches = []
+        group_commit = concurrent.GroupCommit(batches.append)
+        group_commit.submit(1)
+        group_commit.submit(2)
+        assert batches == [[1], [2]]
+
+    def test_submit_concurrently(self):
+        count = 4
+        batches = []
+        started = threading.Event()
+        resume = threading.Event()
+
+        def commit(items):
+            batches.append(items)
+            if len(batches) == 1:
+                started.set()
+                resume.wait(1)
+
+        group_commit = concurrent.GroupCommit(commit)
+
+        threads = [concurrent.thread(group_commit.submit, args=(0,))]
+        threads[0].start()
+        try:
+            # Wait until the first batch is committed.
+            started.wait(1)
+            for i in range(1, count):
+                t = concurrent.thread(group_commit.submit, args=(i,))
+                t.start()
+                threads.append(t)
+            # Give threads time to submit their items.
+            time.sleep(0.5)
+            resume.set()
+        finally:
+            for t in threads:
+                t.join()
+
+        assert batches[0] == [0]
+        assert sorted(batches[1]) == list(range(1, count))
+
+    def test_error(self):
+        batches = []
+
+        def commit(items):
+            batches.append(items)
+            if len(batches) == 1:
+                raise RuntimeError("Commit failed")
+
+        group_commit = concurrent.GroupCommit(commit)
+        with pytest.raises(RuntimeError):
+            group_commit.submit(1)
+
+        # The error is not raised when committing the next batch.
+        group_commit.submit(2)
+        assert batches == [[1], [2]]
@@ -23,7 +23,10 @@ from __future__ import division
 
 from __future__ import print_function
 
+import grp
 import logging
+import os
+import pwd
 import threading
 import time
 
@@ -33,6 +36,7 @@ from contextlib import contextmanager
 from testlib import VdsmTestCase as TestCaseBase
 from testlib import expandPermutations, permutations
 from testlib import forked
+from testlib import temporaryPath
 
 from vdsm.common import concurrent
 from vdsm.common import logutils
@@ -141,6 +145,23 @@ class Handler(object):
                 now = time.time()
 
 
+class BatchHandler(Handler):
+    """
+    A handler supporting batches, like UserGroupEnforcingHandler.
+    """
+
+    def __init__(self, delay=0):
+        Handler.__init__(self, delay=delay)
+        self.batches = []
+
+    def handle_batch(self, records):
+        with self.lock:
+            self.batches.append(len(records))
+            for record in records:
+                self.messages.append(record.msg % record.args)
+            self.flush()
+
+
 @expandPermutations
 class TestThreadedHandler(TestCaseBase):
 
@@ -330,3 +351,70 @@ class TestThreadedHandler(TestCaseBase):
 
         print("Logged %d messages in %.2f seconds" % (
               len(target.messages), elapsed))
+
+    def test_batch(self):
+        target = BatchHandler()
+
+        with threaded_handler(100, target) as (handler, logger):
+            for i in range(50):
+                logger.critical("Message %d", i)
+            handler.start()
+
+        # All queued messages are handled in one batch.
+        expected = ["Message %d" % i for i in range(50)]
+        self.assertEqual(target.messages, expected)
+        self.assertEqual(target.batches, [50])
+
+    def test_drop_after_close(self):
+        target = Handler()
+
+        with threaded_handler(10, target) as (handler, logger):
+            handler.start()
+            logger.critical("Logged")
+
+        logger.critical("Dropped")
+        self.assertEqual(target.messages, ["Logged"])
+
+    def test_report_top_loggers(self):
+        reports = []
+        target = Handler()
+
+        with threaded_handler(100, target) as (handler, logger):
+            handler._report_stats = lambda *args: reports.append(args)
+            noisy = logging.Logger("noisy")
+            noisy.addHandler(handler)
+            for i in range(10):
+                noisy.critical("noisy %d", i)
+            logger.critical("quiet")
+            record = logger.makeRecord(
+                "test", logging.CRITICAL, __file__, 0, "report", (), None)
+            record.created += handler.STATS_INTERVAL
+            handler.handle(record)
+            handler.start()
+
+        interval, dropped, max_pending, loggers = reports[0]
+        self.assertEqual(dropped, 0)
+        self.assertEqual(loggers.most_common(2), [("noisy", 10), ("test", 2)])
+
+
+class TestUserGroupEnforcingHandler(TestCaseBase):
+
+    def test_handle_batch(self):
+        user = pwd.getpwuid(os.geteuid()).pw_name
+        group = grp.getgrgid(os.getegid()).gr_name
+        with temporaryPath() as path:
+            handler = logutils.UserGroupEnforcingHandler(user, group, path)
+            with closing(handler):
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger = logging.Logger("test")
+                records = [
+                    logger.makeRecord(
+                        "test", logging.INFO, __file__, 0, "message %d", (i,),
+                        None)
+                    for i in range(3)
+                ]
+                handler.handle_batch(records)
+
+            with open(path) as f:
+                self.assertEqual(
+                    f.read(), "message 0\nmessage 1\nmessage 2\n")
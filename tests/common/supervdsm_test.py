@@ -0,0 +1,208 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+from __future__ import absolute_import
+from __future__ import division
+
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from vdsm.common import concurrent
+from vdsm.common import supervdsm
+
+log = logging.getLogger("test")
+
+
+class FakeSuperVdsm(object):
+    """
+    Stand-in for the supervdsm server instance.
+    """
+
+    def ping(self):
+        return True
+
+    def echo(self, value, delay=0):
+        if delay:
+            time.sleep(delay)
+        return value
+
+    def fail(self, message):
+        raise ValueError(message)
+
+    def batch(self, calls):
+        return supervdsm.run_batch(self, calls)
+
+    def _private(self):
+        return "private"
+
+
+@pytest.fixture
+def server(tmpdir):
+    address = os.path.join(str(tmpdir), "svdsm.sock")
+    manager = supervdsm._SuperVdsmManager(address=address, authkey=b'')
+    manager.register('instance', callable=FakeSuperVdsm)
+    manager.start()
+    try:
+        yield address
+    finally:
+        manager.shutdown()
+
+
+@pytest.fixture
+def proxy(server):
+    return supervdsm.SuperVdsmProxy(address=server, connections=4)
+
+
+def test_call(proxy):
+    assert proxy.ping()
+    assert proxy.echo("value") == "value"
+    assert proxy.echo(value=[1, 2]) == [1, 2]
+
+
+def test_call_error(proxy):
+    with pytest.raises(ValueError) as e:
+        proxy.fail("message")
+    assert str(e.value) == "message"
+    # Connection is usable after an error.
+    assert proxy.ping()
+
+
+def test_concurrent_calls(proxy):
+    results = {}
+
+    def call(i):
+        # Slow calls must not block the fast calls in other threads.
+        results[i] = proxy.echo(i, delay=0.2 if i % 2 else 0)
+
+    threads = [concurrent.thread(call, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: i for i in range(20)}
+    # Connections opened for concurrent calls are not kept.
+    assert len(proxy._pool._idle) <= 4
+
+
+def test_slow_call_does_not_block(server):
+    proxy = supervdsm.SuperVdsmProxy(address=server, connections=1)
+    # Open the only pooled connection.
+    assert proxy.ping()
+
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        proxy.echo("slow", delay=1.0)
+
+    t = concurrent.thread(slow)
+    t.start()
+    try:
+        started.wait()
+        time.sleep(0.1)
+        # The pooled connection is busy, so this call uses a new
+        # connection instead of waiting for the slow call.
+        start = time.monotonic()
+        assert proxy.ping()
+        assert time.monotonic() - start < 0.5
+    finally:
+        t.join()
+
+    # Only one idle connection is kept.
+    assert len(proxy._pool._idle) == 1
+
+
+def test_reuse_connection(proxy):
+    for i in range(10):
+        assert proxy.echo(i) == i
+    assert len(proxy._pool._idle) == 1
+
+
+def test_close_broken_connection(proxy):
+    assert proxy.ping()
+    conn = proxy._pool._idle[0]
+    conn.close()
+    with pytest.raises(Exception):
+        proxy.ping()
+    # The broken connection was dropped, and the next call opens a new
+    # connection.
+    assert proxy._pool._idle == []
+    assert proxy.ping()
+
+
+def test_batch(proxy):
+    results = proxy.batch([
+        ("echo", (1,), {}),
+        ("fail", ("message",), {}),
+        ("echo", (), {"value": 2}),
+    ])
+    assert results[0] == concurrent.Result(True, 1)
+    assert not results[1].succeeded
+    assert isinstance(results[1].value, ValueError)
+    assert results[2] == concurrent.Result(True, 2)
+
+
+def test_batch_private_method(proxy):
+    results = proxy.batch([
+        ("_private", (), {}),
+        ("__class__", (), {}),
+    ])
+    for result in results:
+        assert not result.succeeded
+        assert isinstance(result.value, AttributeError)
+
+
+def test_stats(proxy):
+    proxy.echo(1)
+    proxy.echo(2)
+    with pytest.raises(ValueError):
+        proxy.fail("message")
+
+    stats = proxy.stats()
+    assert stats["echo"]["count"] == 2
+    assert stats["echo"]["errors"] == 0
+    assert stats["fail"]["count"] == 1
+    assert stats["fail"]["errors"] == 1
+    assert stats["echo"]["time_max"] <= stats["echo"]["time_total"]
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("threads", [1, 8])
+def test_benchmark(proxy, threads):
+    calls = 2000
+
+    def run():
+        for i in range(calls // threads):
+            proxy.ping()
+
+    workers = [concurrent.thread(run) for i in range(threads)]
+    start = time.monotonic()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.monotonic() - start
+
+    log.info("%d threads: %d calls in %.3f seconds (%.0f calls/s)",
+             threads, calls, elapsed, calls / elapsed)
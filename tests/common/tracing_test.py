@@ -0,0 +1,152 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import threading
+
+import pytest
+
+from vdsm.common import tracing
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def tracer():
+    tracing.start(10)
+    yield
+    tracing.stop()
+
+
+def test_disabled():
+    assert tracing.begin("Host.getStats") is None
+    with tracing.span("lvm.cmd"):
+        pass
+    tracing.record("executor.queue", 0)
+    tracing.end(None)
+    assert tracing.breakdown() == []
+    assert tracing.slow_requests(0) == []
+
+
+def test_span(tracer):
+    trace = tracing.begin("Volume.create", flow_id="flow")
+    assert tracing.current() is trace
+    with tracing.span("lvm.cmd"):
+        pass
+    tracing.end(trace)
+    assert tracing.current() is None
+
+    assert [s.name for s in trace.spans] == ["lvm.cmd"]
+    # Spans outside of a request are ignored.
+    with tracing.span("lvm.cmd"):
+        pass
+    assert len(trace.spans) == 1
+
+
+def test_span_error(tracer):
+    trace = tracing.begin("Volume.create")
+    with pytest.raises(RuntimeError):
+        with tracing.span("lvm.cmd"):
+            raise RuntimeError
+    tracing.end(trace)
+    assert [s.name for s in trace.spans] == ["lvm.cmd"]
+
+
+def test_resume(tracer):
+    trace = tracing.begin("Volume.create")
+    tracing.end(trace)
+
+    def run():
+        with tracing.resume(trace):
+            with tracing.span("task.run"):
+                pass
+        assert tracing.current() is None
+
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+    assert [s.name for s in trace.spans] == ["task.run"]
+
+
+def test_breakdown():
+    clock = FakeClock()
+    tracer = tracing.Tracer(10, clock=clock)
+    for duration, wait in (1.0, 0.5), (3.0, 1.5):
+        trace = tracer.begin("Volume.create")
+        start = clock.now
+        clock.now += wait
+        trace.add("rm.wait", start, wait)
+        clock.now += duration - wait
+        tracer.end(trace)
+    trace = tracer.begin("Host.getStats")
+    clock.now += 0.5
+    tracer.end(trace)
+
+    verbs = tracer.breakdown()
+    assert verbs[0] == {
+        "verb": "Volume.create",
+        "count": 2,
+        "avg": 2.0,
+        "max": 3.0,
+        "spans": {"rm.wait": 1.0},
+    }
+    assert verbs[1]["verb"] == "Host.getStats"
+
+
+def test_slow_requests():
+    clock = FakeClock()
+    tracer = tracing.Tracer(10, clock=clock)
+    for duration in (0.5, 2.0, 1.0):
+        trace = tracer.begin("Volume.create")
+        clock.now += duration
+        tracer.end(trace)
+    slow = tracer.slow_requests(1.0)
+    assert [t.duration for t in slow] == [2.0, 1.0]
+
+
+def test_ring_buffer():
+    tracer = tracing.Tracer(2)
+    for i in range(3):
+        tracer.end(tracer.begin("verb%d" % i))
+    assert [t.verb for t in tracer.traces()] == ["verb1", "verb2"]
+
+
+def test_info():
+    clock = FakeClock()
+    tracer = tracing.Tracer(10, clock=clock)
+    trace = tracer.begin("Volume.create", flow_id="flow")
+    clock.now += 1
+    trace.add("lvm.cmd", 0.5, 0.25)
+    tracer.end(trace)
+    info = trace.info()
+    assert info["verb"] == "Volume.create"
+    assert info["flow_id"] == "flow"
+    assert info["duration"] == 1
+    assert info["spans"] == [
+        {"name": "lvm.cmd", "start": 0.5, "duration": 0.25}]
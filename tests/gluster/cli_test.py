@@ -22,6 +22,8 @@ from __future__ import absolute_import
 from __future__ import division
 
 import os
+import threading
+
 import pytest
 
 from vdsm.gluster import cli
@@ -51,3 +53,214 @@ def test_getTree(relative_filepath, expected):
 def test_get_tree_empty_input():
     with pytest.raises(ge.GlusterXmlErrorException):
         cli._getTree("")
+
+
+VOLUME_INFO = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<cliOutput>
+  <opRet>0</opRet>
+  <opErrno>0</opErrno>
+  <opErrstr/>
+  <volInfo>
+    <volumes>
+{volumes}
+      <count>{count}</count>
+    </volumes>
+  </volInfo>
+</cliOutput>
+"""
+
+VOLUME = """
+      <volume>
+        <name>vol-{index}</name>
+        <id>00000000-0000-0000-0000-{index:012d}</id>
+        <status>1</status>
+        <statusStr>Started</statusStr>
+        <brickCount>2</brickCount>
+        <distCount>1</distCount>
+        <stripeCount>1</stripeCount>
+        <replicaCount>2</replicaCount>
+        <arbiterCount>0</arbiterCount>
+        <disperseCount>0</disperseCount>
+        <redundancyCount>0</redundancyCount>
+        <type>2</type>
+        <typeStr>Replicate</typeStr>
+        <transport>0</transport>
+        <bricks>
+          <brick>host1:/bricks/vol-{index}<name>host1:/bricks/vol-{index}\
+</name><hostUuid>uuid-1</hostUuid><isArbiter>0</isArbiter></brick>
+          <brick>host2:/bricks/vol-{index}<name>host2:/bricks/vol-{index}\
+</name><hostUuid>uuid-2</hostUuid><isArbiter>0</isArbiter></brick>
+        </bricks>
+        <optCount>1</optCount>
+        <options>
+          <option>
+            <name>auth.allow</name>
+            <value>*</value>
+          </option>
+        </options>
+      </volume>
+"""
+
+FAILED = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<cliOutput>
+  <opRet>-1</opRet>
+  <opErrno>30800</opErrno>
+  <opErrstr>Volume vol-0 does not exist</opErrstr>
+</cliOutput>
+"""
+
+
+def volume_info_xml(count):
+    volumes = "".join(VOLUME.format(index=i) for i in range(count))
+    return VOLUME_INFO.format(volumes=volumes, count=count).encode("utf-8")
+
+
+@pytest.mark.parametrize("count", [0, 1, 100])
+def test_iter_tree_volume_info(count):
+    out = volume_info_xml(count)
+    expected = cli._parseVolumeInfo(cli._getTree(out))
+    volumes = cli._parseVolumeInfoElements(
+        cli._iterTree(out, "volInfo/volumes"))
+    assert volumes == expected
+    assert len(volumes) == count
+
+
+def test_iter_tree_failed():
+    with pytest.raises(ge.GlusterCmdFailedException) as e:
+        list(cli._iterTree(FAILED, "volInfo/volumes"))
+    assert e.value.rc == 30800
+
+
+@pytest.mark.parametrize("out", ["", "<cliOutput>", "<cliOutput/>"])
+def test_iter_tree_invalid_output(out):
+    with pytest.raises(ge.GlusterXmlErrorException):
+        list(cli._iterTree(out, "volInfo/volumes"))
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class Command(object):
+
+    def __init__(self, out=b"out", error=None):
+        self.out = out
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.finish = threading.Event()
+        self.finish.set()
+
+    def __call__(self, cmd):
+        self.calls += 1
+        self.started.set()
+        self.finish.wait()
+        if self.error:
+            raise self.error
+        return self.out
+
+
+def test_cache_ttl():
+    clock = FakeClock()
+    cache = cli._CommandCache(5, clock=clock)
+    command = Command()
+
+    assert cache.run(["gluster"], command) == b"out"
+    clock.now += 4
+    assert cache.run(["gluster"], command) == b"out"
+    assert command.calls == 1
+
+    clock.now += 1
+    assert cache.run(["gluster"], command) == b"out"
+    assert command.calls == 2
+
+
+def test_cache_disabled():
+    cache = cli._CommandCache(0)
+    command = Command()
+    cache.run(["gluster"], command)
+    cache.run(["gluster"], command)
+    assert command.calls == 2
+
+
+def test_cache_different_commands():
+    cache = cli._CommandCache(5)
+    command = Command()
+    cache.run(["gluster", "volume", "info"], command)
+    cache.run(["gluster", "peer", "status"], command)
+    assert command.calls == 2
+
+
+def test_cache_error_not_cached():
+    cache = cli._CommandCache(5)
+    command = Command(error=ge.GlusterCmdFailedException(rc=1))
+    for i in range(2):
+        with pytest.raises(ge.GlusterCmdFailedException):
+            cache.run(["gluster"], command)
+    assert command.calls == 2
+
+
+def test_cache_coalesce():
+    cache = cli._CommandCache(5)
+    command = Command()
+    command.finish.clear()
+    results = []
+
+    def run():
+        results.append(cache.run(["gluster"], command))
+
+    threads = [threading.Thread(target=run) for i in range(10)]
+    threads[0].start()
+    command.started.wait()
+    for t in threads[1:]:
+        t.start()
+    command.finish.set()
+    for t in threads:
+        t.join()
+
+    assert command.calls == 1
+    assert results == [b"out"] * 10
+
+
+def test_cache_invalidate_while_running():
+    cache = cli._CommandCache(5)
+    command = Command()
+    command.finish.clear()
+
+    t = threading.Thread(target=cache.run, args=(["gluster"], command))
+    t.start()
+    command.started.wait()
+    # A command modifying gluster was run while the query was running, so
+    # its output may be stale.
+    cache.invalidate()
+    command.finish.set()
+    t.join()
+
+    cache.run(["gluster"], command)
+    assert command.calls == 2
+
+
+def test_volume_info_cached(monkeypatch):
+    calls = []
+
+    def run(cmd):
+        calls.append(cmd)
+        return volume_info_xml(2)
+
+    monkeypatch.setattr(cli._glusterCommandPath, "_cmd", "/usr/sbin/gluster")
+    monkeypatch.setattr(cli, "_cache", cli._CommandCache(60))
+    monkeypatch.setattr(cli.commands, "run", run)
+
+    assert len(cli.volumeInfo()) == 2
+    assert len(cli.volumeInfo()) == 2
+    assert len(calls) == 1
+
+    # Modifying gluster invalidates the cache.
+    cli.volumeStart("vol-0")
+    assert len(cli.volumeInfo()) == 2
+    assert len(calls) == 3
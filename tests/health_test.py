@@ -0,0 +1,144 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import gc
+import threading
+
+import pytest
+import six
+
+from vdsm import health
+
+
+class Cycle(object):
+
+    def __init__(self):
+        self.ref = self
+
+
+@pytest.mark.skipif(six.PY2, reason="gc.callbacks requires python 3")
+class TestGCStats:
+
+    def test_collect(self):
+        stats = health.GCStats()
+        stats.install()
+        try:
+            before = stats.snapshot()
+            for i in range(10):
+                Cycle()
+            gc.collect()
+            delta = stats.snapshot().delta(before)
+        finally:
+            stats.uninstall()
+
+        assert delta[2].collections >= 1
+        assert delta[2].collected >= 10
+        assert delta[2].pause_total >= 0
+        assert sum(delta[2].pauses) == delta[2].collections
+
+    def test_uninstall(self):
+        stats = health.GCStats()
+        stats.install()
+        stats.uninstall()
+        assert stats._callback not in gc.callbacks
+        before = stats.snapshot()
+        gc.collect()
+        delta = stats.snapshot().delta(before)
+        assert all(gen.collections == 0 for gen in delta)
+
+    def test_pause_max_reset(self):
+        stats = health.GCStats()
+        stats._generations[0].add(0.5, 1, 0)
+        first = stats.snapshot()
+        assert first.generations[0].pause_max == 0.5
+        second = stats.snapshot()
+        assert second.generations[0].pause_max == 0.0
+
+
+@pytest.mark.parametrize("pause,bucket", [
+    (0.0005, 0),
+    (0.001, 0),
+    (0.003, 1),
+    (0.2, 5),
+    (5.0, 7),
+])
+def test_pause_histogram(pause, bucket):
+    stats = health.GenerationStats()
+    stats.add(pause, 0, 0)
+    expected = [0] * len(health.GC_PAUSE_BUCKETS)
+    expected[bucket] = 1
+    assert stats.pauses == expected
+
+
+@pytest.mark.parametrize("value,thresholds", [
+    ("", None),
+    ("  ", None),
+    ("700", (700,)),
+    ("700,10,10", (700, 10, 10)),
+])
+def test_parse_gc_thresholds(value, thresholds):
+    assert health.parse_gc_thresholds(value) == thresholds
+
+
+@pytest.mark.parametrize("value", ["700,10,10,10", "700,x", ","])
+def test_parse_gc_thresholds_invalid(value):
+    with pytest.raises(ValueError):
+        health.parse_gc_thresholds(value)
+
+
+class TestTaskStat:
+
+    def test_parse(self):
+        line = (b"1234 (jsonrpc/3 (x)) S 1 1234 1234 0 -1 4194368 100 0 0 0 "
+                b"250 50 0 0 20 0 1 0 100 0 0 18446744073709551615")
+        task = health.TaskStat(line)
+        assert task.name == "jsonrpc/3 (x)"
+        assert task.utime == 250 / health.TaskStat._TICKS_PER_SEC
+        assert task.stime == 50 / health.TaskStat._TICKS_PER_SEC
+
+    def test_all(self):
+        done = threading.Event()
+        t = threading.Thread(target=done.wait)
+        t.start()
+        try:
+            tasks = health.TaskStat.all()
+        finally:
+            done.set()
+            t.join()
+        assert len(tasks) >= 2
+        for task in tasks.values():
+            assert task.utime >= 0
+            assert task.stime >= 0
+
+
+@pytest.mark.parametrize("name,group", [
+    ("jsonrpc/3", "jsonrpc"),
+    ("periodic/12", "periodic"),
+    ("health", "health"),
+])
+def test_thread_group(name, group):
+    assert health.thread_group(name) == group
+
+
+def test_metric_name():
+    assert health.metric_name("mailbox-spm.x y") == "mailbox-spm_x_y"
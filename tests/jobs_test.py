@@ -79,6 +79,21 @@ class ProgressingJob(jobs.Job):
         self._progress = value
 
 
+class PhasedJob(jobs.Job):
+
+    def __init__(self):
+        jobs.Job.__init__(self, str(uuid.uuid4()))
+        self._phases = None
+
+    @property
+    def phases(self):
+        return self._phases
+
+    @phases.setter
+    def phases(self, value):
+        self._phases = value
+
+
 class StuckJob(TestingJob):
 
     def __init__(self):
@@ -276,6 +291,13 @@ class JobsTests(VdsmTestCase):
             job.progress = i
             self.assertEqual(i, job.info()['progress'])
 
+    def test_job_get_phases(self):
+        job = PhasedJob()
+        self.assertNotIn('phases', job.info())
+
+        job.phases = {"wait": 0.5, "commit": 2.0}
+        self.assertEqual({"wait": 0.5, "commit": 2.0}, job.info()['phases'])
+
     def test_job_get_error(self):
         job = TestingJob()
         self.assertIsNone(job.error)
@@ -112,6 +112,33 @@ class TestKvm2Ovirt(TestCaseBase):
                 actual = f.read()
             self.assertEqual(actual, FakeVolume().data())
 
+    def test_download_parallel(self):
+        conn = MockVirConnect(vms=self._vms)
+
+        def connect(uri, username, password):
+            return conn
+
+        with MonkeyPatchScope([
+            (libvirtconnection, 'open_connection', connect),
+        ]), namedTemporaryDir() as base:
+            dests = [os.path.join(base, 'dest%d' % i) for i in range(3)]
+            args = ['kvm2ovirt',
+                    '--uri', 'qemu+tcp://domain',
+                    '--source', '/fake/source', '/fake/source',
+                    '/fake/source',
+                    '--storage-type', 'volume', 'path', 'volume',
+                    '--vm-name', self._vms[0].name(),
+                    '--allocation', 'sparse',
+                    '--parallel', '2',
+                    '--dest'] + dests
+
+            kvm2ovirt.main(args)
+
+            for dest in dests:
+                with open(dest) as f:
+                    actual = f.read()
+                self.assertEqual(actual, FakeVolume().data())
+
     @permutations([
                   [None, None],
                   ['root', 'passwd'],
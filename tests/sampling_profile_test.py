@@ -0,0 +1,117 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import threading
+
+import pytest
+
+from vdsm.profiling import sampler
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def busy_function(started, done):
+    started.set()
+    done.wait()
+
+
+@pytest.fixture
+def worker():
+    started = threading.Event()
+    done = threading.Event()
+    t = threading.Thread(
+        target=busy_function, args=(started, done), name="worker/1")
+    t.start()
+    started.wait()
+    yield t
+    done.set()
+    t.join()
+
+
+def parse(data):
+    samples = {}
+    for line in data.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        samples[stack] = int(count)
+    return samples
+
+
+def test_sample(worker):
+    s = sampler.Sampler(10, 60, 10, clock=FakeClock())
+    s.sample()
+    s.sample()
+    samples = parse(s.dump())
+    worker_stacks = [stack for stack in samples
+                     if stack.startswith("worker;")]
+    assert len(worker_stacks) == 1
+    stack = worker_stacks[0]
+    assert samples[stack] == 2
+    frames = stack.split(";")
+    assert any(f.startswith("busy_function (") for f in frames)
+    # The calling thread is not sampled.
+    assert not any("test_sample (" in stack for stack in samples)
+
+
+def test_dump_recent(worker):
+    clock = FakeClock()
+    s = sampler.Sampler(10, 60, 10, clock=clock)
+    s.sample()
+    clock.now = 120
+    s.sample()
+    recent = parse(s.dump(seconds=30))
+    assert sum(c for st, c in recent.items() if st.startswith("worker;")) == 1
+    everything = parse(s.dump())
+    assert sum(
+        c for st, c in everything.items() if st.startswith("worker;")) == 2
+
+
+def test_history(worker):
+    clock = FakeClock()
+    s = sampler.Sampler(10, 60, 2, clock=clock)
+    for i in range(4):
+        clock.now = i * 60
+        s.sample()
+    samples = parse(s.dump())
+    # Only the last 2 slots are kept.
+    assert sum(c for st, c in samples.items() if st.startswith("worker;")) == 2
+
+
+def test_start_stop(worker):
+    s = sampler.Sampler(100, 60, 10)
+    s.start()
+    try:
+        # Wait until some samples were taken.
+        for i in range(100):
+            if s.dump():
+                break
+            threading.Event().wait(0.01)
+    finally:
+        s.stop()
+    assert "worker;" in s.dump()
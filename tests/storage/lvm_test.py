@@ -36,6 +36,8 @@ from vdsm.common.units import MiB, GiB
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import lvm
+from vdsm.storage import resourceFactories
+from vdsm.storage import resourceManager as rm
 
 from . marks import requires_root
 
@@ -392,6 +394,85 @@ def test_cmd_read_only_filter_stale_fail(fake_devices, no_delay):
     assert len(fake_runner.calls) == lc.READ_ONLY_RETRIES + 2
 
 
+class RemoveRunner(FakeRunner):
+    """
+    Fail lvremove commands removing LVs in the fail set.
+    """
+
+    def __init__(self, delay=0.0):
+        FakeRunner.__init__(self, delay=delay)
+        self.fail = set()
+
+    def _run_command(self, cmd):
+        rc, out, err = FakeRunner._run_command(self, cmd)
+        if "lvremove" in cmd and any(lv in self.fail for lv in cmd):
+            return 5, b"", b"fake error"
+        return rc, out, err
+
+
+def removed_lvs(cmd):
+    return sorted(arg for arg in cmd if arg.startswith("vg/"))
+
+
+@pytest.fixture
+def fake_remove(monkeypatch, fake_devices):
+    runner = RemoveRunner(delay=0.1)
+    monkeypatch.setattr(lvm, "_lvminfo", lvm.LVMCache(runner))
+    monkeypatch.setattr(lvm, "_removers", {})
+    return runner
+
+
+def test_remove_lvs_batch(fake_remove):
+    threads = []
+    for name in ("lv1", "lv2", "lv3", "lv4"):
+        t = concurrent.thread(lvm.removeLVs, args=("vg", [name]))
+        t.start()
+        threads.append(t)
+        # Make sure that the first thread started the first command.
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+
+    # First call removes the first LV, the rest are removed by one command.
+    assert [removed_lvs(cmd) for cmd in fake_remove.calls] == [
+        ["vg/lv1"],
+        ["vg/lv2", "vg/lv3", "vg/lv4"],
+    ]
+
+
+def test_remove_lvs_batch_failure(fake_remove, monkeypatch):
+    fake_remove.fail.add("vg/lv3")
+    # The failed batch did not remove lv3.
+    monkeypatch.setattr(
+        lvm._lvminfo, "_reloadlvs",
+        lambda vg, lvs: {("vg", "lv3"): object()})
+
+    errors = {}
+
+    def remove(name):
+        try:
+            lvm.removeLVs("vg", [name])
+        except se.CannotRemoveLogicalVolume as e:
+            errors[name] = e
+
+    threads = []
+    for name in ("lv1", "lv2", "lv3"):
+        t = concurrent.thread(remove, args=(name,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+
+    # Only the caller removing lv3 gets the error.
+    assert list(errors) == ["lv3"]
+    assert [removed_lvs(cmd) for cmd in fake_remove.calls] == [
+        ["vg/lv1"],
+        ["vg/lv2", "vg/lv3"],
+        ["vg/lv3"],
+    ]
+
+
 def test_suppress_warnings(fake_devices, no_delay):
     fake_runner = FakeRunner()
     fake_runner.err = b"""\
@@ -1596,3 +1677,211 @@ def make_lv(lv_name, vg_name):
         "/dev/mapper/a",
         "IU_image-uid,PU_00000000,MD_1",
     )
+
+
+class FakeActivationRunner(FakeRunner):
+    """
+    Simulate activation and deactivation of lvs by lvchange commands.
+    """
+
+    def __init__(self, **kwargs):
+        FakeRunner.__init__(self, **kwargs)
+        # Set of active (vg, lv)
+        self.active = set()
+
+    def _run_command(self, cmd):
+        if cmd[1] == "lvchange" and "--available" in cmd:
+            lvs = {tuple(arg.split("/")) for arg in cmd if "/" in arg[1:]}
+            if cmd[cmd.index("--available") + 1] == "y":
+                self.active.update(lvs)
+            else:
+                self.active.difference_update(lvs)
+        return FakeRunner._run_command(self, cmd)
+
+
+@pytest.fixture
+def fake_activation(monkeypatch, fake_devices, no_delay):
+    runner = FakeActivationRunner()
+    monkeypatch.setattr(lvm, "_lvminfo", lvm.LVMCache(runner))
+    monkeypatch.setattr(
+        lvm, "_isLVActive", lambda vg, lv: (vg, lv) in runner.active)
+    return runner
+
+
+def lvchange_calls(runner):
+    """
+    Return list of (option, lvs) for lvchange commands run by runner.
+    """
+    calls = []
+    for cmd in runner.calls:
+        if cmd[1] != "lvchange":
+            continue
+        lvs = [arg for arg in cmd if arg.startswith("vg/")]
+        if "--refresh" in cmd:
+            option = "refresh"
+        else:
+            option = cmd[cmd.index("--available") + 1]
+        calls.append((option, lvs))
+    return calls
+
+
+ACTIVATION_NAMESPACE = rm.getNamespace(sc.LVM_ACTIVATION_NAMESPACE, "vg")
+
+
+@pytest.fixture
+def activation_manager(monkeypatch, fake_activation):
+    manager = rm._ResourceManager()
+    manager.registerNamespace(
+        ACTIVATION_NAMESPACE, resourceFactories.LvmActivationFactory("vg"))
+    monkeypatch.setattr(rm, "_manager", manager)
+    monkeypatch.setattr(
+        resourceFactories.LvmActivationFactory,
+        "resourceExists",
+        lambda self, name: True)
+    return fake_activation
+
+
+def acquire(lv, lockType=rm.SHARED):
+    res = rm.acquireResource(ACTIVATION_NAMESPACE, lv, lockType)
+    res.autoRelease = False
+    return res
+
+
+def in_thread(func, *args):
+    # Resources acquired in another thread do not use the current thread
+    # activation plan.
+    result = []
+    t = concurrent.thread(lambda: result.append(func(*args)))
+    t.start()
+    t.join()
+    return result[0]
+
+
+def test_bulk_activation_one_command(activation_manager):
+    chain = ["lv-%d" % i for i in range(5)]
+    with resourceFactories.bulk_activation("vg", chain):
+        # Preparing the chain acquires every volume separately.
+        resources = [acquire(lv) for lv in chain]
+
+    assert lvchange_calls(activation_manager) == [
+        ("y", ["vg/" + lv for lv in chain]),
+    ]
+
+    # Releasing the resources deactivates the lvs.
+    for res in resources:
+        res.release()
+    assert not activation_manager.active
+
+
+def test_bulk_activation_refresh_active(activation_manager):
+    activation_manager.active.add(("vg", "lv-0"))
+    with resourceFactories.bulk_activation("vg", ["lv-0", "lv-1"]):
+        acquire("lv-1", rm.EXCLUSIVE)
+        acquire("lv-0")
+
+    assert lvchange_calls(activation_manager) == [
+        ("refresh", ["vg/lv-0"]),
+        ("y", ["vg/lv-1"]),
+    ]
+
+
+def test_bulk_activation_other_lvs(activation_manager):
+    with resourceFactories.bulk_activation("vg", ["lv-0"]):
+        acquire("lv-0")
+        acquire("lv-1")
+
+    assert lvchange_calls(activation_manager) == [
+        ("y", ["vg/lv-0"]),
+        ("y", ["vg/lv-1"]),
+    ]
+
+
+def test_bulk_activation_nested(activation_manager):
+    with resourceFactories.bulk_activation("vg", ["lv-0", "lv-1"]):
+        acquire("lv-0")
+        with resourceFactories.bulk_activation("vg", ["lv-1", "lv-2"]):
+            acquire("lv-1")
+            acquire("lv-2")
+
+    assert lvchange_calls(activation_manager) == [
+        ("y", ["vg/lv-0", "vg/lv-1"]),
+        ("y", ["vg/lv-2"]),
+    ]
+
+
+def test_bulk_activation_deactivated_since(activation_manager):
+    with resourceFactories.bulk_activation("vg", ["lv-0", "lv-1"]):
+        acquire("lv-0")
+
+        # Another thread uses lv-1 and tears it down before we acquire it.
+        res = in_thread(acquire, "lv-1")
+        in_thread(res.release)
+        assert ("vg", "lv-1") not in activation_manager.active
+
+        # Acquiring lv-1 must activate it again.
+        acquire("lv-1")
+
+    assert ("vg", "lv-1") in activation_manager.active
+
+
+def test_bulk_activation_deactivate_unused(activation_manager):
+    activation_manager.active.add(("vg", "lv-2"))
+    with pytest.raises(RuntimeError):
+        with resourceFactories.bulk_activation(
+                "vg", ["lv-0", "lv-1", "lv-2"]):
+            # Preparing fails after lv-0 was acquired, and lv-0 is torn
+            # down.
+            acquire("lv-0").release()
+            raise RuntimeError("prepare failed")
+
+    # lv-1 was activated but never acquired, and lv-2 was active before,
+    # so only lv-1 should be deactivated.
+    assert lvchange_calls(activation_manager) == [
+        ("refresh", ["vg/lv-2"]),
+        ("y", ["vg/lv-0", "vg/lv-1"]),
+        ("n", ["vg/lv-0"]),
+        ("n", ["vg/lv-1"]),
+    ]
+    assert activation_manager.active == {("vg", "lv-2")}
+
+
+@pytest.mark.parametrize("lockType", [rm.SHARED, rm.EXCLUSIVE])
+def test_bulk_activation_unused_in_use(activation_manager, lockType):
+    with pytest.raises(RuntimeError):
+        with resourceFactories.bulk_activation("vg", ["lv-0", "lv-1"]):
+            acquire("lv-0").release()
+            # Another thread starts using lv-1 before the flow fails.
+            in_thread(acquire, "lv-1", lockType)
+            raise RuntimeError("prepare failed")
+
+    # lv-1 is held by the other consumer and must stay active.
+    assert activation_manager.active == {("vg", "lv-1")}
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("length", [1, 10, 30])
+def test_bulk_activation_benchmark(activation_manager, length):
+    # Simulate slow lvchange command.
+    activation_manager.delay = 0.01
+    chain = ["lv-%d" % i for i in range(length)]
+
+    start = time.monotonic()
+    resources = [acquire(lv) for lv in chain]
+    serial = time.monotonic() - start
+    serial_calls = len(lvchange_calls(activation_manager))
+
+    for res in resources:
+        res.release()
+    del activation_manager.calls[:]
+    start = time.monotonic()
+    with resourceFactories.bulk_activation("vg", chain):
+        resources = [acquire(lv) for lv in chain]
+    bulk = time.monotonic() - start
+    bulk_calls = len(lvchange_calls(activation_manager))
+
+    print("chain length: %d, serial: %.3f seconds (%d commands), "
+          "bulk: %.3f seconds (%d commands)"
+          % (length, serial, serial_calls, bulk, bulk_calls))
+
+    assert serial_calls == length
+    assert bulk_calls == 1
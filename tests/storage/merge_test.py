@@ -24,6 +24,8 @@ from __future__ import division
 from contextlib import contextmanager
 from collections import namedtuple
 
+import threading
+
 import pytest
 
 from _pytest.monkeypatch import MonkeyPatch
@@ -41,9 +43,11 @@ from storage.storagetestlib import (
 
 from . import qemuio
 
+from testlib import make_config
 from testlib import make_uuid
 
 from vdsm.common import cmdutils
+from vdsm.common import concurrent
 from vdsm.common.units import KiB, MiB, GiB
 from vdsm.storage import blockVolume
 from vdsm.storage import constants as sc
@@ -532,3 +536,121 @@ class TestFinalizeMerge:
         assert sync.sd_id == subchain.sd_id
         assert sync.img_id == subchain.img_id
         assert sync.vol_id == removed_vol_id
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_phases():
+    clock = FakeClock()
+    phases = merge.Phases(clock=clock)
+
+    with phases.phase("wait"):
+        clock.now += 1.0
+    with phases.phase("rebase"):
+        clock.now += 2.0
+        # Running phase reports the time since the phase started.
+        assert phases.info() == {"wait": 1.0, "rebase": 2.0}
+    with phases.phase("wait"):
+        clock.now += 0.5
+
+    assert phases.info() == {"wait": 1.5, "rebase": 2.0}
+    assert str(phases) == "wait=1.50 rebase=2.00"
+
+
+@pytest.fixture
+def domain_slots(monkeypatch):
+    monkeypatch.setattr(merge, "_slots", {})
+    monkeypatch.setattr(
+        merge, "config", make_config([("irs", "max_domain_merges", "1")]))
+
+
+def test_domain_slot_limit(domain_slots):
+    entered = threading.Event()
+    leave = threading.Event()
+    waiting = merge.Phases()
+
+    def hold_slot():
+        with merge.domain_slot("sd-1", merge.Phases()):
+            entered.set()
+            leave.wait(5)
+
+    t = concurrent.thread(hold_slot)
+    t.start()
+    try:
+        assert entered.wait(5)
+
+        # Waits until the running operation is done.
+        result = []
+
+        def wait_for_slot():
+            with merge.domain_slot("sd-1", waiting):
+                result.append(True)
+
+        w = concurrent.thread(wait_for_slot)
+        w.start()
+        w.join(0.2)
+        assert result == []
+    finally:
+        leave.set()
+        t.join()
+
+    w.join()
+    assert result == [True]
+    assert waiting.info()["wait"] > 0
+
+
+def test_domain_slot_other_domain(domain_slots):
+    entered = threading.Event()
+    leave = threading.Event()
+    result = []
+
+    def hold_slot():
+        with merge.domain_slot("sd-1", merge.Phases()):
+            entered.set()
+            leave.wait(5)
+
+    def wait_for_slot():
+        with merge.domain_slot("sd-1", merge.Phases()):
+            result.append("sd-1")
+
+    def merge_other_domain():
+        with merge.domain_slot("sd-2", merge.Phases()):
+            result.append("sd-2")
+
+    holder = concurrent.thread(hold_slot)
+    holder.start()
+    try:
+        assert entered.wait(5)
+
+        # Domain sd-1 is saturated, and another merge is waiting for it.
+        waiter = concurrent.thread(wait_for_slot)
+        waiter.start()
+
+        # A merge on domain sd-2 still runs.
+        other = concurrent.thread(merge_other_domain)
+        other.start()
+        other.join(5)
+        assert result == ["sd-2"]
+    finally:
+        leave.set()
+        holder.join()
+
+    waiter.join()
+    assert result == ["sd-2", "sd-1"]
+
+
+def test_domain_slot_unlimited(monkeypatch):
+    monkeypatch.setattr(
+        merge, "config", make_config([("irs", "max_domain_merges", "0")]))
+    phases = merge.Phases()
+    with merge.domain_slot("sd-1", phases):
+        with merge.domain_slot("sd-1", phases):
+            pass
+    assert phases.info() == {}
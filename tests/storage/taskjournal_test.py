@@ -0,0 +1,218 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import os
+import threading
+import time
+
+import pytest
+
+from vdsm.common import concurrent
+from vdsm.storage import outOfProcess as oop
+from vdsm.storage import taskjournal
+
+
+@pytest.fixture
+def store(tmpdir):
+    yield str(tmpdir)
+    oop.stop()
+
+
+def record(task_id, state="running"):
+    return {"id": task_id, "meta": {task_id + ".task": ["state = " + state]}}
+
+
+def segments(journal):
+    return sorted(n for n in os.listdir(journal.path)
+                  if n.endswith(taskjournal.SEGMENT_EXT))
+
+
+def test_load_empty(store):
+    assert taskjournal.load(store) == {}
+    # Loading must not create the journal.
+    assert os.listdir(store) == []
+
+
+def test_save_load(store):
+    journal = taskjournal.get(store)
+    journal.save(record("task-1"))
+    journal.save(record("task-2"))
+    journal.save(record("task-1", "finished"))
+
+    assert taskjournal.load(store) == {
+        "task-1": record("task-1", "finished"),
+        "task-2": record("task-2"),
+    }
+
+
+def test_remove(store):
+    journal = taskjournal.get(store)
+    journal.save(record("task-1"))
+    journal.save(record("task-2"))
+    journal.remove("task-1")
+
+    assert taskjournal.load(store) == {"task-2": record("task-2")}
+
+
+def test_load_replaces_journal(store):
+    journal = taskjournal.get(store)
+    taskjournal.load(store)
+    assert taskjournal.get(store) is not journal
+
+
+def test_append_to_existing_journal(store):
+    taskjournal.get(store).save(record("task-1"))
+
+    # Simulate another host using the journal.
+    other = taskjournal.Journal(store)
+    other.save(record("task-2"))
+
+    assert len(segments(other)) == 2
+    assert taskjournal.load(store) == {
+        "task-1": record("task-1"),
+        "task-2": record("task-2"),
+    }
+
+
+def test_incomplete_segment(store):
+    journal = taskjournal.get(store)
+    journal.save(record("task-1"))
+    journal.save(record("task-1", "finished"))
+
+    # Simulate interrupted write of the last segment.
+    last = os.path.join(journal.path, segments(journal)[-1])
+    with open(last, "rb+") as f:
+        data = f.read()
+        f.seek(0)
+        f.truncate()
+        f.write(data[:len(data) // 2])
+
+    assert taskjournal.load(store) == {"task-1": record("task-1")}
+
+
+def test_compact(store, monkeypatch):
+    monkeypatch.setattr(taskjournal, "COMPACT_SEGMENTS", 4)
+    journal = taskjournal.get(store)
+    for i in range(10):
+        journal.save(record("task-%d" % i))
+    for i in range(5):
+        journal.remove("task-%d" % i)
+
+    assert len(segments(journal)) < 4
+    assert taskjournal.load(store) == {
+        "task-%d" % i: record("task-%d" % i) for i in range(5, 10)
+    }
+
+
+def test_compact_ignores_old_segments(store, monkeypatch):
+    monkeypatch.setattr(taskjournal, "COMPACT_SEGMENTS", 3)
+    journal = taskjournal.get(store)
+    journal.save(record("task-1"))
+    first = os.path.join(journal.path, segments(journal)[0])
+    with open(first, "rb") as f:
+        data = f.read()
+
+    journal.remove("task-1")
+    journal.save(record("task-2"))
+
+    # Simulate failure to remove old segment during compaction.
+    with open(first, "wb") as f:
+        f.write(data)
+
+    assert taskjournal.load(store) == {"task-2": record("task-2")}
+
+
+def test_incomplete_snapshot(store):
+    journal = taskjournal.get(store)
+    for i in range(4):
+        journal.save(record("task-%d" % i))
+
+    old = {}
+    for name in segments(journal):
+        with open(os.path.join(journal.path, name), "rb") as f:
+            old[name] = f.read()
+
+    journal._compact()
+
+    # Simulate interrupted write of the snapshot; the old segments were not
+    # removed yet.
+    snapshot = os.path.join(journal.path, segments(journal)[-1])
+    with open(snapshot, "rb+") as f:
+        data = f.read()
+        f.seek(0)
+        f.truncate()
+        f.write(data[:len(data) // 2])
+    for name, data in old.items():
+        with open(os.path.join(journal.path, name), "wb") as f:
+            f.write(data)
+
+    assert taskjournal.load(store) == {
+        "task-%d" % i: record("task-%d" % i) for i in range(4)
+    }
+
+
+def test_group_commit(store, monkeypatch):
+    journal = taskjournal.get(store)
+    writes = []
+    write_segment = journal._write_segment
+
+    def slow_write_segment(records):
+        writes.append(len(records))
+        time.sleep(0.05)
+        write_segment(records)
+
+    monkeypatch.setattr(journal, "_write_segment", slow_write_segment)
+
+    start = threading.Event()
+
+    def save(task_id):
+        start.wait()
+        journal.save(record(task_id))
+
+    threads = []
+    for i in range(20):
+        t = concurrent.thread(save, args=("task-%d" % i,))
+        t.start()
+        threads.append(t)
+    start.set()
+    for t in threads:
+        t.join()
+
+    # All records were saved, using less writes.
+    assert sum(writes) == 20
+    assert len(writes) < 20
+    assert len(taskjournal.load(store)) == 20
+
+
+def test_write_error(store, monkeypatch):
+    journal = taskjournal.get(store)
+    journal.save(record("task-1"))
+
+    def fail(records):
+        raise OSError("fake error")
+
+    monkeypatch.setattr(journal, "_write_segment", fail)
+    with pytest.raises(OSError):
+        journal.save(record("task-1", "finished"))
+
+    assert taskjournal.load(store) == {"task-1": record("task-1")}
@@ -21,12 +21,21 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import logging
+import os
+import time
+
 from contextlib import contextmanager
 
+import pytest
+
 from vdsm.storage import outOfProcess as oop
 from vdsm.storage import task
+from vdsm.storage import taskjournal
 from vdsm.storage import taskManager
 
+from testlib import make_config
+
 from . storagetestlib import Callable
 
 
@@ -49,7 +58,10 @@ def task_manager(workers=1):
         oop.stop()
 
 
-def test_persistent_job(tmpdir, add_recovery):
+@pytest.mark.parametrize("journal", ["false", "true"])
+def test_persistent_job(tmpdir, monkeypatch, add_recovery, journal):
+    monkeypatch.setattr(
+        task, "config", make_config([("irs", "task_journal", journal)]))
     store = str(tmpdir)
     # Simulate SPM starting a persistent job and fencing out
     with task_manager() as tm:
@@ -65,6 +77,11 @@ def test_persistent_job(tmpdir, add_recovery):
         c.wait_until_running()
         assert "task-id" in tm.getAllTasks()
 
+        if journal == "true":
+            assert os.listdir(store) == [taskjournal.JOURNAL_DIR]
+        else:
+            assert os.listdir(store) == ["task-id"]
+
         # Prevent storing the state to simulate SPM fencing
         # with an unexpected shutdown
         t.store = None
@@ -146,3 +163,125 @@ def test_stop_clear_task(add_recovery):
         # Clear the task from the manager list
         tm.clearTask("task-id")
         assert "task-id" not in tm.getAllTasks()
+
+
+@contextmanager
+def task_registry(*tags):
+    """
+    Yield a task manager with unqueued tasks "task-N", tagged with tags.
+    """
+    tm = taskManager.TaskManager(tpSize=1, waitTimeout=0.05)
+    try:
+        for i, tag in enumerate(tags):
+            t = task.Task(id="task-%d" % i)
+            t.setTag(tag)
+            tm._addTask(t)
+        yield tm
+    finally:
+        tm.prepareForShutdown(wait=True)
+        tm.unloadTasks()
+
+
+def test_report_tag():
+    with task_registry("spm", "hsm", "spm") as tm:
+        assert set(tm.getAllTasksStatuses("spm")) == {"task-0", "task-2"}
+        assert set(tm.getAllTasksInfo("hsm")) == {"task-1"}
+        # Tags are matched as substrings.
+        assert set(tm.getAllTasksStatuses("sp")) == {"task-0", "task-2"}
+        assert set(tm.getAllTasksStatuses()) == {"task-0", "task-1", "task-2"}
+
+
+def test_report_updated_on_change():
+    with task_registry("spm", "spm") as tm:
+        statuses = tm.getAllTasksStatuses("spm")
+        details = tm.getAllTasks()
+        assert statuses["task-0"]["message"] == "Task is initializing"
+        assert details["task-0"]["state"] == "init"
+
+        t = tm._getTask("task-0")
+        t._updateState(task.State.preparing)
+        t._updateResult(0, "fake message", "")
+
+        statuses = tm.getAllTasksStatuses("spm")
+        assert statuses["task-0"]["message"] == "fake message"
+        details = tm.getAllTasks()
+        assert details["task-0"]["state"] == "preparing"
+        assert details["task-1"]["state"] == "init"
+
+
+def test_report_tag_changed():
+    with task_registry("spm", "spm") as tm:
+        assert set(tm.getAllTasksStatuses("spm")) == {"task-0", "task-1"}
+        tm._getTask("task-0").setTag("hsm")
+        assert set(tm.getAllTasksStatuses("spm")) == {"task-1"}
+        assert set(tm.getAllTasksStatuses("hsm")) == {"task-0"}
+
+
+def test_report_task_removed():
+    with task_registry("spm", "hsm") as tm:
+        assert set(tm.getAllTasksStatuses()) == {"task-0", "task-1"}
+        t = tm._getTask("task-0")
+        tm.unloadTasks("spm")
+        assert set(tm.getAllTasksStatuses()) == {"task-1"}
+        assert set(tm.getAllTasks()) == {"task-1"}
+
+        # Removed tasks are not indexed again.
+        t._updateState(task.State.preparing)
+        assert set(tm.getAllTasksStatuses()) == {"task-1"}
+
+
+def test_task_ids_by_state():
+    with task_registry("spm", "spm", "hsm") as tm:
+        tm._getTask("task-0")._updateState(task.State.preparing)
+        tm._getTask("task-2")._updateState(task.State.preparing)
+        assert tm.getTaskIDs(state=task.State.preparing) == {
+            "task-0", "task-2"}
+        assert tm.getTaskIDs("spm", task.State.preparing) == {"task-0"}
+        assert tm.getTaskIDs("spm", task.State.init) == {"task-1"}
+
+
+@pytest.fixture
+def info_logging():
+    # Logging every task status at debug level hides the actual work.
+    logger = logging.getLogger("storage.TaskManager")
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    yield
+    logger.setLevel(level)
+
+
+@pytest.mark.slow
+def test_report_benchmark(info_logging):
+    count = 10000
+    changes = 10
+    with task_registry(*(["spm"] * count)) as tm:
+        def poll_all():
+            # Previous implementation, getting status for every task.
+            return {taskID: tm.getTaskStatus(taskID)
+                    for taskID, t in list(tm._tasks.items())
+                    if "spm" in t.getTags()}
+
+        start = time.monotonic()
+        expected = poll_all()
+        poll_all_time = time.monotonic() - start
+
+        # Build the cache.
+        tm.getAllTasksStatuses("spm")
+
+        for i in range(changes):
+            tm._getTask("task-%d" % i)._updateState(task.State.preparing)
+        start = time.monotonic()
+        statuses = tm.getAllTasksStatuses("spm")
+        changed_time = time.monotonic() - start
+
+        start = time.monotonic()
+        tm.getAllTasksStatuses("spm")
+        unchanged_time = time.monotonic() - start
+
+        print("%d tasks: poll all %.6f seconds, cached with %d changes "
+              "%.6f seconds, cached without changes %.6f seconds"
+              % (count, poll_all_time, changes, changed_time, unchanged_time))
+
+        assert len(statuses) == count
+        assert statuses == poll_all()
+        assert statuses != expected
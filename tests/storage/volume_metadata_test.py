@@ -29,10 +29,12 @@ import pytest
 
 from testlib import make_uuid
 
+from vdsm.common import concurrent
 from vdsm.common.units import MiB, GiB, PiB
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import volume
+from vdsm.storage import volumemetadata
 
 from . constants import CLEARED_VOLUME_METADATA
 
@@ -427,3 +429,55 @@ class TestDictInterface:
         }
 
         assert md.dump() == expected
+
+
+class TestSnapshot:
+
+    def test_no_snapshot(self):
+        reads = []
+        for i in range(2):
+            volumemetadata.cached("key", lambda: reads.append(1) or i)
+        assert len(reads) == 2
+
+    def test_read_once(self):
+        reads = []
+        with volumemetadata.snapshot("verb"):
+            for i in range(2):
+                md = volumemetadata.cached(
+                    "key", lambda: reads.append(1) or i)
+                assert md == 0
+        assert len(reads) == 1
+
+    def test_invalidate(self):
+        with volumemetadata.snapshot("verb"):
+            assert volumemetadata.cached("key", lambda: 1) == 1
+            volumemetadata.invalidate("key")
+            assert volumemetadata.cached("key", lambda: 2) == 2
+
+    def test_invalidate_other_thread(self):
+        key = make_uuid()
+        with volumemetadata.snapshot("verb"):
+            assert volumemetadata.cached(key, lambda: 1) == 1
+            t = concurrent.thread(volumemetadata.invalidate, args=(key,))
+            t.start()
+            t.join()
+            assert volumemetadata.cached(key, lambda: 2) == 2
+
+    def test_nested(self):
+        with volumemetadata.snapshot("outer"):
+            assert volumemetadata.cached("key", lambda: 1) == 1
+            with volumemetadata.snapshot("inner"):
+                assert volumemetadata.cached("key", lambda: 2) == 1
+            assert volumemetadata.cached("key", lambda: 3) == 1
+
+    def test_scope_ends(self):
+        with volumemetadata.snapshot("verb"):
+            assert volumemetadata.cached("key", lambda: 1) == 1
+        assert volumemetadata.cached("key", lambda: 2) == 2
+
+    def test_count_reads(self):
+        verb = "verb-" + make_uuid()
+        with volumemetadata.snapshot(verb):
+            volumemetadata.count_read()
+            volumemetadata.count_read()
+        assert volumemetadata.reads()[verb] == 2
@@ -33,11 +33,13 @@ from storage.storagetestlib import (
 
 from testlib import recorded
 
+from vdsm.common import concurrent
 from vdsm.common.units import MiB
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import resourceManager as rm
 from vdsm.storage import volume
+from vdsm.storage import volumemetadata
 
 
 HOST_ID = 1
@@ -178,6 +180,40 @@ class TestVolumeManifest:
         # It should remain illegal after the operation
         assert sc.ILLEGAL_VOL == vol.getMetaParam(sc.LEGALITY)
 
+    def test_snapshot_read_once(self, vol):
+        vol.getMetadata = CountedInstanceMethod(vol.getMetadata)
+        with volumemetadata.snapshot("verb"):
+            assert vol.isLegal()
+            assert not vol.isFake()
+            assert vol.getCapacity() > 0
+            assert vol.getFormat() == sc.RAW_FORMAT
+            vol.getVolumeParams()
+        assert vol.getMetadata.nr_calls == 1
+
+    def test_snapshot_invalidated_on_write(self, vol):
+        with volumemetadata.snapshot("verb"):
+            assert vol.getDescription() == "fake volume"
+            vol.setDescription("description")
+            assert vol.getDescription() == "description"
+            with vol.operation():
+                assert not vol.isLegal()
+            assert vol.isLegal()
+
+    def test_snapshot_invalidated_by_other_thread(self, vol):
+        with volumemetadata.snapshot("verb"):
+            assert vol.isLegal()
+            t = concurrent.thread(vol.setLegality, args=(sc.ILLEGAL_VOL,))
+            t.start()
+            t.join()
+            assert not vol.isLegal()
+
+    def test_snapshot_count_reads(self, vol):
+        verb = "getVolumeInfo-" + vol.volUUID
+        with volumemetadata.snapshot(verb):
+            vol.getLegality()
+            vol.getCapacity()
+        assert volumemetadata.reads()[verb] == 1
+
     def test_operation_modifying_metadata(self, vol):
         with vol.operation(requested_gen=0, set_illegal=False):
             vol.setMetaParam(sc.DESCRIPTION, "description")
@@ -30,6 +30,7 @@ import timeit
 import pytest
 
 from vdsm import utils
+from vdsm.common.time import monotonic_time
 from vdsm.common.units import GiB
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
@@ -105,6 +106,21 @@ class TemporaryVolume(object):
                     block.write_record(recnum, record)
                     block.dump(self.backend)
 
+    def fill_index(self, count):
+        """
+        Write count lease records to volume index area, returning the lease
+        ids.
+        """
+        lease_ids = [make_uuid() for i in range(count)]
+        index = xlease.VolumeIndex(self.alignment, self.block_size)
+        with utils.closing(index):
+            index.load(self.backend)
+            for recnum, lease_id in enumerate(lease_ids):
+                offset = xlease.lease_offset(recnum, self.alignment)
+                index.write_record(recnum, xlease.Record(lease_id, offset))
+            index.dump(self.backend)
+        return lease_ids
+
     def zero_storage(self):
         # TODO: suport block storage.
         with io.open(self.path, "wb") as f:
@@ -618,6 +634,104 @@ def bench():
               % (count, elapsed, elapsed / count))
 
 
+class TestIndexCache:
+
+    def cached_volume(self, tmp_vol, cache):
+        return xlease.LeasesVolume(
+            tmp_vol.backend,
+            alignment=tmp_vol.alignment,
+            block_size=tmp_vol.block_size,
+            cache=cache)
+
+    def create_cache(self, tmp_vol):
+        return xlease.IndexCache(
+            alignment=tmp_vol.alignment,
+            block_size=tmp_vol.block_size)
+
+    def test_reuse_index(self, tmp_vol, fake_sanlock):
+        cache = self.create_cache(tmp_vol)
+        with utils.closing(cache):
+            with utils.closing(self.cached_volume(tmp_vol, cache)) as vol:
+                lease = vol.add(make_uuid())
+            with utils.closing(self.cached_volume(tmp_vol, cache)) as vol:
+                assert vol.lookup(lease.resource) == lease
+            assert cache.loads == 1
+
+    def test_modified_on_storage(self, tmp_vol, fake_sanlock):
+        cache = self.create_cache(tmp_vol)
+        with utils.closing(cache):
+            with utils.closing(self.cached_volume(tmp_vol, cache)):
+                pass
+
+            # Simulate another host adding a lease.
+            vol = xlease.LeasesVolume(
+                tmp_vol.backend,
+                alignment=tmp_vol.alignment,
+                block_size=tmp_vol.block_size)
+            with utils.closing(vol):
+                lease = vol.add(make_uuid())
+
+            with utils.closing(self.cached_volume(tmp_vol, cache)) as vol:
+                assert cache.loads == 2
+                assert vol.lookup(lease.resource) == lease
+
+    def test_lookup_reloads_missing(self, tmp_vol):
+        cache = self.create_cache(tmp_vol)
+        with utils.closing(cache):
+            with utils.closing(self.cached_volume(tmp_vol, cache)) as vol:
+                # Record added without modifying the index metadata.
+                lease_id = tmp_vol.fill_index(1)[0]
+                lease = vol.lookup(lease_id)
+                assert lease.offset == xlease.lease_offset(
+                    0, tmp_vol.alignment)
+                assert cache.loads == 2
+
+                with pytest.raises(se.NoSuchLease):
+                    vol.lookup(make_uuid())
+
+    def test_mtime_increases(self, tmp_vol, fake_sanlock, monkeypatch):
+        monkeypatch.setattr("time.time", lambda: 123456789)
+        tmp_vol.format_index()
+        cache = self.create_cache(tmp_vol)
+        with utils.closing(cache):
+            with utils.closing(self.cached_volume(tmp_vol, cache)) as vol:
+                lease = vol.add(make_uuid())
+                assert vol.mtime == 123456790
+                vol.remove(lease.resource)
+                assert vol.mtime == 123456791
+
+    def test_add_after_remove(self, tmp_vol, fake_sanlock):
+        cache = self.create_cache(tmp_vol)
+        with utils.closing(cache):
+            with utils.closing(self.cached_volume(tmp_vol, cache)) as vol:
+                first = vol.add(make_uuid())
+                second = vol.add(make_uuid())
+                vol.remove(first.resource)
+                third = vol.add(make_uuid())
+                assert third.offset == first.offset
+                assert vol.lookup(second.resource) == second
+                with pytest.raises(se.NoSuchLease):
+                    vol.lookup(first.resource)
+
+    @pytest.mark.slow
+    def test_time_lookup(self, tmp_vol):
+        # The index cannot hold more than MAX_RECORDS leases; fill it and
+        # look up random leases.
+        lease_ids = tmp_vol.fill_index(xlease.MAX_RECORDS)
+        cache = self.create_cache(tmp_vol)
+        count = 10000
+        with utils.closing(cache):
+            start = monotonic_time()
+            for i in range(count):
+                vol = self.cached_volume(tmp_vol, cache)
+                with utils.closing(vol):
+                    vol.lookup(lease_ids[i % len(lease_ids)])
+            elapsed = monotonic_time() - start
+        assert cache.loads == 1
+        print("%d cached lookups in %.6f seconds (%.6f seconds per lookup)"
+              % (count, elapsed, elapsed / count))
+
+
 @pytest.fixture(params=[
     xlease.DirectFile,
     xlease.InterruptibleDirectFile,
@@ -20,9 +20,11 @@
 
 from __future__ import absolute_import
 from __future__ import division
+from __future__ import print_function
 
 import json
 import logging
+import timeit
 import yaml
 
 from io import StringIO
@@ -37,6 +39,7 @@ from yajsonrpc.exception import JsonRpcErrorBase
 
 from testlib import mock
 from testlib import VdsmTestCase as TestCaseBase
+from testValidation import slowtest
 from testValidation import xfail
 
 try:
@@ -670,6 +673,96 @@ class DataVerificationTests(TestCaseBase):
             'VM', 'getStats'), json.dumps(complex_type, indent=4))
 
 
+@attr(type='unit')
+class CompiledSchemaTests(TestCaseBase):
+
+    def test_arg_names(self):
+        rep = vdsmapi.MethodRep('VM', 'getStats')
+        self.assertEqual(_schema.get_arg_names(rep), ('vmID',))
+        self.assertIs(_schema.get_arg_names(rep), _schema.get_arg_names(rep))
+
+    def test_default_args(self):
+        rep = vdsmapi.MethodRep('Host', 'getVMList')
+        self.assertEqual(_schema.get_default_arg_names(rep),
+                         frozenset(['fullStatus', 'vmList', 'onlyUUID']))
+        self.assertEqual(len(_schema.get_default_arg_values(rep)), 3)
+
+    def test_methods_read_only(self):
+        with self.assertRaises(TypeError):
+            _schema.get_methods['Namespace.Method'] = {}
+        self.assertIn('Host.getCapabilities', _schema.get_methods)
+
+    def test_validator_cached(self):
+        rep = vdsmapi.MethodRep('Host', 'getCapabilities')
+        ret_type = _schema.get_ret_param(rep).get('type')
+        self.assertIs(_schema._validator(ret_type),
+                      _schema._validator(ret_type))
+
+    def test_union_invalid_value_not_reached(self):
+        schema = FakeSchema.with_types(
+            """
+            First: &First
+                name: First
+                properties:
+                -   name: first
+                    type: string
+            Second: &Second
+                name: Second
+            Union: &Union
+                name: Union
+                type: union
+                values:
+                - *First
+                - *Second
+            """,
+            """
+            -   name: union
+                type: *Union
+            """)
+        with mock.patch.object(vdsmapi, '_log_inconsistency') as log:
+            schema.verify_args(FakeSchema.METHOD_REP,
+                               {'union': {'first': 'value'}})
+            self.assertFalse(log.called)
+
+            schema.verify_args(FakeSchema.METHOD_REP,
+                               {'union': {'second': 'value'}})
+            self.assertIn('Unexpected issue', log.call_args[0][1])
+
+    @slowtest
+    def test_benchmark_load(self):
+        count = 10
+        elapsed = timeit.timeit(
+            lambda: vdsmapi.Schema.vdsm_api(strict_mode=True,
+                                            with_gluster=_glusterEnabled),
+            number=count)
+        print("%.6f seconds (%.6f per load)" % (elapsed, elapsed / count))
+
+    @slowtest
+    def test_benchmark_verify(self):
+        # Verifying the first call compiles the validators.
+        schema = vdsmapi.Schema.vdsm_api(strict_mode=True)
+        rep = vdsmapi.MethodRep('Host', 'fenceNode')
+        params = {u"addr": u"rack05-pdu01-lab4.tlv.redhat.com",
+                  u"port": 54321,
+                  u"agent": u"apc_snmp",
+                  u"username": u"emesika",
+                  u"password": u"pass",
+                  u"action": u"off",
+                  u"options": u"port=15"}
+        ret = {u'power': u'on'}
+
+        def verify():
+            schema.verify_args(rep, params)
+            schema.verify_retval(rep, ret)
+
+        elapsed = timeit.timeit(verify, number=1)
+        print("first call: %.6f seconds" % elapsed)
+
+        count = 10000
+        elapsed = timeit.timeit(verify, number=count)
+        print("%.6f seconds (%.6f per call)" % (elapsed, elapsed / count))
+
+
 @attr(type='unit')
 class SchemaTypeTest(TestCaseBase):
 
@@ -36,7 +36,8 @@ from testlib import VdsmTestCase as TestCaseBase
 from testlib import recorded
 
 
-CacheSample = collections.namedtuple('CacheSample', ['stats', 'timestamp'])
+CacheSample = collections.namedtuple(
+    'CacheSample', ['stats', 'timestamp', 'stats_types'])
 
 
 class TestVMBulkSampling(TestCaseBase):
@@ -159,6 +160,25 @@ class TestVMBulkSampling(TestCaseBase):
 
         self.assertCallSequence(conn.__calls__, expected)
 
+    def test_collect_separate_group(self):
+        vms = make_vms(num=3)
+        conn = FakeConnection(vms=vms)
+        cache = FakeStatsCache()
+
+        sampler = sampling.VMBulkstatsMonitor(
+            conn, conn.getVMs, cache,
+            stats_types=sampling.BULK_STATS_DEVICES,
+            name="devices", separate=True)
+
+        with cache.await_completion(self.CALL_TIMEOUT):
+            self.exc.dispatch(sampler, self.CALL_TIMEOUT)
+
+        self.assertEqual(conn.__calls__[0][0], 'getAllDomainStats')
+        self.assertEqual(conn.__calls__[0][2]['stats'],
+                         sampling.BULK_STATS_DEVICES)
+        self.assertEqual(cache.data[0].stats_types,
+                         sampling.BULK_STATS_DEVICES)
+
     def assertCallSequence(self, actual_calls, expected_calls):
         for actual, expected in zip(actual_calls, expected_calls):
             # we don't care about the arguments
@@ -174,8 +194,8 @@ class FakeStatsCache(object):
         self.expected = 1
         self._count = 0
 
-    def put(self, bulk_stats, timestamp):
-        self.data.append(CacheSample(bulk_stats, timestamp))
+    def put(self, bulk_stats, timestamp, stats_types=None):
+        self.data.append(CacheSample(bulk_stats, timestamp, stats_types))
         self._count += 1
         if self._count >= self.expected:
             self.sync.set()
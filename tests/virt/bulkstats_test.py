@@ -0,0 +1,193 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import gc
+import itertools
+import logging
+
+import pytest
+
+from vdsm.common.time import monotonic_time
+from vdsm.virt import bulkstats
+from vdsm.virt import sampling
+
+log = logging.getLogger("test")
+
+_BLOCK_FIELDS = (
+    "rd.reqs", "rd.bytes", "rd.times", "wr.reqs", "wr.bytes", "wr.times",
+    "fl.reqs", "fl.times", "allocation", "capacity", "physical",
+    "threshold", "backingIndex", "errors", "wr.highest", "rd.ops",
+    "wr.ops",
+)
+
+_NET_FIELDS = (
+    "rx.bytes", "rx.pkts", "rx.errs", "rx.drop", "tx.bytes", "tx.pkts",
+    "tx.errs", "tx.drop",
+)
+
+_counter = itertools.count(1000)
+
+
+def make_stats(disks=2, nics=1):
+    """
+    Return bulk stats like libvirt, with new keys and values.
+    """
+    stats = {
+        "state.state": 1,
+        "state.reason": 1,
+        "cpu.time": next(_counter),
+        "cpu.user": next(_counter),
+        "cpu.system": next(_counter),
+        "balloon.current": 4194304,
+        "balloon.maximum": 4194304,
+        "vcpu.current": 2,
+        "vcpu.maximum": 16,
+        "block.count": disks,
+        "net.count": nics,
+    }
+    for i in range(disks):
+        stats["block.%d.name" % i] = "vd" + chr(ord("a") + i % 26)
+        stats["block.%d.path" % i] = "/rhev/data-center/mnt/%d" % i
+        for field in _BLOCK_FIELDS:
+            stats["block.%d.%s" % (i, field)] = next(_counter)
+    for i in range(nics):
+        stats["net.%d.name" % i] = "vnet%d" % i
+        for field in _NET_FIELDS:
+            stats["net.%d.%s" % (i, field)] = next(_counter)
+    return stats
+
+
+def test_pack():
+    stats = make_stats()
+    packed = bulkstats.pack(stats)
+    assert isinstance(packed, bulkstats.Stats)
+    assert packed == stats
+    assert sorted(packed) == sorted(stats)
+    assert len(packed) == len(stats)
+
+
+def test_get():
+    stats = make_stats()
+    packed = bulkstats.pack(stats)
+    assert packed["block.1.name"] == "vdb"
+    assert packed["block.1.rd.bytes"] == stats["block.1.rd.bytes"]
+    assert packed.get("block.2.name") is None
+    assert packed.get("block.count", 0) == 2
+    assert "net.0.name" in packed
+    assert "net.1.name" not in packed
+    with pytest.raises(KeyError):
+        packed["net.1.name"]
+
+
+def test_negative_value():
+    packed = bulkstats.pack({"vcpu.current": -1})
+    assert packed["vcpu.current"] == -1
+
+
+def test_other_values():
+    stats = {"cpu.time": 42, "cpu.cache.monitor": 1.5, "block.0.ok": True}
+    packed = bulkstats.pack(stats)
+    assert packed == stats
+    assert packed["block.0.ok"] is True
+
+
+def test_value_too_large():
+    stats = {"cpu.time": 2**64}
+    assert bulkstats.pack(stats) is stats
+
+
+def test_value_type_changed():
+    first = bulkstats.pack({"block.0.name": "vda", "block.count": 1})
+    stats = {"block.0.name": "vda", "block.count": "x"}
+    assert bulkstats.pack(stats) is stats
+    assert first["block.count"] == 1
+
+
+def test_schema_shared():
+    a = bulkstats.pack(make_stats(disks=4))
+    b = bulkstats.pack(make_stats(disks=4))
+    c = bulkstats.pack(make_stats(disks=5))
+    assert a._schema is b._schema
+    assert a._schema is not c._schema
+
+
+def test_schema_dropped():
+    packed = bulkstats.pack(make_stats(disks=7))
+    keys = packed._schema.keys
+    del packed
+    gc.collect()
+    assert keys not in bulkstats._schemas
+
+
+def test_keys_interned():
+    a = bulkstats.pack(make_stats(disks=1))
+    b = bulkstats.pack(make_stats(disks=2))
+    assert list(a)[0] is list(b)[0]
+
+
+def test_merge():
+    # StatsCache merges separately sampled groups using dict().
+    first = bulkstats.pack({"cpu.time": 1})
+    merged = dict(first)
+    merged.update(bulkstats.pack({"block.count": 1}))
+    assert merged == {"cpu.time": 1, "block.count": 1}
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("packed", [False, True])
+def test_memory_benchmark(packed):
+    tracemalloc = pytest.importorskip("tracemalloc")
+    vms, disks, nics = 500, 10, 2
+    cache = sampling.StatsCache()
+
+    def sample():
+        bulk = {}
+        for i in range(vms):
+            stats = make_stats(disks=disks, nics=nics)
+            bulk["vm-%d" % i] = bulkstats.pack(stats) if packed else stats
+        return bulk
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        # StatsCache keeps the last 2 samples.
+        for i in range(3):
+            cache.put(sample(), cache.clock())
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    log.info("%d vms, %d disks, %d nics, packed=%s: retained %.2f MiB, "
+             "peak %.2f MiB",
+             vms, disks, nics, packed, current / 1024**2, peak / 1024**2)
+
+
+@pytest.mark.slow
+def test_pack_benchmark():
+    samples = [make_stats(disks=10, nics=2) for i in range(500)]
+    start = monotonic_time()
+    for stats in samples:
+        bulkstats.pack(stats)
+    elapsed = monotonic_time() - start
+    log.info("Packed %d samples in %.3f seconds", len(samples), elapsed)
@@ -0,0 +1,252 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301  USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import threading
+
+import pytest
+
+from vdsm.common.units import MiB, GiB
+from vdsm.virt import migrationscheduler
+
+
+class FakeJob(object):
+    """
+    Simulate migration of a VM with constant dirty rate.
+    """
+
+    def __init__(self, name, memory, dirty_rate=None, priority=0,
+                 max_bandwidth=1000):
+        self.name = name
+        self.priority = priority
+        self.memory = memory
+        self.max_bandwidth = max_bandwidth
+        self.bandwidth = None
+        self.remaining = memory
+        self.finished = None
+        self._dirty_rate = dirty_rate
+
+    def dirty_rate(self):
+        return self._dirty_rate
+
+    def set_bandwidth(self, bandwidth):
+        self.bandwidth = bandwidth
+
+    def tick(self, seconds):
+        """
+        Transfer data for seconds, returning True if the migration
+        converged.
+        """
+        transferred = self.bandwidth * MiB * seconds
+        self.remaining -= transferred
+        # Memory dirtied during the transfer must be sent again, but we
+        # cannot have more remaining data than memory.
+        self.remaining += min(transferred, (self._dirty_rate or 0) * seconds)
+        self.remaining = min(self.remaining, self.memory)
+        # Assume we can complete the migration with 1 second downtime.
+        return self.remaining <= self.bandwidth * MiB
+
+    def __repr__(self):
+        return self.name
+
+
+def simulate(jobs, scheduler, max_time=3600):
+    """
+    Simulate evacuation of a host, returning the time when all migrations
+    completed, or None if some migrations did not complete in max_time.
+    """
+    waiting = list(jobs)
+    now = 0
+    while now < max_time:
+        # Start migrations in scheduling order, without blocking.
+        for job in sorted(waiting, key=lambda j: (-j.priority, j.memory)):
+            if len(scheduler.active()) < scheduler.bound:
+                assert scheduler.acquire(job)
+                waiting.remove(job)
+        if not waiting and not scheduler.active():
+            return now
+        now += 1
+        for job in scheduler.active():
+            if job.tick(1):
+                job.finished = now
+                scheduler.release(job)
+    return None
+
+
+def evacuation_jobs():
+    return [
+        FakeJob("idle-large", 16 * GiB, dirty_rate=10 * MiB),
+        FakeJob("busy-small", 4 * GiB, dirty_rate=300 * MiB),
+        FakeJob("busy-medium", 8 * GiB, dirty_rate=250 * MiB),
+        FakeJob("idle-small", 2 * GiB, dirty_rate=5 * MiB),
+        FakeJob("busy-large", 16 * GiB, dirty_rate=200 * MiB),
+        FakeJob("idle-medium", 8 * GiB, dirty_rate=20 * MiB),
+    ]
+
+
+class TestSimulation:
+
+    def even_split_time(self, bound):
+        # Without the scheduler splitting the bandwidth, the link bandwidth
+        # is shared evenly by the active migrations.
+        class EvenJob(FakeJob):
+            def tick(self, seconds):
+                self.bandwidth = 1000 // len(scheduler.active())
+                return FakeJob.tick(self, seconds)
+
+        scheduler = migrationscheduler.Scheduler(bound, total_bandwidth=None)
+        jobs = [EvenJob(j.name, j.memory, j.dirty_rate())
+                for j in evacuation_jobs()]
+        return simulate(jobs, scheduler)
+
+    @pytest.mark.parametrize("bound", [2, 6])
+    def test_faster_than_even_split(self, bound):
+        # Link of 1000 MiB/s.
+        scheduler = migrationscheduler.Scheduler(bound, total_bandwidth=1000)
+        split_time = simulate(evacuation_jobs(), scheduler)
+        even_time = self.even_split_time(bound)
+        assert split_time is not None
+        assert even_time is None or split_time < even_time
+
+    def test_smaller_first(self):
+        scheduler = migrationscheduler.Scheduler(1, total_bandwidth=1000)
+        jobs = evacuation_jobs()
+        simulate(jobs, scheduler)
+        finished = sorted(jobs, key=lambda j: j.finished)
+        assert [j.memory for j in finished] == sorted(j.memory for j in jobs)
+
+    def test_priority_first(self):
+        scheduler = migrationscheduler.Scheduler(1, total_bandwidth=1000)
+        jobs = evacuation_jobs()
+        jobs[-1].priority = 1
+        simulate(jobs, scheduler)
+        first = min(jobs, key=lambda j: j.finished)
+        assert first is jobs[-1]
+
+
+class TestAllocate:
+
+    def test_no_jobs(self):
+        assert migrationscheduler.allocate([], 1000) == {}
+
+    def test_unlimited(self):
+        jobs = [FakeJob("a", GiB, max_bandwidth=52),
+                FakeJob("b", GiB, max_bandwidth=100)]
+        alloc = migrationscheduler.allocate(jobs, None)
+        assert alloc == {jobs[0]: 52, jobs[1]: 100}
+
+    def test_even_split(self):
+        jobs = [FakeJob("a", GiB), FakeJob("b", GiB)]
+        alloc = migrationscheduler.allocate(jobs, 1000)
+        assert alloc == {jobs[0]: 500, jobs[1]: 500}
+
+    def test_capped(self):
+        jobs = [FakeJob("a", GiB, max_bandwidth=100), FakeJob("b", GiB)]
+        alloc = migrationscheduler.allocate(jobs, 1000)
+        assert alloc == {jobs[0]: 100, jobs[1]: 900}
+
+    def test_converge_first(self):
+        # Not enough bandwidth for both, the first job gets enough
+        # bandwidth to converge.
+        jobs = [FakeJob("a", GiB, dirty_rate=600 * MiB),
+                FakeJob("b", GiB, dirty_rate=600 * MiB)]
+        alloc = migrationscheduler.allocate(jobs, 1000)
+        assert alloc[jobs[0]] > 600 * migrationscheduler.CONVERGENCE_MARGIN
+        assert sum(alloc.values()) == 1000
+
+    def test_minimum(self):
+        jobs = [FakeJob("a", GiB, dirty_rate=2000 * MiB),
+                FakeJob("b", GiB)]
+        alloc = migrationscheduler.allocate(jobs, 1000)
+        assert alloc[jobs[1]] == migrationscheduler.MIN_BANDWIDTH
+        assert sum(alloc.values()) == 1000
+
+
+class TestScheduler:
+
+    def test_release_rebalance(self):
+        scheduler = migrationscheduler.Scheduler(2, total_bandwidth=1000)
+        a = FakeJob("a", GiB)
+        b = FakeJob("b", GiB)
+        scheduler.acquire(a)
+        assert a.bandwidth == 1000
+        scheduler.acquire(b)
+        assert a.bandwidth == 500
+        assert b.bandwidth == 500
+        scheduler.release(a)
+        assert b.bandwidth == 1000
+
+    def test_wait_order(self):
+        scheduler = migrationscheduler.Scheduler(1, total_bandwidth=1000)
+        first = FakeJob("first", GiB)
+        scheduler.acquire(first)
+
+        started = []
+        large = FakeJob("large", 8 * GiB)
+        small = FakeJob("small", 2 * GiB)
+        threads = []
+        for job in large, small:
+            t = threading.Thread(
+                target=lambda j=job: (scheduler.acquire(j), started.append(j)))
+            t.start()
+            threads.append(t)
+
+        wait_for(lambda: len(scheduler.waiting()) == 2)
+        assert scheduler.waiting() == [small, large]
+
+        scheduler.release(first)
+        wait_for(lambda: started == [small])
+        scheduler.release(small)
+        wait_for(lambda: started == [small, large])
+        scheduler.release(large)
+
+        for t in threads:
+            t.join()
+
+    def test_canceled(self):
+        scheduler = migrationscheduler.Scheduler(1, total_bandwidth=1000)
+        scheduler.acquire(FakeJob("a", GiB))
+        canceled = threading.Event()
+        canceled.set()
+        assert not scheduler.acquire(FakeJob("b", GiB), canceled)
+        assert scheduler.waiting() == []
+
+    def test_bound_increase(self):
+        scheduler = migrationscheduler.Scheduler(1, total_bandwidth=1000)
+        scheduler.acquire(FakeJob("a", GiB))
+        b = FakeJob("b", GiB)
+        t = threading.Thread(target=scheduler.acquire, args=(b,))
+        t.start()
+        wait_for(lambda: scheduler.waiting() == [b])
+        scheduler.bound = 2
+        t.join()
+        assert len(scheduler.active()) == 2
+
+
+def wait_for(predicate, timeout=5):
+    event = threading.Event()
+    for i in range(timeout * 100):
+        if predicate():
+            return
+        event.wait(0.01)
+    pytest.fail("Timeout waiting for condition")
@@ -30,9 +30,11 @@ from vdsm import executor
 from vdsm import schedule
 from vdsm import throttledlog
 from vdsm.common import exception
+from vdsm.common import libvirtconnection
 from vdsm.common.time import monotonic_time
 from vdsm.virt import migration
 from vdsm.virt import periodic
+from vdsm.virt import sampling
 from vdsm.virt import vmstatus
 
 
@@ -54,6 +56,46 @@ class TimeoutTests(TestCaseBase):
         self.assertTrue(periodic._timeout_from(interval) <= interval)
 
 
+@expandPermutations
+class BulkStatsOperationsTests(TestCaseBase):
+
+    @permutations([
+        # devices_interval
+        ('0',),
+        ('15',),
+    ])
+    def test_single_group(self, devices_interval):
+        ops = self._operations(devices_interval)
+        self.assertEqual(len(ops), 1)
+        self.assertEqual(ops[0]._period, 15)
+        self.assertEqual(ops[0]._func._stats_types,
+                         sampling.BULK_STATS_TYPES)
+        self.assertFalse(ops[0]._func._separate)
+
+    def test_separate_devices(self):
+        ops = self._operations('60')
+        self.assertEqual(len(ops), 2)
+        main, devices = ops
+        self.assertEqual(main._period, 15)
+        self.assertEqual(main._func._stats_types, sampling.BULK_STATS_MAIN)
+        self.assertFalse(main._func._separate)
+        self.assertEqual(devices._period, 60)
+        self.assertEqual(devices._func._stats_types,
+                         sampling.BULK_STATS_DEVICES)
+        self.assertTrue(devices._func._separate)
+
+    def _operations(self, devices_interval):
+        cfg = make_config([
+            ('vars', 'vm_sample_interval', '15'),
+            ('vars', 'vm_sample_devices_interval', devices_interval),
+        ])
+        with MonkeyPatchScope([
+            (periodic, 'config', cfg),
+            (libvirtconnection, 'get', lambda cif: None),
+        ]):
+            return periodic._bulk_stats_operations(fake.ClientIF(), None)
+
+
 class _PeriodicBase(TestCaseBase):
 
     def setUp(self):
@@ -432,6 +474,108 @@ class VmDispatcherTests(TestCaseBase):
         self.assertEqual(set(skipped),
                          set(self.cif.getVMs().keys()))
 
+    def test_skip_pending(self):
+        exc = _QueueingExecutor()
+        op = periodic.VmDispatcher(self.cif.getVMs, exc, _Visitor, 0)
+
+        self.assertEqual(op(), [])
+        self.assertEqual(len(exc.tasks), VM_NUM)
+
+        # Previous runs did not complete yet.
+        skipped = op()
+        self.assertEqual(set(skipped), set(self.cif.getVMs()))
+        self.assertEqual(op.stats()["skipped"], {op.PENDING: VM_NUM})
+        self.assertEqual(op.stats()["pending"], VM_NUM)
+
+        exc.run()
+        self.assertEqual(op(), [])
+        self.assertEqual(len(exc.tasks), VM_NUM)
+
+    def test_executor_full(self):
+        exc = _QueueingExecutor(max_tasks=3)
+        op = periodic.VmDispatcher(self.cif.getVMs, exc, _Visitor, 0)
+
+        skipped = op()
+        self.assertEqual(len(skipped), VM_NUM - 3)
+        # Stop dispatching after the executor is full.
+        self.assertEqual(exc.attempts, 4)
+        self.assertEqual(op.stats()["skipped"],
+                         {op.EXECUTOR_FULL: VM_NUM - 3})
+
+        # VMs skipped are dispatched first in the next call.
+        exc.run()
+        op()
+        dispatched = [task._state for task in exc.tasks]
+        skipped_states = [op._vms[vm_id] for vm_id in skipped]
+        self.assertEqual(dispatched[:len(skipped)], skipped_states)
+
+    def test_slots(self):
+        clock = FakeClock()
+        exc = _QueueingExecutor()
+        op = periodic.VmDispatcher(
+            self.cif.getVMs, exc, _Visitor, 0, period=10, slots=2,
+            clock=clock)
+
+        # New VMs are dispatched immediately.
+        op()
+        self.assertEqual(len(exc.tasks), VM_NUM)
+        exc.run()
+
+        # Every VM runs once per period, in its slot.
+        dispatched = []
+        for i in range(4):
+            clock.now += 5
+            op()
+            dispatched.append(len(exc.tasks))
+            exc.run()
+
+        self.assertEqual(sum(dispatched), VM_NUM * 2)
+        self.assertTrue(all(0 < n < VM_NUM for n in dispatched))
+
+    def test_slot_missed(self):
+        clock = FakeClock()
+        exc = _QueueingExecutor()
+        op = periodic.VmDispatcher(
+            self.cif.getVMs, exc, _Visitor, 0, period=10, slots=2,
+            clock=clock)
+
+        op()
+        exc.run()
+        clock.now += 5
+        op()
+        exc.run()
+        clock.now += 5
+        # Executor is full, VMs in this slot miss it.
+        exc.max_tasks = 0
+        op()
+        exc.max_tasks = None
+
+        # The VMs missing their slot are dispatched in the next slot.
+        clock.now += 5
+        op()
+        self.assertEqual(len(exc.tasks), VM_NUM)
+
+    def test_remove_vm(self):
+        exc = _QueueingExecutor()
+        op = periodic.VmDispatcher(self.cif.getVMs, exc, _Visitor, 0)
+        op()
+        with self.cif.vm_container_lock:
+            del self.cif.vmContainer[_fake_vm_id(0)]
+        exc.run()
+        op()
+        self.assertEqual(op.stats()["vms"], VM_NUM - 1)
+        self.assertNotIn(_fake_vm_id(0), op._vms)
+
+    def test_latency(self):
+        clock = FakeClock()
+        exc = _QueueingExecutor()
+        op = periodic.VmDispatcher(
+            self.cif.getVMs, exc, _Visitor, 0, clock=clock)
+        op()
+        clock.now += 3
+        exc.run()
+        self.assertEqual(op.stats()["max_latency"], 3)
+
     def _check_dispatching(self, skip_ids):
         op = periodic.VmDispatcher(
             self.cif.getVMs, _FakeExecutor(), _Visitor, 0)
@@ -520,6 +664,37 @@ class _RecoveringExecutor(object):
         )
 
 
+class _QueueingExecutor(object):
+    """
+    Keep dispatched tasks until run() is called.
+    """
+
+    def __init__(self, max_tasks=None):
+        self.max_tasks = max_tasks
+        self.attempts = 0
+        self.tasks = []
+
+    def dispatch(self, func, timeout, discard=True):
+        self.attempts += 1
+        if self.max_tasks is not None and len(self.tasks) >= self.max_tasks:
+            raise exception.ResourceExhausted(resource="test", current_tasks=0)
+        self.tasks.append(func)
+
+    def run(self):
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            task()
+
+
+class FakeClock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
 class _FakeExecutor(object):
 
     def __init__(self, fail=False, max_attempts=None):
@@ -146,6 +146,12 @@ class FakeVM(object):
     def id(self):
         return "00000000-0000-0000-0000-000000000001"
 
+    def isDomainReadyForCommands(self):
+        return True
+
+    def isMigrating(self):
+        return False
+
 
 @MonkeyClass(libvirt_qemu, "qemuAgentCommand", _fake_qemuAgentCommand)
 @MonkeyClass(qemuguestagent, 'config', make_config([
@@ -305,3 +311,99 @@ class QemuGuestAgentTests(TestCaseBase):
                 'inet6': ['fe80::5054:ff:feed:9976'],
                 'name': 'ens2'
             })
+
+    def test_failure_backoff(self):
+        def _qga_command_fail(*args, **kwargs):
+            raise libvirt.libvirtError("Some error!")
+
+        clock = FakeClock(1000)
+        with MonkeyPatchScope([
+                (libvirt_qemu, "qemuAgentCommand", _qga_command_fail),
+                (qemuguestagent, "monotonic_time", clock)]):
+            self.assertTrue(self.qga_poller.agent_available(self.vm.id))
+            intervals = []
+            for i in range(6):
+                self.qga_poller.call_qga_command(
+                    self.vm, qemuguestagent._QEMU_GUEST_INFO_COMMAND)
+                self.assertFalse(self.qga_poller.agent_available(self.vm.id))
+                interval = 0
+                while not self.qga_poller.agent_available(self.vm.id):
+                    clock.now += 1
+                    interval += 1
+                intervals.append(interval)
+        base = qemuguestagent._THROTTLING_INTERVAL
+        self.assertEqual(
+            intervals,
+            [base, base * 2, base * 4, base * 8, base * 16,
+             qemuguestagent._MAX_THROTTLING_INTERVAL])
+
+    def test_success_resets_backoff(self):
+        self.qga_poller.set_failure(self.vm.id)
+        self.qga_poller.set_failure(self.vm.id)
+        self.assertEqual(self.qga_poller.failures(self.vm.id), 2)
+        self.qga_poller.call_qga_command(
+            self.vm, qemuguestagent._QEMU_GUEST_INFO_COMMAND)
+        self.assertEqual(self.qga_poller.failures(self.vm.id), 0)
+        self.assertTrue(self.qga_poller.agent_available(self.vm.id))
+
+    def test_batch_due_checks(self):
+        clock = FakeClock(1000)
+        self.qga_poller._checks = [
+            (qemuguestagent.DiskInfoCheck, 300),
+            (qemuguestagent.ActiveUsersCheck, 10),
+        ]
+        with MonkeyPatchScope([(qemuguestagent, "monotonic_time", clock)]):
+            # Everything is due on the first run.
+            batch = qemuguestagent.BatchCheck(self.vm, self.qga_poller)
+            self.assertTrue(batch.runnable)
+            # Checking does not start the batch.
+            self.assertTrue(batch.runnable)
+            # No other batch while one is pending.
+            pending = self.qga_poller.start_batch(self.vm.id)
+            self.assertEqual(len(pending), 2)
+            self.assertFalse(batch.runnable)
+            self.qga_poller.end_batch(self.vm.id)
+            batch()
+
+            # Nothing is due yet.
+            clock.now += 5
+            batch = qemuguestagent.BatchCheck(self.vm, self.qga_poller)
+            self.assertFalse(batch.runnable)
+
+            # Only active users are due.
+            clock.now += 5
+            batch = qemuguestagent.BatchCheck(self.vm, self.qga_poller)
+            self.assertTrue(batch.runnable)
+            batch()
+            self.assertEqual(
+                batch._checks, [qemuguestagent.ActiveUsersCheck])
+
+        info = self.qga_poller.get_guest_info(self.vm.id)
+        self.assertEqual(info['username'], 'Calvin@DESKTOP-NG2EVRF, Hobbes')
+
+    def test_batch_stops_on_failure(self):
+        def _qga_command_fail(*args, **kwargs):
+            raise libvirt.libvirtError("Some error!")
+
+        self.qga_poller._checks = [
+            (qemuguestagent.ActiveUsersCheck, 10),
+            (qemuguestagent.DiskInfoCheck, 10),
+        ]
+        batch = qemuguestagent.BatchCheck(self.vm, self.qga_poller)
+        self.assertTrue(batch.runnable)
+        with MonkeyPatchScope([
+                (libvirt_qemu, "qemuAgentCommand", _qga_command_fail)]):
+            batch()
+        self.assertEqual(self.qga_poller.failures(self.vm.id), 1)
+        # The agent is not polled until the backoff interval expires.
+        batch = qemuguestagent.BatchCheck(self.vm, self.qga_poller)
+        self.assertFalse(batch.runnable)
+
+
+class FakeClock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -85,6 +85,8 @@ class SampleWindowTests(TestCaseBase):
 
 class StatsCacheTests(TestCaseBase):
 
+    DEVICES = sampling.BULK_STATS_DEVICES
+
     def setUp(self):
         self.fake_monotonic_time = FakeClock()
         self.cache = sampling.StatsCache(clock=self.fake_monotonic_time)
@@ -222,11 +224,145 @@ class StatsCacheTests(TestCaseBase):
         self.assertTrue(res.is_empty())
         self.assertEqual(res.stats_age, 100)
 
+    def test_group_merged(self):
+        self._feed_cache((
+            ({'a': {'cpu': 1}}, 1),
+            ({'a': {'block': 1}}, 2, self.DEVICES),
+            ({'a': {'cpu': 2}}, 3),
+            ({'a': {'block': 2}}, 4, self.DEVICES),
+        ))
+        res = self.cache.get('a')
+        self.assertEqual(res, ({'cpu': 1, 'block': 1},
+                               {'cpu': 2, 'block': 2},
+                               2 * FakeClock.STEP,
+                               FakeClock.STEP))
+        self.assertEqual(res.intervals, {self.DEVICES: 2 * FakeClock.STEP})
+
+    def test_group_not_enough_samples(self):
+        self._feed_cache((
+            ({'a': {'cpu': 1}}, 1),
+            ({'a': {'block': 1}}, 2, self.DEVICES),
+            ({'a': {'cpu': 2}}, 3),
+        ))
+        res = self.cache.get('a')
+        self.assertEqual(res[:2], ({'cpu': 1}, {'cpu': 2}))
+        self.assertEqual(res.intervals, {})
+
+    def test_group_only(self):
+        self._feed_cache((
+            ({'a': {'block': 1}}, 1, self.DEVICES),
+            ({'a': {'block': 2}}, 2, self.DEVICES),
+        ))
+        self.assertTrue(self.cache.get('a').is_empty())
+
+    def test_group_out_of_order(self):
+        self._feed_cache((
+            ({'a': {'cpu': 1}}, 1),
+            ({'a': {'block': 1}}, 2, self.DEVICES),
+            ({'a': {'cpu': 2}}, 3),
+            # Stale sample from unblocked stuck call.
+            ({'a': {'block': 0}}, 1, self.DEVICES),
+            ({'a': {'block': 2}}, 5, self.DEVICES),
+        ))
+        res = self.cache.get('a')
+        self.assertEqual(res[:2], ({'cpu': 1, 'block': 1},
+                                   {'cpu': 2, 'block': 2}))
+
+    def test_group_get_batch(self):
+        self._feed_cache((
+            ({'a': {'cpu': 1}, 'b': {'cpu': 1}}, 1),
+            ({'a': {'block': 1}}, 2, self.DEVICES),
+            ({'a': {'cpu': 2}, 'b': {'cpu': 2}}, 3),
+            ({'a': {'block': 2}}, 4, self.DEVICES),
+        ))
+        res = self.cache.get_batch()
+        self.assertEqual(res['a'].last_value, {'cpu': 2, 'block': 2})
+        self.assertEqual(res['a'].intervals,
+                         {self.DEVICES: 2 * FakeClock.STEP})
+        self.assertEqual(res['b'].last_value, {'cpu': 2})
+        self.assertEqual(res['b'].intervals, {})
+
     def _feed_cache(self, samples):
         for sample in samples:
             self.cache.put(*sample)
 
 
+_CPU_STAT = [
+    "cpu  100 10 50 1000 5 0 1 0 0 0\n",
+    "cpu0 40 5 20 400 2 0 1 0 0 0\n",
+    "cpu2 60 5 30 600 3 0 0 0 0 0\n",
+]
+
+
+class CpuSampleTests(TestCaseBase):
+
+    def test_total(self):
+        sample = sampling.TotalCpuSample(_CPU_STAT[0])
+        self.assertEqual((sample.user, sample.sys, sample.idle),
+                         (110, 50, 1000))
+
+    def test_cores(self):
+        sample = sampling.CpuCoreSample(_CPU_STAT[1:], size=4)
+        self.assertEqual(sample.online, [0, 2])
+        self.assertEqual(sample.getCoreSample(2),
+                         {'user': 60, 'userNice': 5, 'sys': 30, 'idle': 600})
+        self.assertEqual(sample.getCoreSample('0'),
+                         {'user': 40, 'userNice': 5, 'sys': 20, 'idle': 400})
+
+    def test_cores_missing(self):
+        sample = sampling.CpuCoreSample(_CPU_STAT[1:], size=4)
+        # Offline core, core beyond size, bad core id.
+        self.assertIsNone(sample.getCoreSample(1))
+        self.assertIsNone(sample.getCoreSample(5))
+        self.assertIsNone(sample.getCoreSample('x'))
+
+    def test_cores_grow(self):
+        sample = sampling.CpuCoreSample(_CPU_STAT[1:], size=1)
+        self.assertEqual(sample.getCoreSample(2)['idle'], 600)
+
+    def test_cores_sample(self):
+        sample = sampling.CpuCoreSample(_CPU_STAT[1:])
+        self.assertEqual(sorted(sample.coresSample), ['0', '2'])
+        self.assertEqual(sample.coresSample['2'], sample.getCoreSample(2))
+
+    def test_read_proc_stat(self):
+        total = sampling.TotalCpuSample()
+        cores = sampling.CpuCoreSample()
+        self.assertGreater(total.user + total.sys + total.idle, 0)
+        self.assertGreater(len(cores.online), 0)
+
+
+class HostFactsTests(TestCaseBase):
+
+    def setUp(self):
+        self.invalidated = 0
+
+    def invalidate(self):
+        self.invalidated += 1
+
+    def test_first_update(self):
+        facts = sampling._HostFacts()
+        with MonkeyPatchScope([(numa, 'invalidate', self.invalidate)]):
+            facts.update([0, 1, 3])
+        self.assertEqual(facts.size, 4)
+        self.assertEqual(self.invalidated, 0)
+
+    def test_no_change(self):
+        facts = sampling._HostFacts()
+        with MonkeyPatchScope([(numa, 'invalidate', self.invalidate)]):
+            facts.update([0, 1])
+            facts.update([0, 1])
+        self.assertEqual(self.invalidated, 0)
+
+    def test_hotplug(self):
+        facts = sampling._HostFacts()
+        with MonkeyPatchScope([(numa, 'invalidate', self.invalidate)]):
+            facts.update([0, 1])
+            facts.update([0, 1, 2])
+        self.assertEqual(facts.size, 3)
+        self.assertEqual(self.invalidated, 1)
+
+
 class NumaNodeMemorySampleTests(TestCaseBase):
 
     def _monkeyPatchedMemorySample(self, freeMemory, totalMemory):
@@ -272,6 +408,35 @@ class NumaNodeMemorySampleTests(TestCaseBase):
             memorySample = sampling.NumaNodeMemorySample()
             self.assertEqual(memorySample.nodesMemSample, expected)
 
+    def testMemoryStatsMultipleNodes(self):
+        expected = {
+            '0': {'memPercent': 40, 'memFree': '600'},
+            '1': {'memPercent': 80, 'memFree': '200'},
+        }
+        free = {0: '600', 1: '200'}
+
+        def fakeMemoryStats(cell):
+            return {'free': free[cell], 'total': '1000'}
+
+        def fakeNumaTopology():
+            return {'0': {'cpus': [0]}, '1': {'cpus': [1]}}
+
+        with MonkeyPatchScope([(numa, 'topology', fakeNumaTopology),
+                               (numa, 'memory_by_cell', fakeMemoryStats)]):
+            memorySample = sampling.NumaNodeMemorySample()
+            self.assertEqual(memorySample.nodesMemSample, expected)
+
+    def testMemoryStatsError(self):
+        def fakeMemoryStats(cell):
+            raise RuntimeError("fake error")
+
+        def fakeNumaTopology():
+            return {'0': {'cpus': [0]}, '1': {'cpus': [1]}}
+
+        with MonkeyPatchScope([(numa, 'topology', fakeNumaTopology),
+                               (numa, 'memory_by_cell', fakeMemoryStats)]):
+            self.assertRaises(RuntimeError, sampling.NumaNodeMemorySample)
+
 
 class HostStatsMonitorTests(TestCaseBase):
     FAILED_SAMPLE = 3  # random 'small' value
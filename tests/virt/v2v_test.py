@@ -348,6 +348,72 @@ class v2vTests(TestCaseBase):
             (v2v.DiskProgress(50)),
             (v2v.DiskProgress(100))])
 
+    def testOutputParserEstimatedSize(self):
+        # virt-v2v -v -x lists the targets before copying the disks.
+        output = (b'[  80.0] Assigning disks to buses\n'
+                  b'target_file = 00000000-0000-0000-0000-000000000002\n'
+                  b'target_format = raw\n'
+                  b'target_estimated_size = 123456789\n'
+                  b'target_overlay = /var/tmp/v2vovl1.qcow2\n'
+                  b'target_file = 00000000-0000-0000-0000-000000000003\n'
+                  b'target_format = raw\n'
+                  b'target_estimated_size = 987654321\n'
+                  b'target_overlay = /var/tmp/v2vovl2.qcow2\n'
+                  b'[  88.0] Copying disk 1/2 to /tmp/v2v/0000000...\n'
+                  b'    (0/100%)\r'
+                  b'    (100/100%)\r'
+                  b'[ 120.0] Copying disk 2/2 to /tmp/v2v/0000000...\n'
+                  b'    (0/100%)\r'
+                  b'    (100/100%)\r'
+                  b'[ 180.0] Finishing off')
+
+        parser = v2v.OutputParser()
+        events = list(parser.parse(io.BytesIO(output)))
+        self.assertEqual(events, [
+            (v2v.DiskEstimatedSize(123456789, 1)),
+            (v2v.DiskEstimatedSize(987654321, 2)),
+            (v2v.ImportProgress(1, 2, b'Copying disk 1/2')),
+            (v2v.DiskProgress(0)),
+            (v2v.DiskProgress(100)),
+            (v2v.ImportProgress(2, 2, b'Copying disk 2/2')),
+            (v2v.DiskProgress(0)),
+            (v2v.DiskProgress(100))])
+
+    def testOutputParserParallel(self):
+        output = (b'[   0.0] preparing for copy\n'
+                  b'[   0.1] Copying disk 1/2 to /tmp/v2v/0000000...\n'
+                  b'disk 1 target_estimated_size = 1024\n'
+                  b'[   0.1] Copying disk 2/2 to /tmp/v2v/1000000...\n'
+                  b'disk 2 target_estimated_size = 2048\n'
+                  b'    (disk 1: 0/100%)\r'
+                  b'    (disk 2: 0/100%)\r'
+                  b'    (disk 2: 50/100%)\r'
+                  b'    (disk 1: 100/100%)\r'
+                  b'    (disk 2: 100/100%)\r'
+                  b'[   2.0] Finishing off\n')
+
+        parser = v2v.OutputParser()
+        events = list(parser.parse(io.BytesIO(output)))
+        self.assertEqual(events, [
+            (v2v.ImportProgress(1, 2, b'Copying disk 1/2')),
+            (v2v.DiskEstimatedSize(1024, 1)),
+            (v2v.ImportProgress(2, 2, b'Copying disk 2/2')),
+            (v2v.DiskEstimatedSize(2048, 2)),
+            (v2v.DiskProgress(0, 1)),
+            (v2v.DiskProgress(0, 2)),
+            (v2v.DiskProgress(50, 2)),
+            (v2v.DiskProgress(100, 1)),
+            (v2v.DiskProgress(100, 2))])
+
+    def testOutputParserClosed(self):
+        output = (b'[  88.0] Copying disk 1/2 to /tmp/v2v/0000000...\n'
+                  b'    (0/100%)\r'
+                  b'    (50/100%)\r')
+
+        parser = v2v.OutputParser()
+        with self.assertRaises(v2v.OutputParserError):
+            list(parser.parse(io.BytesIO(output)))
+
     def testGetExternalVMsWithoutDisksInfo(self):
         def internal_error(name):
             raise fake.Error(libvirt.VIR_ERR_INTERNAL_ERROR)
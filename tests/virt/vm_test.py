@@ -1750,6 +1750,124 @@ class FakeBlockIoTuneDomain(object):
         self.iotunes[name] = iotune.copy()
 
 
+class BlockJobsTests(TestCaseBase):
+
+    def setUp(self):
+        self.drive = FakeBlockJobDrive('vda')
+        self.dom = FakeBlockJobDomain()
+        self.dom.jobs = {
+            self.drive.name: {
+                'type': libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_COMMIT,
+                'bandwidth': 0, 'cur': 0, 'end': 1024,
+            }
+        }
+        self.job = {
+            'jobID': 'job-1', 'blockJobType': 'commit',
+            'drive': self.drive.name, 'baseVolume': 'base',
+            'topVolume': self.drive.volumeID, 'strategy': 'commit',
+            'disk': {'poolID': 'pool', 'domainID': self.drive.domainID,
+                     'imageID': self.drive.imageID,
+                     'volumeID': self.drive.volumeID},
+        }
+
+    @contextmanager
+    def make_vm(self, jobs=True):
+        with fake.VM() as testvm:
+            testvm._dom = self.dom
+            testvm._devices[hwclass.DISK] = (self.drive,)
+            if jobs:
+                testvm._blockJobs = {self.job['jobID']: self.job}
+            yield testvm
+
+    @MonkeyPatch(vm, 'config',
+                 make_config([('vars', 'vm_jobs_reconcile_interval', '60')]))
+    def test_no_jobs(self):
+        with self.make_vm(jobs=False) as testvm:
+            # First update checks for jobs after recovery.
+            self.assertTrue(testvm.hasVmJobs)
+            testvm.updateVmJobs()
+            self.assertEqual(testvm._getVmJobsStats(), {'vmJobs': {}})
+            self.assertFalse(testvm.hasVmJobs)
+
+    @MonkeyPatch(vm, 'config',
+                 make_config([('vars', 'vm_jobs_reconcile_interval', '60')]))
+    def test_update_on_event(self):
+        with self.make_vm() as testvm:
+            testvm.updateVmJobs()
+            self.assertEqual(self.dom.__calls__,
+                             [('blockJobInfo', (self.drive.name, 0), {})])
+            self.assert_progress(testvm, '0')
+
+            # No event, no need to query libvirt.
+            self.dom.jobs[self.drive.name]['cur'] = 512
+            self.assertFalse(testvm.hasVmJobs)
+            testvm.updateVmJobs()
+            self.assertEqual(len(self.dom.__calls__), 1)
+            self.assert_progress(testvm, '0')
+
+            testvm.on_block_job_event(
+                self.drive.name,
+                libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_COMMIT,
+                libvirt.VIR_DOMAIN_BLOCK_JOB_READY)
+            self.assertTrue(testvm.hasVmJobs)
+            testvm.updateVmJobs()
+            self.assertEqual(len(self.dom.__calls__), 2)
+            self.assert_progress(testvm, '512')
+            self.assertFalse(testvm.hasVmJobs)
+
+    @MonkeyPatch(vm, 'config',
+                 make_config([('vars', 'vm_jobs_reconcile_interval', '0')]))
+    def test_reconcile(self):
+        with self.make_vm() as testvm:
+            testvm.updateVmJobs()
+            self.dom.jobs[self.drive.name]['cur'] = 512
+            self.assertTrue(testvm.hasVmJobs)
+            testvm.updateVmJobs()
+            self.assertEqual(len(self.dom.__calls__), 2)
+            self.assert_progress(testvm, '512')
+
+    @MonkeyPatch(vm, 'config',
+                 make_config([('vars', 'vm_jobs_reconcile_interval', '60')]))
+    def test_retry_after_error(self):
+        with self.make_vm() as testvm:
+            self.dom.error = libvirt.libvirtError("fake error")
+            testvm.updateVmJobs()
+            self.assert_progress(testvm, '0', end='0')
+
+            self.dom.error = None
+            self.dom.jobs[self.drive.name]['cur'] = 512
+            self.assertTrue(testvm.hasVmJobs)
+            testvm.updateVmJobs()
+            self.assert_progress(testvm, '512')
+
+    def assert_progress(self, testvm, cur, end='1024'):
+        job = testvm._getVmJobsStats()['vmJobs'][self.job['jobID']]
+        self.assertEqual(job['cur'], cur)
+        self.assertEqual(job['end'], end)
+
+
+class FakeBlockJobDrive(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.domainID = 'domain'
+        self.imageID = 'image'
+        self.volumeID = 'top'
+
+
+class FakeBlockJobDomain(object):
+
+    def __init__(self):
+        self.jobs = {}
+        self.error = None
+
+    @recorded
+    def blockJobInfo(self, name, flags=0):
+        if self.error is not None:
+            raise self.error
+        return self.jobs.get(name, {}).copy()
+
+
 @expandPermutations
 class SyncGuestTimeTests(TestCaseBase):
 
@@ -0,0 +1,147 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301  USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import logging
+import socket
+
+import pytest
+
+from vdsm.virt import vmchannels
+
+log = logging.getLogger("test")
+
+
+class FakeChannel(object):
+
+    def __init__(self):
+        self.sock = None
+
+    def create(self):
+        if self.sock:
+            self.sock.close()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        return self.sock.fileno()
+
+    def connect(self):
+        return False
+
+    def read(self):
+        return True
+
+    def timeout(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def channels():
+    created = []
+    yield created
+    for channel in created:
+        channel.close()
+
+
+def register(listener, channels, key):
+    channel = FakeChannel()
+    channels.append(channel)
+    listener.register(channel.create, channel.connect, channel.read,
+                      channel.timeout, key=key)
+    return channel
+
+
+def loads(listener):
+    return [shard.load() for shard in listener._shards]
+
+
+def test_invalid_shards():
+    with pytest.raises(ValueError):
+        vmchannels.Listener(log, shards=0)
+
+
+def test_register_same_key_same_shard(channels):
+    listener = vmchannels.Listener(log, shards=4)
+    register(listener, channels, "vm-id")
+    register(listener, channels, "vm-id")
+    assert sorted(loads(listener)) == [0, 0, 0, 2]
+
+
+def test_register_balanced(channels):
+    listener = vmchannels.Listener(log, shards=4)
+    # Same key would place all channels on the same shard without
+    # balancing.
+    for i in range(40):
+        register(listener, channels, "vm-id")
+    shard_loads = loads(listener)
+    assert sum(shard_loads) == 40
+    assert (max(shard_loads) - min(shard_loads) <=
+            vmchannels.MAX_SHARD_IMBALANCE)
+
+
+def test_unregister(channels):
+    listener = vmchannels.Listener(log, shards=2)
+    channel = register(listener, channels, "vm-id")
+    listener.unregister(channel.sock.fileno())
+    assert loads(listener) == [0, 0]
+
+
+def test_unregister_untracked():
+    listener = vmchannels.Listener(log, shards=2)
+    listener.unregister(4242)
+    assert loads(listener) == [0, 0]
+
+
+def test_unregister_rebalance(channels):
+    listener = vmchannels.Listener(log, shards=2)
+    registered = [register(listener, channels, i) for i in range(20)]
+    for shard in listener._shards:
+        shard._update_channels()
+
+    # Remove all channels from one shard.
+    victim = listener._shards[0]
+    remaining = 20 - victim.load()
+    for channel in registered:
+        fileno = channel.sock.fileno()
+        if fileno in victim._unconnected:
+            listener.unregister(fileno)
+
+    # The loaded shard moves channels when its thread updates the channels.
+    for shard in listener._shards:
+        shard._update_channels()
+
+    shard_loads = loads(listener)
+    assert sum(shard_loads) == remaining
+    assert min(shard_loads) > 0
+    assert (max(shard_loads) - min(shard_loads) <=
+            vmchannels.MAX_SHARD_IMBALANCE)
+
+
+def test_stats(channels):
+    listener = vmchannels.Listener(log, shards=2)
+    register(listener, channels, "vm-id")
+    stats = listener.stats()
+    assert len(stats) == 2
+    assert sum(s['unconnected'] for s in stats) == 1
+    assert sum(s['connected'] for s in stats) == 0
@@ -35,6 +35,7 @@ from six.moves import zip
 
 from vdsm.common import exception
 from vdsm.common import response
+from vdsm.common.units import MiB
 from vdsm.config import config
 from vdsm.virt import migration
 from vdsm.virt import vmstatus
@@ -616,3 +617,145 @@ def _is_valid_prefix_len(prefixlen):
     except ValueError:
         return False
     return True
+
+
+def _job_stats(elapsed, processed, remaining, iteration=1):
+    stats = {
+        'type': libvirt.VIR_DOMAIN_JOB_UNBOUNDED,
+        libvirt.VIR_DOMAIN_JOB_TIME_ELAPSED: elapsed,
+        libvirt.VIR_DOMAIN_JOB_DATA_TOTAL: 1024 * MiB,
+        libvirt.VIR_DOMAIN_JOB_DATA_PROCESSED: processed,
+        libvirt.VIR_DOMAIN_JOB_DATA_REMAINING: remaining,
+        libvirt.VIR_DOMAIN_JOB_MEMORY_TOTAL: 1024 * MiB,
+        libvirt.VIR_DOMAIN_JOB_MEMORY_PROCESSED: processed,
+        libvirt.VIR_DOMAIN_JOB_MEMORY_REMAINING: remaining,
+        'memory_iteration': iteration,
+    }
+    # available since libvirt 3.2
+    if getattr(libvirt, 'VIR_DOMAIN_JOB_OPERATION_MIGRATION_OUT', None):
+        stats['operation'] = libvirt.VIR_DOMAIN_JOB_OPERATION_MIGRATION_OUT
+    return stats
+
+
+class TestConvergenceEstimator(TestCaseBase):
+
+    def test_first_sample(self):
+        estimator = migration.ConvergenceEstimator()
+        prog = migration.Progress.from_job_stats(
+            _job_stats(1000, 0, 1024 * MiB))
+        self.assertIsNone(estimator.update(prog))
+
+    def test_converging(self):
+        estimator = migration.ConvergenceEstimator()
+        # Transferring 100 MiB/s, 20 MiB/s dirtied.
+        for elapsed, processed, remaining in [
+                (1000, 0, 1000 * MiB),
+                (2000, 100 * MiB, 920 * MiB),
+                (3000, 200 * MiB, 840 * MiB)]:
+            est = estimator.update(migration.Progress.from_job_stats(
+                _job_stats(elapsed, processed, remaining)))
+        self.assertEqual(est.transfer_rate, 100 * MiB)
+        self.assertEqual(est.dirty_rate, 20 * MiB)
+        self.assertEqual(est.eta, 840 / 80)
+
+    def test_not_converging(self):
+        estimator = migration.ConvergenceEstimator()
+        # Transferring 100 MiB/s, 150 MiB/s dirtied.
+        for elapsed, processed, remaining in [
+                (1000, 0, 1000 * MiB),
+                (2000, 100 * MiB, 1050 * MiB)]:
+            est = estimator.update(migration.Progress.from_job_stats(
+                _job_stats(elapsed, processed, remaining)))
+        self.assertEqual(est.dirty_rate, 150 * MiB)
+        self.assertIsNone(est.eta)
+
+
+class FakeMonitoredVM(FakeVM):
+
+    def __init__(self, stats_sequence, monitor=None):
+        super(FakeMonitoredVM, self).__init__(FakeMigratingDomain())
+        self._stats = iter(stats_sequence)
+        self.monitor = monitor
+        self.status_events = 0
+        self.aborted = False
+
+    def job_stats(self):
+        try:
+            return next(self._stats)
+        except StopIteration:
+            self.monitor.stop()
+            return {}
+
+    def send_migration_status_event(self):
+        self.status_events += 1
+
+    def abort_domjob(self):
+        self.aborted = True
+
+
+_ABORT_SCHEDULE = {
+    'init': [],
+    'stalling': [
+        {'limit': 0, 'action': {
+            'name': migration.CONVERGENCE_SCHEDULE_SET_ABORT,
+            'params': []}},
+    ],
+}
+
+
+class TestMonitorThread(TestCaseBase):
+
+    def run_monitor(self, stats_sequence, schedule):
+        vm = FakeMonitoredVM(stats_sequence)
+        monitor = migration.MonitorThread(vm, 0, schedule)
+        vm.monitor = monitor
+        with MonkeyPatchScope([
+            (migration.MonitorThread, '_MIGRATION_MONITOR_INTERVAL', 0.01),
+            (migration.MonitorThread, '_MIGRATION_MONITOR_MIN_INTERVAL',
+             0.001),
+        ]):
+            monitor.monitor_migration()
+        return vm, monitor
+
+    def test_converging(self):
+        stats = [
+            _job_stats(1000, 0, 1000 * MiB),
+            _job_stats(2000, 100 * MiB, 920 * MiB),
+            _job_stats(3000, 200 * MiB, 840 * MiB),
+        ]
+        vm, monitor = self.run_monitor(stats, _ABORT_SCHEDULE)
+        self.assertFalse(vm.aborted)
+        self.assertEqual(monitor.progress.data_remaining, 840 * MiB)
+        self.assertEqual(monitor.estimate.eta, 840 / 80)
+
+    def test_not_converging_triggers_action(self):
+        # Dirty rate is higher than transfer rate, and the iteration
+        # never ends.
+        stats = [
+            _job_stats(1000, 0, 1000 * MiB),
+            _job_stats(2000, 100 * MiB, 1050 * MiB),
+            _job_stats(3000, 200 * MiB, 1100 * MiB),
+            _job_stats(4000, 300 * MiB, 1150 * MiB),
+        ]
+        vm, monitor = self.run_monitor(stats, _ABORT_SCHEDULE)
+        self.assertTrue(vm.aborted)
+
+    def test_next_interval(self):
+        monitor = migration.MonitorThread(FakeVM(), 0, _ABORT_SCHEDULE)
+        with MonkeyPatchScope([
+            (migration.MonitorThread, '_MIGRATION_MONITOR_INTERVAL', 10),
+            (migration.MonitorThread, '_MIGRATION_MONITOR_MIN_INTERVAL', 1),
+        ]):
+            prog = migration.Progress.from_job_stats(
+                _job_stats(1000, 0, 1000 * MiB))
+            # No estimate yet
+            self.assertEqual(monitor._next_interval(prog, None), 10)
+            # Far from convergence
+            est = migration.Estimate(100 * MiB, 10 * MiB, 100)
+            self.assertEqual(monitor._next_interval(prog, est), 10)
+            # Close to convergence
+            est = migration.Estimate(100 * MiB, 10 * MiB, 6)
+            self.assertEqual(monitor._next_interval(prog, est), 3)
+            # High dirty rate
+            est = migration.Estimate(100 * MiB, 90 * MiB, 100)
+            self.assertEqual(monitor._next_interval(prog, est), 1)
@@ -23,6 +23,7 @@ from __future__ import division
 
 import libvirt
 
+from vdsm.common import concurrent
 from vdsm.common import libvirtconnection
 from vdsm.common import response
 from vdsm.virt import recovery
@@ -127,6 +128,24 @@ class TestAllDomains(TestCaseBase):
             vm.destroyed for vm in self.conn.domains.values()
         ))
 
+    def test_recover_concurrently(self):
+        barrier = concurrent.Barrier(len(self.vm_uuids))
+        create_vm = self.cif.createVm
+
+        def wait_for_all(params, vmRecover=False):
+            # Fails with Timeout if domains are recovered serially.
+            barrier.wait(timeout=5)
+            return create_vm(params, vmRecover=vmRecover)
+
+        with MonkeyPatchScope([
+            (self.cif, 'createVm', wait_for_all)
+        ]):
+            recovery.all_domains(self.cif, workers=len(self.vm_uuids))
+        self.assertEqual(
+            set(self.cif.vmRequests.keys()),
+            set(self.vm_uuids)
+        )
+
     def test_domain_error(self):
         """
         We find VMs to recover through libvirt, but we get a failure trying
@@ -25,6 +25,7 @@ import copy
 import logging
 import uuid
 
+import libvirt
 import six
 
 from vdsm.common.units import KiB, MiB, GiB
@@ -646,6 +647,32 @@ def _ensure_delta(stats_before, stats_after, key, delta):
     stats_after[key] = abs(delta)
 
 
+@expandPermutations
+class IntervalTests(TestCaseBase):
+
+    DEVICES = (libvirt.VIR_DOMAIN_STATS_INTERFACE |
+               libvirt.VIR_DOMAIN_STATS_BLOCK)
+
+    @permutations([
+        # intervals
+        (None,),
+        ({},),
+    ])
+    def test_not_separate(self, intervals):
+        self.assertEqual(
+            vmstats._interval(
+                intervals, libvirt.VIR_DOMAIN_STATS_BLOCK, 15), 15)
+
+    def test_separate(self):
+        intervals = {self.DEVICES: 60}
+        self.assertEqual(
+            vmstats._interval(
+                intervals, libvirt.VIR_DOMAIN_STATS_BLOCK, 15), 60)
+        self.assertEqual(
+            vmstats._interval(
+                intervals, libvirt.VIR_DOMAIN_STATS_CPU_TOTAL, 15), 15)
+
+
 class FakeNic(object):
 
     def __init__(self, name, model, mac_addr, is_hostdevice):